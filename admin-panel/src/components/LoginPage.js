@@ -76,6 +76,8 @@ const LoginPage = () => {
       if (response.data?.success && response.data?.user) {
         // Guardar datos del usuario
         localStorage.setItem('user', JSON.stringify(response.data.user));
+        // Token para autenticar la conexión Socket.IO
+        localStorage.setItem('socketToken', response.data.token);
         
         // Pequeña pausa antes de navegar
         await new Promise(resolve => setTimeout(resolve, 500));
@@ -43,6 +43,8 @@ const VehicleManagement = () => {
     socketRef.current = io(config.api.baseURL, {
       transports: ['websocket'],
       upgrade: false,
+      // Las suscripciones se limitan a las asignaciones del usuario del token
+      auth: { token: localStorage.getItem('socketToken') },
     });
 
     socketRef.current.on('connect', () => {
@@ -65,6 +67,7 @@ const VehicleManagement = () => {
     });
 
     socketRef.current.on('gps_update', handleGPSUpdate);
+    socketRef.current.on('gps_updates', (updates) => updates.forEach(handleGPSUpdate));
   }, [handleGPSUpdate]);
 
   const disconnectSocket = useCallback(() => {
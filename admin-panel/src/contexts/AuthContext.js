@@ -30,6 +30,8 @@ export const AuthProvider = ({ children }) => {
       if (response.data.success) {
         setUser(response.data.user);
         localStorage.setItem('user', JSON.stringify(response.data.user));
+        // Token para autenticar la conexión Socket.IO
+        localStorage.setItem('socketToken', response.data.token);
       }
       return response.data;
     } catch (error) {
@@ -41,6 +43,7 @@ export const AuthProvider = ({ children }) => {
   const logout = () => {
     setUser(null);
     localStorage.removeItem('user');
+    localStorage.removeItem('socketToken');
   };
 
   return (
@@ -1,6 +1,8 @@
 import os
-from flask import Flask, jsonify, request
-from flask_socketio import SocketIO, emit
+import base64
+from flask import Flask, Response, jsonify, request, session, stream_with_context
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 from flask_cors import CORS
 from threading import Event
 import json
@@ -22,6 +24,11 @@ from data.mysql_tipo_gps_manager import MySQLTipoGPSManager
 
 # Importar configuración
 from config.config import Config
+from utils.metrics import Metrics
+from utils.message_bus import get_message_bus, TOPIC_GPS_UPDATE, TOPIC_ZONE_EVENTS
+from server.gps_server import GPSServerInstance
+from api.rooms import DeviceRoomMap, imei_room, empresa_room, usuario_room
+from api.push_scheduler import PushScheduler
 
 # Configurar logging
 logging.basicConfig(
@@ -47,6 +54,30 @@ tipo_gps_manager = MySQLTipoGPSManager()
 asignacion_manager = MySQLAsignacionDispositivoManager()
 empresa_manager = MySQLEmpresaManager()
 ubicacion_manager = MySQLUbicacionManager()
+
+# Tokens firmados que entrega el login para identificar al usuario en Socket.IO
+socket_tokens = URLSafeTimedSerializer(Config.SECURITY_CONFIG['secret_key'], salt='socket-auth')
+
+# Rooms de Socket.IO por IMEI, empresa y usuario según asignacion_dispositivos
+device_rooms = DeviceRoomMap(asignacion_manager.get_imei_assignments, ttl=Config.SOCKET_CONFIG['assignments_ttl'])
+
+
+def _client_backlog(eio_sid):
+    """Paquetes que el socket del cliente aún no envía (None si ya no está conectado)"""
+    eio_socket = socketio.server.eio.sockets.get(eio_sid)
+    return eio_socket.queue.qsize() if eio_socket is not None else None
+
+
+push_scheduler = PushScheduler(
+    socketio.emit,
+    device_rooms.rooms_for,
+    interval=Config.SOCKET_CONFIG['push_interval'],
+    participants=lambda room: socketio.server.manager.get_participants('/', room),
+    backlog=_client_backlog,
+    max_backlog=Config.SOCKET_CONFIG['max_client_backlog'],
+    start_task=socketio.start_background_task,
+    sleep=socketio.sleep,
+)
 role_manager = MySQLRoleManager()
 
 
@@ -84,9 +115,14 @@ def gps_server_status():
             "details": {
                 "error_code": result,
                 "process_info": get_server_process_info(),
-                "connections": get_active_connections()
+                "connections": get_active_connections(),
+                "metrics": Metrics.snapshot()
             }
         }
+        # Con SERVER_PROCESSES > 1, métricas de cada proceso de ingesta
+        ingest = GPSServerInstance._instance
+        if hasattr(ingest, 'stats'):
+            status["details"]["ingest_workers"] = ingest.stats()
         
         return jsonify(status), 200 if result == 0 else 503
         
@@ -315,6 +351,8 @@ def login():
         return jsonify({
             "success": True,
             "user": user,
+            # Para conectarse a Socket.IO: io(url, {auth: {token}})
+            "token": socket_tokens.dumps({'usuario_id': user['id']}),
             "message": "Login exitoso"
         }), 200
 
@@ -519,10 +557,15 @@ def create_ubicacion():
 @app.route('/api/ubicaciones/dispositivo/<int:dispositivo_id>', methods=['GET'])
 def get_ubicaciones_por_dispositivo(dispositivo_id):
     """
-    Obtiene las ubicaciones de un dispositivo específico.
+    Obtiene las ubicaciones de un dispositivo específico (opcionalmente entre
+    fecha_inicio y fecha_fin).
     """
     try:
-        ubicaciones = ubicacion_manager.get_ubicaciones_por_dispositivo(dispositivo_id)
+        ubicaciones = ubicacion_manager.get_ubicaciones_por_dispositivo(
+            dispositivo_id,
+            request.args.get('fecha_inicio', default=None, type=str),
+            request.args.get('fecha_fin', default=None, type=str)
+        )
         return jsonify({
             "success": True,
             "ubicaciones": ubicaciones
@@ -1086,6 +1129,7 @@ def create_asignacion():
         )
         
         if result:
+            device_rooms.invalidate()
             return jsonify({
                 "success": True,
                 "message": "Asignación created successfully."
@@ -1120,6 +1164,7 @@ def update_asignacion(id):
         )
         
         if result:
+            device_rooms.invalidate()
             return jsonify({
                 "success": True,
                 "message": "Asignación updated successfully."
@@ -1140,6 +1185,7 @@ def delete_asignacion(id):
     try:
         result = asignacion_manager.delete_asignacion(id)
         if result:
+            device_rooms.invalidate()
             return jsonify({
                 "success": True,
                 "message": "Asignación deleted successfully."
@@ -1216,23 +1262,105 @@ def get_latest_location(imei):
     data = DataManager.get_latest_location(imei)
     return jsonify(data)
 
+def _encode_history_cursor(row):
+    """Cursor opaco con la clave (timestamp, id) de la última fila entregada"""
+    key = json.dumps([row['timestamp'], row['id']]).encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip('=')
+
+
+def _decode_history_cursor(token):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return str(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+
+
 @app.route('/api/gps/<imei>/history')
 def get_gps_history(imei):
+    """
+    Historial de posiciones del rango de fechas.
+
+    - Sin `page_size`, `cursor` ni `format`: lista JSON de hasta `limit` filas (como antes).
+    - `page_size` y/o `cursor`: una página {"data": [...], "next_cursor": ...};
+      `next_cursor` se pasa tal cual para pedir la siguiente y es null al final.
+    - `format=ndjson`: todas las filas (o hasta `limit`) como JSON por línea,
+      enviadas a medida que se leen del cursor de la base de datos.
+
+    `order` es desc (por defecto) o asc; el orden es por (timestamp, id).
+
+    `bucket=<segundos>` deja una posición por intervalo y `simplify=<metros>`
+    simplifica el recorrido (Douglas-Peucker) antes de serializarlo; no se
+    combinan con la paginación y `limit` se aplica al resultado.
+    """
     start_date = request.args.get('start_date', default=None, type=str)
     end_date = request.args.get('end_date', default=None, type=str)
-    limit = request.args.get('limit', default=1000, type=int)
+    limit = request.args.get('limit', default=None, type=int)
+    page_size = request.args.get('page_size', default=None, type=int)
+    cursor = request.args.get('cursor', default=None, type=str)
+    order = request.args.get('order', default='desc', type=str)
+    output_format = request.args.get('format', default='json', type=str)
+    simplify = request.args.get('simplify', default=None, type=float)
+    bucket = request.args.get('bucket', default=None, type=float)
 
     if not start_date or not end_date:
         return jsonify({"error": "Se requieren fechas de inicio y fin"}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "order debe ser asc o desc"}), 400
+    if output_format not in ('json', 'ndjson'):
+        return jsonify({"error": "format debe ser json o ndjson"}), 400
+    if (simplify is not None and simplify <= 0) or (bucket is not None and bucket <= 0):
+        return jsonify({"error": "simplify y bucket deben ser mayores que 0"}), 400
+    simplified = simplify is not None or bucket is not None
+    if simplified and (page_size is not None or cursor):
+        return jsonify({"error": "simplify y bucket no se pueden combinar con page_size/cursor"}), 400
 
-    data = DataManager.get_gps_history(imei, start_date, end_date, limit)
-    return jsonify(data)
+    try:
+        after = _decode_history_cursor(cursor) if cursor else None
+        if output_format == 'json' and page_size is None and after is None and not simplified:
+            data = DataManager.get_gps_history(imei, start_date, end_date, limit if limit is not None else 1000)
+            return jsonify(data)
+
+        if output_format == 'ndjson' or simplified:
+            rows = DataManager.iter_gps_history(imei, start_date, end_date, after=after,
+                                                descending=order == 'desc', limit=limit,
+                                                simplify=simplify, bucket=bucket)
+            if output_format == 'json':
+                return jsonify(list(rows))
+            lines = (json.dumps(row) + '\n' for row in rows)
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+        page_size = min(max(page_size or Config.API_CONFIG['history_page_size'], 1),
+                        Config.API_CONFIG['history_max_page_size'])
+        # Una fila de más indica si hay página siguiente
+        rows = list(DataManager.iter_gps_history(imei, start_date, end_date, after=after,
+                                                 descending=order == 'desc', limit=page_size + 1))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    next_cursor = _encode_history_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return jsonify({"data": rows[:page_size], "next_cursor": next_cursor})
 
 @app.route('/api/gps/<imei>/summary')
 def get_gps_summary(imei):
     data = DataManager.get_gps_summary(imei)
     return jsonify(data)
 
+@app.route('/api/gps/<imei>/rollups')
+def get_gps_rollups(imei):
+    start_date = request.args.get('start_date', default=None, type=str)
+    end_date = request.args.get('end_date', default=None, type=str)
+    period = request.args.get('period', default='day', type=str)
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Se requieren fechas de inicio y fin"}), 400
+
+    try:
+        data = DataManager.get_gps_rollups(imei, start_date, end_date, period)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(data)
+
 @app.route('/api/connected_devices')
 def get_connected_devices():
     devices = DataManager.get_connected_devices()
@@ -1309,6 +1437,7 @@ def update_dispositivo_gps(id):
         )
 
         if result:
+            device_rooms.invalidate()
             return jsonify({
                 "success": True, 
                 "message": "Dispositivo GPS updated successfully."
@@ -1329,6 +1458,7 @@ def delete_dispositivo_gps(id):
     try:
         result = dispositivo_gps_manager.delete_dispositivo_gps(id)
         if result:
+            device_rooms.invalidate()
             return jsonify({
                 "success": True, 
                 "message": "Dispositivo GPS deleted successfully."
@@ -1345,8 +1475,23 @@ def delete_dispositivo_gps(id):
         }), 500
 
 # Manejo de conexión con WebSocket
+def _socket_user(auth):
+    """Usuario del token del login (en `auth` o en ?token=), o None si falta o no es válido"""
+    token = auth.get('token') if isinstance(auth, dict) else None
+    token = token or request.args.get('token')
+    if not token:
+        return None
+    try:
+        return socket_tokens.loads(token, max_age=Config.SECURITY_CONFIG['jwt_token_expires'])['usuario_id']
+    except (BadSignature, SignatureExpired, KeyError, TypeError):
+        logging.warning(f"Invalid socket token from {request.remote_addr}")
+        return None
+
+
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
+    # La sesión de Flask-SocketIO es por conexión
+    session['usuario_id'] = _socket_user(auth)
     print('Cliente conectado')
     emit('connection_response', {'message': 'Conexión exitosa con el servidor WebSocket'})
 
@@ -1354,15 +1499,53 @@ def handle_connect():
 def handle_disconnect():
     print('Cliente desconectado')
 
+def _subscription_rooms(data):
+    """
+    Rooms pedidos en un subscribe/unsubscribe: un IMEI como string, o un
+    objeto con 'imei', 'empresa_id' y/o 'usuario_id'
+    """
+    if isinstance(data, str):
+        data = {'imei': data}
+    if not isinstance(data, dict):
+        return [], {}
+    rooms = []
+    if data.get('imei'):
+        rooms.append(imei_room(data['imei']))
+    if data.get('empresa_id') is not None:
+        rooms.append(empresa_room(data['empresa_id']))
+    if data.get('usuario_id') is not None:
+        rooms.append(usuario_room(data['usuario_id']))
+    return rooms, data
+
 @socketio.on('subscribe')
 def handle_subscribe(data):
-    imei = data.get('imei', None)
-    if imei:
-        print(f'Cliente suscrito al IMEI: {imei}')
-        socketio.emit('subscribed', {'imei': imei}, room=request.sid)
-    else:
+    rooms, data = _subscription_rooms(data)
+    if not rooms:
         print('IMEI no proporcionado')
         emit('subscription_error', {'error': 'IMEI no proporcionado'})
+        return {'success': False, 'error': 'IMEI no proporcionado'}
+    # Sólo los rooms de las asignaciones del usuario autenticado
+    usuario_id = session.get('usuario_id')
+    if usuario_id is None:
+        emit('subscription_error', {'error': 'No autenticado'})
+        return {'success': False, 'error': 'No autenticado'}
+    denied = [room for room in rooms if room not in device_rooms.user_rooms(usuario_id)]
+    if denied:
+        logging.warning(f"User {usuario_id} denied subscription to {', '.join(denied)}")
+        emit('subscription_error', {'error': 'Sin acceso', 'rooms': denied})
+        return {'success': False, 'error': 'Sin acceso', 'rooms': denied}
+    for room in rooms:
+        join_room(room)
+    print(f'Cliente suscrito a: {", ".join(rooms)}')
+    socketio.emit('subscribed', {key: data.get(key) for key in ('imei', 'empresa_id', 'usuario_id') if data.get(key) is not None}, room=request.sid)
+    return {'success': True, 'rooms': rooms}
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    rooms, _ = _subscription_rooms(data)
+    for room in rooms:
+        leave_room(room)
+    return {'success': bool(rooms), 'rooms': rooms}
 
 @app.route('/api/zones', methods=['GET', 'POST'])
 def handle_zones():
@@ -1404,6 +1587,24 @@ def handle_zone(zone_id):
             return jsonify({'error': 'Error al eliminar la zona'}), 500
 
 
+@app.route('/api/zones/<int:zone_id>/dwell')
+def get_zone_dwell(zone_id):
+    start_date = request.args.get('start_date', default=None, type=str)
+    end_date = request.args.get('end_date', default=None, type=str)
+    imei = request.args.get('imei', default=None, type=str)
+
+    if not start_date or not end_date:
+        return jsonify({"error": "Se requieren fechas de inicio y fin"}), 400
+
+    try:
+        data = DataManager.get_zone_dwell(zone_id, start_date, end_date, imei)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if data is None:
+        return jsonify({"error": "Zona no encontrada"}), 404
+    return jsonify(data)
+
+
 @app.route('/api/zones/imei/<imei>')
 def get_zones_for_imei(imei):
     zones = DataManager.get_zones_for_imei(imei)
@@ -1419,15 +1620,36 @@ def shutdown_session(exception=None):
 def emit_gps_update(imei, data):
     latitude = data['Location']['Latitude']
     longitude = data['Location']['Longitude']
-    zones = DataManager.get_zones_for_imei(imei)
-    current_zone = None
-    for zone in zones:
-        if point_in_polygon(latitude, longitude, zone['coordinates']):
-            current_zone = zone['name']
-            break
-    
+    zone = DataManager.find_zone(imei, latitude, longitude)
+    current_zone = zone.name if zone else None
+
     data['current_zone'] = current_zone
-    socketio.emit('gps_update', {'imei': imei, 'data': data})
+    if push_scheduler.interval > 0:
+        # Se envía agrupado en el próximo tick como gps_updates
+        push_scheduler.push(imei, {'imei': imei, 'data': data})
+        return
+    # Sólo a los clientes suscritos al IMEI o a su empresa/usuario asignado
+    socketio.emit('gps_update', {'imei': imei, 'data': data}, to=device_rooms.rooms_for(imei))
+
+
+def emit_zone_events(events):
+    """Emite los eventos zone_enter/zone_exit generados por un paquete"""
+    for event in events:
+        socketio.emit(event['type'], event, to=device_rooms.rooms_for(event['imei']))
+
+
+def handle_bus_gps_update(message):
+    # La ingesta puede correr en otro proceso: mantener al día la caché de este
+    DataManager.update_latest([(message['imei'], [message['data']])])
+    emit_gps_update(message['imei'], message['data'])
+
+
+# La ingesta publica en el bus; cada proceso de la API emite a sus clientes. Los
+# mensajes de otros procesos llegan después de listen(): en post_worker_init con
+# gunicorn, o en start_api/main.py sin él
+message_bus = get_message_bus()
+message_bus.subscribe(TOPIC_GPS_UPDATE, handle_bus_gps_update)
+message_bus.subscribe(TOPIC_ZONE_EVENTS, emit_zone_events)
 
 
 def point_in_polygon(x, y, poly):
@@ -1471,6 +1693,7 @@ def start_api(shutdown_event: Event = None):
     
     # Configurar Flask
     app.config.update(Config.get_flask_config())
+    message_bus.listen()
     
     if os.getenv('FLASK_ENV') == 'production':
         # En producción, usar el puerto proporcionado por DigitalOcean
@@ -1504,4 +1727,5 @@ def start_api(shutdown_event: Event = None):
 if __name__ == "__main__":
     # Si se ejecuta directamente, iniciar la API
     port = int(os.getenv('PORT', '8080'))
+    message_bus.listen()
     socketio.run(app, host='0.0.0.0', port=port)
\ No newline at end of file
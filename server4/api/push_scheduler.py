@@ -0,0 +1,184 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from utils.metrics import Metrics
+
+
+class PushScheduler:
+    """
+    Agrupa las actualizaciones en tiempo real y las envía una vez por tick.
+
+    Entre ticks se guarda sólo la última actualización de cada IMEI; en
+    cada tick cada cliente recibe un único mensaje `gps_updates` (lista de
+    {'imei', 'data'}) con lo nuevo de todos sus rooms, una vez por IMEI,
+    en lugar de un frame y una codificación JSON por posición. Los
+    clientes que reciben el mismo conjunto de IMEIs comparten el mensaje
+    (se codifica una vez).
+
+    Los clientes lentos (con más de `max_backlog` paquetes sin enviar en
+    su socket) se saltan en el envío y sus actualizaciones quedan
+    retenidas por IMEI, reemplazando las anteriores; cuando vacían su cola
+    reciben sólo la última posición de cada dispositivo, en el mismo
+    mensaje que lo nuevo del tick, así la memoria por cliente queda
+    acotada por la cantidad de dispositivos.
+    """
+
+    EVENT = 'gps_updates'
+
+    def __init__(self, emit: Callable, rooms_for: Callable[[str], List[str]], interval: float = 1.0,
+                 participants: Optional[Callable[[str], Iterable[Tuple[str, str]]]] = None,
+                 backlog: Optional[Callable[[str], Optional[int]]] = None, max_backlog: int = 64,
+                 start_task: Optional[Callable] = None, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            emit: Función como socketio.emit(event, data, to=..., skip_sid=...)
+            rooms_for: Función imei -> rooms que reciben sus actualizaciones
+            interval (float): Segundos entre envíos
+            participants: Función room -> pares (sid, eio_sid) de los clientes en el room
+            backlog: Función eio_sid -> paquetes pendientes en el socket, o None si ya no existe
+            max_backlog (int): Paquetes pendientes desde los que un cliente se considera lento
+            start_task: Función para lanzar el loop (p. ej. socketio.start_background_task);
+                por defecto un thread daemon
+            sleep: Función de espera compatible con `start_task`
+        """
+        self.emit = emit
+        self.rooms_for = rooms_for
+        self.interval = interval
+        self.participants = participants
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self.start_task = start_task
+        self.sleep = sleep
+        self._pending: Dict[str, dict] = {}
+        # sid -> {imei: actualización} de los clientes lentos
+        self._held: Dict[str, Dict[str, dict]] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._stopped = False
+
+    def push(self, imei: str, update: dict) -> None:
+        """Encola la actualización de un IMEI para el próximo tick (reemplaza la anterior)"""
+        with self._lock:
+            if imei in self._pending:
+                Metrics.increment('push.coalesced')
+            self._pending[imei] = update
+            start = not self._started
+            self._started = True
+        Metrics.increment('push.updates')
+        if start:
+            self.start()
+
+    def start(self) -> None:
+        self._started = True
+        self._stopped = False
+        if self.start_task is not None:
+            self.start_task(self.run)
+        else:
+            threading.Thread(target=self.run, name="PushScheduler", daemon=True).start()
+
+    def stop(self) -> None:
+        """Detiene el loop; el último tick envía lo pendiente"""
+        self._stopped = True
+
+    def run(self) -> None:
+        while True:
+            self.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"Error in push scheduler tick: {e}")
+            if self._stopped:
+                break
+        self._started = False
+
+    def tick(self) -> int:
+        """
+        Envía lo acumulado desde el tick anterior
+
+        Returns:
+            int: Mensajes emitidos
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        by_room: Dict[str, List[dict]] = {}
+        for imei, update in pending.items():
+            for room in self.rooms_for(imei):
+                by_room.setdefault(room, []).append(update)
+
+        if self.participants is None:
+            # Sin acceso a los clientes de cada room: un mensaje por room
+            for room, updates in by_room.items():
+                self.emit(self.EVENT, updates, to=room)
+            messages = len(by_room)
+        else:
+            messages = self._emit_per_client(by_room)
+
+        if messages:
+            Metrics.increment('push.messages', messages)
+        Metrics.set_gauge('push.held_clients', len(self._held))
+        return messages
+
+    def _emit_per_client(self, by_room: Dict[str, List[dict]]) -> int:
+        """
+        Une las actualizaciones de todos los rooms de cada cliente (una
+        por IMEI, aunque el dispositivo llegue por su room, el de su
+        empresa y el de su usuario) y emite un mensaje por cada conjunto
+        distinto de actualizaciones, dirigido a todos los clientes que lo
+        reciben. Un cliente lento que ya vació su cola recibe lo retenido
+        junto con lo nuevo, en el mismo mensaje.
+
+        Returns:
+            int: Mensajes emitidos
+        """
+        by_client: Dict[str, Dict[str, dict]] = {}
+        eio_sids: Dict[str, str] = {}
+        for room, updates in by_room.items():
+            for sid, eio_sid in self.participants(room):
+                eio_sids[sid] = eio_sid
+                client = by_client.setdefault(sid, {})
+                for update in updates:
+                    client[update['imei']] = update
+
+        # Clientes con actualizaciones retenidas y nada nuevo en este tick
+        for sid in list(self._held):
+            if sid not in by_client:
+                eio_sid = self._eio_sid(sid)
+                if eio_sid is None:
+                    del self._held[sid]  # El cliente se desconectó
+                    continue
+                by_client[sid], eio_sids[sid] = {}, eio_sid
+
+        groups: Dict[frozenset, Tuple[List[dict], List[str]]] = {}
+        slow = 0
+        for sid, updates in by_client.items():
+            if self._is_slow(eio_sids[sid]):
+                if updates:
+                    self._held.setdefault(sid, {}).update(updates)
+                    slow += 1
+                continue
+            if sid in self._held:
+                # Lo nuevo reemplaza a lo retenido del mismo IMEI
+                updates = dict(self._held.pop(sid), **updates)
+            # Mismas actualizaciones (los mismos objetos), mismo mensaje
+            key = frozenset((imei, id(update)) for imei, update in updates.items())
+            group = groups.setdefault(key, (list(updates.values()), []))
+            group[1].append(sid)
+        if slow:
+            Metrics.increment('push.skipped', slow)
+
+        for updates, sids in groups.values():
+            self.emit(self.EVENT, updates, to=sids)
+        return len(groups)
+
+    def _is_slow(self, eio_sid: str) -> bool:
+        if self.backlog is None or self.max_backlog <= 0:
+            return False
+        return (self.backlog(eio_sid) or 0) > self.max_backlog
+
+    def _eio_sid(self, sid: str) -> Optional[str]:
+        for room_sid, eio_sid in self.participants(sid):
+            if room_sid == sid:
+                return eio_sid
+        return None
@@ -0,0 +1,99 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+def imei_room(imei) -> str:
+    return f"imei:{imei}"
+
+
+def empresa_room(empresa_id) -> str:
+    return f"empresa:{empresa_id}"
+
+
+def usuario_room(usuario_id) -> str:
+    return f"usuario:{usuario_id}"
+
+
+class DeviceRoomMap:
+    """
+    Rooms de Socket.IO que deben recibir las actualizaciones de cada IMEI.
+
+    Cada dispositivo publica en su propio room y en los de las empresas y
+    usuarios a los que está asignado (asignacion_dispositivos). El mapa se
+    carga completo con `loader`, se reemplaza entero al recargarse (las
+    lecturas no usan lock) y se recarga cada `ttl` segundos o cuando se
+    invalida porque cambió una asignación. De las mismas filas salen los
+    rooms a los que puede suscribirse cada usuario.
+    """
+
+    def __init__(self, loader: Callable[[], Optional[Iterable[dict]]], ttl: float = 60.0):
+        """
+        Args:
+            loader: Función que retorna filas con 'imei', 'empresa_id' y 'usuario_id',
+                o None si no pudo leerlas
+            ttl (float): Segundos tras los cuales se vuelve a cargar el mapa
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self._rooms: Dict[str, Tuple[str, ...]] = {}
+        self._user_rooms: Dict[str, FrozenSet[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def rooms_for(self, imei: str) -> List[str]:
+        """Rooms que reciben las actualizaciones del IMEI"""
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.ttl:
+            self._reload()
+        rooms = self._rooms.get(imei)
+        return list(rooms) if rooms else [imei_room(imei)]
+
+    def user_rooms(self, usuario_id) -> FrozenSet[str]:
+        """
+        Rooms a los que puede suscribirse un usuario: el suyo, el de cada
+        IMEI asignado a él y el de las empresas de esas asignaciones
+        """
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.ttl:
+            self._reload()
+        return self._user_rooms.get(str(usuario_id), frozenset((usuario_room(usuario_id),)))
+
+    def invalidate(self) -> None:
+        """Fuerza la recarga en la próxima consulta"""
+        self._loaded_at = None
+
+    def _reload(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            return  # Otro thread está recargando; usar el mapa actual
+        try:
+            # Marcar antes de leer: un invalidate() durante la carga fuerza otra recarga
+            self._loaded_at = time.monotonic()
+            try:
+                assignments = self.loader()
+            except Exception as e:
+                logging.error(f"Failed to load device assignments for socket rooms: {e}")
+                assignments = None
+            # Ante un error se conserva el mapa anterior y se reintenta tras el TTL
+            if assignments is None:
+                return
+            rooms: Dict[str, List[str]] = {}
+            user_rooms: Dict[str, set] = {}
+            for row in assignments:
+                imei = row.get('imei')
+                if not imei:
+                    continue
+                device_rooms = rooms.setdefault(imei, [imei_room(imei)])
+                if row.get('empresa_id') is not None:
+                    device_rooms.append(empresa_room(row['empresa_id']))
+                if row.get('usuario_id') is not None:
+                    device_rooms.append(usuario_room(row['usuario_id']))
+                    allowed = user_rooms.setdefault(str(row['usuario_id']), {usuario_room(row['usuario_id'])})
+                    allowed.add(imei_room(imei))
+                    if row.get('empresa_id') is not None:
+                        allowed.add(empresa_room(row['empresa_id']))
+            self._rooms = {imei: tuple(dict.fromkeys(device_rooms)) for imei, device_rooms in rooms.items()}
+            self._user_rooms = {usuario_id: frozenset(allowed) for usuario_id, allowed in user_rooms.items()}
+        finally:
+            self._lock.release()
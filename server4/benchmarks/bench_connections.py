@@ -0,0 +1,152 @@
+"""
+Benchmark de conexiones concurrentes del servidor GPS.
+
+Levanta el servidor (motor 'asyncio' o 'threaded') en un proceso hijo, abre N
+conexiones que completan el handshake de IMEI y se quedan inactivas, y mide
+cuántas quedan aceptadas y la memoria (RSS) por dispositivo.
+
+Uso:
+    python benchmarks/bench_connections.py --engine asyncio --connections 20000
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+
+import psutil
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def serve(engine: str, port: int):
+    """Modo servidor: arranca el motor indicado y espera indefinidamente"""
+    os.environ['SERVER_ENGINE'] = engine
+    os.environ['SERVER_PORT'] = str(port)
+    from server.gps_server import GPSServerInstance
+
+    server = GPSServerInstance.get_instance()
+    if not server.start():
+        sys.exit(1)
+    print("READY", flush=True)
+    while True:
+        time.sleep(3600)
+
+
+def wait_for_port(port: int, timeout: float = 30) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+
+async def open_devices(port: int, count: int, concurrency: int, timeout: float):
+    """Abre `count` conexiones autenticadas y las devuelve abiertas"""
+    writers = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def connect(i: int):
+        nonlocal failures
+        imei = f"35{i:013d}".encode('ascii')
+        async with semaphore:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+                writer.write(len(imei).to_bytes(2, 'big') + imei)
+                await writer.drain()
+                if await asyncio.wait_for(reader.readexactly(1), timeout) != b'\x01':
+                    failures += 1
+                    writer.close()
+                    return
+                writers.append(writer)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                failures += 1
+
+    await asyncio.gather(*(connect(i) for i in range(count)))
+    return writers, failures
+
+
+def raise_file_limit():
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def run(args):
+    raise_file_limit()
+    env = dict(os.environ, FLASK_ENV='development', LOG_LEVEL='WARNING',
+               MAX_CONNECTIONS=str(args.connections + 10))
+    proc = subprocess.Popen(
+        [sys.executable, __file__, '--serve', '--engine', args.engine, '--port', str(args.port)],
+        cwd=str(ROOT_DIR), env=env, stdout=subprocess.PIPE
+    )
+    try:
+        if not wait_for_port(args.port):
+            print("Server did not start")
+            return
+        server = psutil.Process(proc.pid)
+        time.sleep(1)
+        rss_before = server.memory_info().rss
+        threads_before = server.num_threads()
+
+        loop = asyncio.new_event_loop()
+        start = time.perf_counter()
+        writers, failures = loop.run_until_complete(
+            open_devices(args.port, args.connections, args.concurrency, args.timeout)
+        )
+        elapsed = time.perf_counter() - start
+        time.sleep(args.settle)
+
+        rss_after = server.memory_info().rss
+        connected = len(writers)
+        per_device = (rss_after - rss_before) / connected if connected else 0
+
+        print(f"engine:              {args.engine}")
+        print(f"requested:           {args.connections}")
+        print(f"connected (idle):    {connected}")
+        print(f"failed:              {failures}")
+        print(f"connect time:        {elapsed:.2f} s ({connected / elapsed:.0f} conn/s)")
+        print(f"server threads:      {threads_before} -> {server.num_threads()}")
+        print(f"server RSS:          {rss_before / 2**20:.1f} MiB -> {rss_after / 2**20:.1f} MiB")
+        print(f"memory per device:   {per_device / 1024:.1f} KiB")
+
+        for writer in writers:
+            writer.close()
+        loop.close()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', choices=['asyncio', 'threaded'], default='asyncio')
+    parser.add_argument('--connections', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--port', type=int, default=16006)
+    parser.add_argument('--timeout', type=float, default=10.0, help="timeout por conexión (s)")
+    parser.add_argument('--settle', type=float, default=2.0, help="segundos de espera antes de medir")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.engine, args.port)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
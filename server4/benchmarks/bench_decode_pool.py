@@ -0,0 +1,106 @@
+"""
+Benchmark de la decodificación en los threads de I/O contra el DecodePool.
+
+Simula `--connections` threads de I/O (como los ClientHandler) que reciben
+paquetes AVL de `--records` registros a una tasa total fija durante
+`--duration` segundos y los decodifican en el propio thread o en el pool
+de procesos. Reporta la tasa lograda, la latencia de cada paquete desde
+que "llegó" (p50/p99) y el retraso de un thread que sólo duerme 1 ms en
+bucle, como medida de cuánto espera el GIL el trabajo de sockets.
+
+Uso:
+    python benchmarks/bench_decode_pool.py --rates 1000 5000 20000 --processes 4
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from packets import build_codec8_packet
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(decode, packets, rate, connections, duration):
+    """Tasa lograda, latencias por paquete y retrasos del thread de 'sockets'"""
+    latencies = [[] for _ in range(connections)]
+    interval = connections / rate
+    start = time.perf_counter() + 0.1
+    end = start + duration
+
+    def io_thread(index):
+        scheduled = start + index * interval / connections
+        packet = packets[index % len(packets)]
+        while scheduled < end:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            decode('356307042441013', packet)
+            latencies[index].append(time.perf_counter() - scheduled)
+            scheduled += interval
+
+    lags = []
+
+    def socket_thread():
+        while time.perf_counter() < end:
+            before = time.perf_counter()
+            time.sleep(0.001)
+            lags.append(time.perf_counter() - before - 0.001)
+
+    threads = [threading.Thread(target=io_thread, args=(i,)) for i in range(connections)]
+    threads.append(threading.Thread(target=socket_thread))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    samples = [latency for thread_latencies in latencies for latency in thread_latencies]
+    return len(samples) / elapsed, samples, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', type=int, nargs='+', default=[1000, 5000, 20000], help="paquetes/s ofrecidos")
+    parser.add_argument('--records', type=int, default=10, help="registros AVL por paquete")
+    parser.add_argument('--connections', type=int, default=100, help="threads de I/O")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    # Los procesos del pool configuran su logging desde el entorno
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    os.environ['LOG_FILE'] = os.path.join(tempfile.mkdtemp(), 'bench_decode_pool.log')
+    logging.disable(logging.WARNING)
+    from server.decode_pool import DecodePool, decode_packet
+
+    packets = [build_codec8_packet(args.records, seed=i) for i in range(64)]
+    pool = DecodePool(args.processes, batch_size=args.batch_size)
+    expected = [decode_packet('356307042441013', packet) for packet in packets]
+    assert [pool.decode('356307042441013', packet) for packet in packets] == expected, "decoded records differ"
+
+    print(f"{args.records} records/packet, {args.connections} I/O threads, {args.duration:.0f} s per run, "
+          f"{args.processes} decode processes, {os.cpu_count()} CPUs")
+    print(f"{'offered':>9} {'mode':<8} {'achieved':>12} {'p50 ms':>9} {'p99 ms':>9} {'socket lag p99 ms':>18}")
+    for rate in args.rates:
+        for mode, decode in (("thread", decode_packet), ("pool", pool.decode)):
+            achieved, latencies, lags = run(decode, packets, rate, args.connections, args.duration)
+            print(f"{rate:>9,} {mode:<8} {achieved:>10,.0f}/s {percentile(latencies, 0.5) * 1000:>9.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:>9.2f} {percentile(lags, 0.99) * 1000:>18.2f}")
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
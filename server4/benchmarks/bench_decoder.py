@@ -0,0 +1,147 @@
+"""
+Microbenchmark del decodificador AVL: parser hexadecimal original contra
+el decodificador binario (struct.Struct + unpack_from sobre memoryview).
+
+Uso:
+    python benchmarks/bench_decoder.py --records 25 --packets 20000
+"""
+import sys
+import time
+import struct
+import logging
+import argparse
+import binascii
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from utils.decoder import Decoder, IO_ID_MAPPING
+from packets import CAPTURED_PACKETS, build_codec8_packet
+
+
+class HexDecoder:
+    """Copia del decodificador basado en strings hexadecimales (referencia 'antes')"""
+
+    def __init__(self, payload, imei):
+        self.payload = payload
+        self.imei = imei
+        self.index = 0
+
+    def decode_data(self):
+        self.index = 16
+        codec_id = int(self.payload[self.index:self.index + 2], 16)
+        self.index += 2
+        if codec_id != 0x08:
+            raise ValueError(f"Unsupported codec ID: {codec_id}")
+        num_of_data = int(self.payload[self.index:self.index + 2], 16)
+        self.index += 2
+        return [self.parse_avl_record() for _ in range(num_of_data)]
+
+    def parse_avl_record(self):
+        timestamp = struct.unpack('>Q', bytes.fromhex(self.payload[self.index:self.index + 16]))[0]
+        timestamp = datetime.fromtimestamp(timestamp / 1000, timezone.utc)
+        self.index += 16
+        priority = int(self.payload[self.index:self.index + 2], 16)
+        self.index += 2
+        longitude = struct.unpack('>i', bytes.fromhex(self.payload[self.index:self.index + 8]))[0] / 10000000.0
+        self.index += 8
+        latitude = struct.unpack('>i', bytes.fromhex(self.payload[self.index:self.index + 8]))[0] / 10000000.0
+        self.index += 8
+        altitude = struct.unpack('>H', bytes.fromhex(self.payload[self.index:self.index + 4]))[0]
+        self.index += 4
+        angle = struct.unpack('>H', bytes.fromhex(self.payload[self.index:self.index + 4]))[0]
+        self.index += 4
+        satellites = int(self.payload[self.index:self.index + 2], 16)
+        self.index += 2
+        speed = struct.unpack('>H', bytes.fromhex(self.payload[self.index:self.index + 4]))[0]
+        self.index += 4
+        return {
+            "IMEI": self.imei,
+            "DateTime": timestamp.isoformat(),
+            "Priority": priority,
+            "Location": {
+                "Longitude": longitude,
+                "Latitude": latitude,
+                "Altitude": altitude,
+                "Angle": angle,
+                "Satellites": satellites,
+                "Speed": speed,
+            },
+            "I/O Data": self.parse_io_data()
+        }
+
+    def parse_io_data(self):
+        io_records = {}
+        io_records['Event IO ID'] = int(self.payload[self.index:self.index + 2], 16)
+        self.index += 4
+        for io_size in [1, 2, 4, 8]:
+            n_items = int(self.payload[self.index:self.index + 2], 16)
+            self.index += 2
+            for _ in range(n_items):
+                io_id = int(self.payload[self.index:self.index + 2], 16)
+                self.index += 2
+                # El original usaba "BHIQ"[io_size // 2], que falla con IO de 8 bytes
+                fmt = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}[io_size]
+                io_value = struct.unpack(f'>{fmt}', bytes.fromhex(self.payload[self.index:self.index + io_size * 2]))[0]
+                self.index += io_size * 2
+                io_records[IO_ID_MAPPING.get(io_id, f'IO ID {io_id}')] = io_value
+        return io_records
+
+
+def verify_captured_packets(imei):
+    """Decodifica los paquetes de referencia de cada codec y compara los valores esperados"""
+    for name, packet_hex, codec_id, num_records, expected in CAPTURED_PACKETS:
+        decoder = Decoder(bytes.fromhex(packet_hex), imei)
+        records = decoder.decode_data()
+        assert decoder.codec.codec_id == codec_id, name
+        assert len(records) == num_records, name
+        first = decoder.responses[0] if decoder.is_command else records[0]
+        flat = dict(first, **first.get("I/O Data", {}))
+        for key, value in expected.items():
+            assert flat[key] == value, f"{name}: {key}={flat[key]!r}, expected {value!r}"
+        print(f"ok  {name:<26} {decoder.codec.name}")
+
+
+def bench(label, fn, packets, records_per_packet):
+    start = time.perf_counter()
+    for packet in packets:
+        fn(packet)
+    elapsed = time.perf_counter() - start
+    total = len(packets) * records_per_packet
+    rate = total / elapsed
+    print(f"{label:<28} {elapsed:8.3f} s  {rate:12,.0f} records/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=25, help="registros AVL por paquete")
+    parser.add_argument('--packets', type=int, default=20000)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    imei = '356307042441013'
+    packets = [build_codec8_packet(args.records, seed=i) for i in range(64)]
+    packets = (packets * (args.packets // len(packets) + 1))[:args.packets]
+
+    verify_captured_packets(imei)
+
+    # Ambos decodificadores deben producir exactamente los mismos registros
+    for packet in packets[:64]:
+        expected = HexDecoder(binascii.hexlify(packet).decode(), imei).decode_data()
+        assert Decoder(packet, imei).decode_data() == expected, "decoded records differ"
+
+    print(f"{args.packets} packets x {args.records} records")
+    before = bench("hex string (hexlify+parse)",
+                   lambda p: HexDecoder(binascii.hexlify(p).decode(), imei).decode_data(),
+                   packets, args.records)
+    after = bench("binary (struct/memoryview)",
+                  lambda p: Decoder(p, imei).decode_data(),
+                  packets, args.records)
+    print(f"speedup: {after / before:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark de la entrega de gps_update a los clientes Socket.IO.
+
+Conecta `--clients` clientes de prueba, cada uno suscrito a la empresa de
+uno de sus paneles, y emite `--fixes` posiciones de dispositivos al azar.
+Los dispositivos envían ráfagas de `--burst` posiciones seguidas. Compara
+el broadcast anterior (cada posición a todos los clientes), la entrega por
+rooms de a una posición (gps_update) y la entrega agrupada por tick del
+PushScheduler (gps_updates), contando mensajes entregados y tiempo de
+emisión. Con `--slow-clients` parte de los clientes se marca como lenta
+durante la mitad de los ticks.
+
+Uso:
+    python benchmarks/bench_fanout.py --clients 300 --devices 2000 --empresas 50 --fixes 2000
+    python benchmarks/bench_fanout.py --burst 10 --ticks 20 --slow-clients 30
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+from collections import Counter
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--devices', type=int, default=2000)
+    parser.add_argument('--empresas', type=int, default=50)
+    parser.add_argument('--fixes', type=int, default=2000)
+    parser.add_argument('--burst', type=int, default=5, help="posiciones seguidas por dispositivo")
+    parser.add_argument('--ticks', type=int, default=10, help="ticks del PushScheduler en que se reparten las posiciones")
+    parser.add_argument('--slow-clients', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench_fanout.db')
+    from api import api
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(0)
+    imeis = [f"35{i:013d}" for i in range(args.devices)]
+    assignments = [{'imei': imei, 'empresa_id': i % args.empresas, 'usuario_id': None} for i, imei in enumerate(imeis)]
+    # Asignaciones sintéticas en lugar de asignacion_dispositivos
+    api.device_rooms.loader = lambda: assignments
+    api.device_rooms.invalidate()
+
+    # Las versiones recientes de python-socketio envían los eventos con
+    # _send_eio_packet (codificados una sola vez), que el cliente de prueba de
+    # Flask-SocketIO no intercepta; se cuentan aquí los envíos por cliente.
+    sent = Counter()
+    api.socketio.server._send_eio_packet = lambda eio_sid, eio_packet: sent.update((eio_sid,))
+
+    clients = []
+    for i in range(args.clients):
+        client = api.socketio.test_client(api.app)
+        client.emit('subscribe', {'empresa_id': i % args.empresas})
+        clients.append(client)
+    for client in clients:
+        client.get_received()
+    sent.clear()
+
+    def fix(imei):
+        return {'DateTime': '2024-01-01T00:00:00+00:00',
+                'Location': {'Latitude': rng.uniform(-34, -33), 'Longitude': rng.uniform(-71, -70),
+                             'Altitude': 500, 'Angle': 90, 'Satellites': 10, 'Speed': 40}}
+
+    def broadcast(imei, data):
+        data['current_zone'] = None
+        api.socketio.emit('gps_update', {'imei': imei, 'data': data})
+
+    scheduler = api.push_scheduler
+    scheduler.start_task = lambda run: None  # Los ticks se llaman a mano
+    slow_sids = {client.eio_sid for client in clients[:args.slow_clients]}
+    slow_phase = [False]
+    scheduler.backlog = lambda eio_sid: 10 ** 6 if slow_phase[0] and eio_sid in slow_sids else 0
+    scheduler.participants = lambda room: api.socketio.server.manager.get_participants('/', room)
+    fixes_per_tick = max(1, args.fixes // args.ticks)
+
+    def coalesced(imei, data):
+        api.emit_gps_update(imei, data)
+        coalesced.count += 1
+        if coalesced.count % fixes_per_tick == 0:
+            slow_phase[0] = coalesced.count <= args.fixes // 2
+            scheduler.tick()
+    coalesced.count = 0
+
+    sample = []
+    while len(sample) < args.fixes:
+        sample.extend([rng.choice(imeis)] * args.burst)
+    sample = sample[:args.fixes]
+    print(f"{args.clients} clients, {args.devices} devices in {args.empresas} empresas, "
+          f"{args.fixes} fixes in bursts of {args.burst}, {args.ticks} ticks")
+    for label, emit, interval in (("broadcast (before)", broadcast, 0), ("rooms", api.emit_gps_update, 0),
+                                  ("rooms + coalescing", coalesced, 1.0)):
+        scheduler.interval = interval
+        start = time.perf_counter()
+        for imei in sample:
+            emit(imei, fix(imei))
+        if interval:
+            slow_phase[0] = False
+            scheduler.tick()
+        elapsed = time.perf_counter() - start
+        delivered = sum(len(client.get_received()) for client in clients) + sum(sent.values())
+        sent.clear()
+        print(f"{label:<20} {elapsed:8.3f} s  {args.fixes / elapsed:10,.0f} fixes/s  "
+              f"{delivered:10,} messages ({delivered / args.fixes:.1f} per fix)")
+
+    if args.slow_clients:
+        from utils.metrics import Metrics
+        print(f"slow clients: {Metrics.get('push.skipped'):,} room messages skipped, "
+              f"{len(scheduler._held)} clients still held")
+
+    for client in clients:
+        client.disconnect()
+
+
+if __name__ == '__main__':
+    main()
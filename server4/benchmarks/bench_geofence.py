@@ -0,0 +1,162 @@
+"""
+Benchmark de la evaluación de geocercas por posición recibida.
+
+Compara el camino anterior de emit_gps_update (consultar las zonas del
+IMEI en SQLite, decodificar sus coordenadas y recorrerlas con
+point_in_polygon) contra el ZoneIndex precompilado, recorriendo las zonas
+del IMEI o consultando el R-tree, y verifica que den la misma zona para
+cada punto. Después mueve y borra zonas con actualizaciones incrementales
+y vuelve a verificar contra un índice reconstruido. Por último clasifica
+`--history` posiciones contra una zona de una vez (reporte de permanencia).
+
+Uso:
+    python benchmarks/bench_geofence.py --zones 200 --vertices 50 --points 2000
+    python benchmarks/bench_geofence.py --zones 5000 --vertices 20 --previous-points 50
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+# Región de Santiago, en [lat, lng] como las guarda el panel
+LAT_RANGE = (-33.7, -33.2)
+LNG_RANGE = (-70.9, -70.4)
+
+
+def random_polygon(rng, vertices):
+    """Polígono estrellado (no convexo) alrededor de un centro aleatorio"""
+    center_lat = rng.uniform(*LAT_RANGE)
+    center_lng = rng.uniform(*LNG_RANGE)
+    radius = rng.uniform(0.005, 0.03)
+    points = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        r = radius * rng.uniform(0.5, 1.0)
+        points.append([center_lat + r * math.sin(angle), center_lng + r * math.cos(angle)])
+    return points
+
+
+def zone_points(zone):
+    """Vértices de una zona guardada, como los devuelve la base de datos"""
+    from data.database import Database
+    row = Database.get_connection().execute('SELECT coordinates FROM zones WHERE id = ?', (zone.id,)).fetchone()
+    return json.loads(row['coordinates'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--zones', type=int, default=200, help="zonas asignadas a cada dispositivo")
+    parser.add_argument('--vertices', type=int, default=50)
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--points', type=int, default=2000)
+    parser.add_argument('--history', type=int, default=200000, help="posiciones de historial a clasificar contra una zona")
+    parser.add_argument('--previous-points', type=int, default=2000,
+                        help="puntos a evaluar con el camino anterior (es lento con muchas zonas)")
+    args = parser.parse_args()
+
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench_geofence.db')
+    logging.disable(logging.WARNING)
+
+    from data.database import Database
+    from data.data_manager import DataManager
+    from utils.geofence import ZoneIndex
+
+    rng = random.Random(0)
+    imeis = [f"35{i:013d}" for i in range(args.devices)]
+    for i in range(args.zones):
+        Database.insert_zone(f"zone-{i}", random_polygon(rng, args.vertices), imeis)
+
+    points = [(rng.choice(imeis), rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for _ in range(args.points)]
+    print(f"{args.zones} zones x {args.vertices} vertices per device, {args.points} points")
+
+    def previous(imei, lat, lng):
+        for zone in Database.get_zones_by_imei(imei):
+            if Database.point_in_polygon(lat, lng, json.loads(zone['coordinates'])):
+                return zone['name']
+        return None
+
+    def indexed(imei, lat, lng):
+        zone = DataManager.find_zone(imei, lat, lng)
+        return zone.name if zone else None
+
+    start = time.perf_counter()
+    zone_index = DataManager.get_zone_index()
+    print(f"index build (STR)            {(time.perf_counter() - start) * 1000:10.1f} ms  "
+          f"R-tree height {zone_index.tree.height()}")
+
+    def run(label, func, sample):
+        start = time.perf_counter()
+        result = [func(*point) for point in sample]
+        elapsed = time.perf_counter() - start
+        print(f"{label:<28} {elapsed / len(sample) * 1e6:10.1f} us/point  {len(sample) / elapsed:12,.0f} points/s")
+        return result
+
+    limit = ZoneIndex.LINEAR_SCAN_LIMIT
+    ZoneIndex.LINEAR_SCAN_LIMIT = float('inf')
+    linear = run("ZoneIndex (bbox scan)", indexed, points)
+    ZoneIndex.LINEAR_SCAN_LIMIT = 0
+    tree = run("ZoneIndex (R-tree)", indexed, points)
+    ZoneIndex.LINEAR_SCAN_LIMIT = limit
+    sample = points[:args.previous_points]
+    expected = run("db + point_in_polygon", previous, sample)
+
+    mismatches = sum(1 for a, b in zip(expected, tree) if a != b) + sum(1 for a, b in zip(linear, tree) if a != b)
+    inside = sum(1 for zone in tree if zone)
+    print(f"{inside} points inside a zone, {mismatches} mismatches")
+
+    # Cambios incrementales: mover la mitad de las zonas y borrar una de cada cuatro
+    zones = DataManager.get_all_control_zones()
+    start = time.perf_counter()
+    for zone in zones[::2]:
+        DataManager.update_control_zone(zone['id'], zone['name'], random_polygon(rng, args.vertices), imeis)
+    for zone in zones[1::4]:
+        DataManager.delete_control_zone(zone['id'])
+    changes = len(zones[::2]) + len(zones[1::4])
+    print(f"incremental updates          {(time.perf_counter() - start) / changes * 1e6:10.1f} us/change (incl. SQLite)")
+
+    rebuilt = ZoneIndex(DataManager.get_all_control_zones())
+    for imei, lat, lng in points:
+        a = zone_index.find_zone(imei, lat, lng)
+        b = rebuilt.find_zone(imei, lat, lng)
+        if (a and a.id) != (b and b.id):
+            mismatches += 1
+    print(f"after updates: {len(zone_index)} zones, {mismatches} mismatches in total")
+
+    # Clasificación masiva de historial (reporte de permanencia) contra una zona
+    from utils import geofence
+    zone = next(iter(zone_index.zones.values()))
+    lats = [rng.uniform(zone.min_x, zone.max_x) for _ in range(args.history)]
+    lngs = [rng.uniform(zone.min_y, zone.max_y) for _ in range(args.history)]
+    polygon = zone_points(zone)
+    start = time.perf_counter()
+    expected = [Database.point_in_polygon(lat, lng, polygon) for lat, lng in zip(lats, lngs)]
+    previous_time = time.perf_counter() - start
+    print(f"{args.history:,} history fixes vs one zone:")
+    print(f"  {'point_in_polygon per fix':<26} {previous_time * 1000:10.1f} ms")
+    numpy_module = geofence.np
+    for label, module in (("points_in_zone (Python)", None), ("points_in_zone (NumPy)", numpy_module)):
+        if label.endswith("(NumPy)") and module is None:
+            print(f"  {label:<26} {'NumPy not installed':>13}")
+            continue
+        geofence.np = module
+        start = time.perf_counter()
+        inside = geofence.points_in_zone(zone, lats, lngs)
+        print(f"  {label:<26} {(time.perf_counter() - start) * 1000:10.1f} ms")
+        mismatches += sum(1 for a, b in zip(expected, inside) if a != bool(b))
+    geofence.np = numpy_module
+    print(f"{mismatches} mismatches in total")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
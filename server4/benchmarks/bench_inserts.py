@@ -0,0 +1,86 @@
+"""
+Benchmark de escritura de registros GPS en SQLite.
+
+Compara un INSERT + commit por registro (camino anterior) contra un
+executemany + commit por paquete y por grupo de paquetes de varios
+dispositivos, y reporta filas/segundo.
+
+Uso:
+    python benchmarks/bench_inserts.py --packets 2000 --records 25 --group 20
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+
+def build_packets(num_packets, records_per_packet, devices):
+    from utils.decoder import Decoder
+    from packets import build_codec8_packet
+
+    packets = []
+    for i in range(num_packets):
+        imei = f"35{i % devices:013d}"
+        raw = build_codec8_packet(records_per_packet, io_per_size=(1, 1, 0, 0), seed=i)
+        packets.append((imei, Decoder(raw, imei).decode_data()))
+    return packets
+
+
+def run(label, packets, write):
+    from data.database import Database
+
+    Database.get_connection().execute("DELETE FROM gps_data")
+    Database.get_connection().commit()
+    rows = sum(len(records) for _, records in packets)
+    start = time.perf_counter()
+    write(packets)
+    elapsed = time.perf_counter() - start
+    stored = Database.get_connection().execute("SELECT COUNT(*) FROM gps_data").fetchone()[0]
+    assert stored == rows, f"{label}: stored {stored} of {rows} rows"
+    print(f"{label:<34} {elapsed:8.3f} s  {rows / elapsed:12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--packets', type=int, default=2000)
+    parser.add_argument('--records', type=int, default=25, help="registros por paquete")
+    parser.add_argument('--devices', type=int, default=500)
+    parser.add_argument('--group', type=int, default=20, help="paquetes por transacción en modo agrupado")
+    parser.add_argument('--db', default=None, help="archivo SQLite (por defecto uno temporal)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_inserts.db')
+    os.environ['SQLITE_PATH'] = db_path
+    logging.disable(logging.WARNING)
+
+    from data.database import Database
+
+    packets = build_packets(args.packets, args.records, args.devices)
+    print(f"{args.packets} packets x {args.records} records -> {db_path}")
+
+    def per_row(items):
+        for imei, records in items:
+            for record in records:
+                Database.insert_gps_data(imei, record)
+
+    def per_packet(items):
+        for item in items:
+            Database.insert_gps_data_batch([item])
+
+    def grouped(items):
+        for i in range(0, len(items), args.group):
+            Database.insert_gps_data_batch(items[i:i + args.group])
+
+    run("row-by-row (commit per record)", packets, per_row)
+    run("executemany (commit per packet)", packets, per_packet)
+    run(f"executemany ({args.group} packets/commit)", packets, grouped)
+
+
+if __name__ == '__main__':
+    main()
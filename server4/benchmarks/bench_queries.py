@@ -0,0 +1,139 @@
+"""
+Benchmark de las consultas por dispositivo sobre gps_data en SQLite.
+
+Llena una base con `--rows` registros repartidos entre `--devices`
+dispositivos, mide las consultas de Database sin índice (esquema
+anterior), aplica las migraciones sobre la base ya poblada y las vuelve
+a medir.
+
+Uso:
+    python benchmarks/bench_queries.py --rows 10000000 --devices 1000
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+START_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def generate_rows(num_rows, devices, interval):
+    """Registros intercalados por tiempo, como llegan de la flota"""
+    rng = random.Random(0)
+    imeis = [f"35{i:013d}" for i in range(devices)]
+    for i in range(num_rows):
+        step, device = divmod(i, devices)
+        timestamp = START_TIME + timedelta(seconds=step * interval)
+        yield (
+            imeis[device],
+            timestamp.isoformat(),
+            -33.4 + rng.random(),
+            -70.6 + rng.random(),
+            rng.randint(0, 800),
+            rng.randint(0, 359),
+            rng.randint(4, 16),
+            rng.randint(0, 120),
+        )
+
+
+def populate(conn, num_rows, devices, interval, chunk=100000):
+    rows = generate_rows(num_rows, devices, interval)
+    start = time.perf_counter()
+    inserted = 0
+    while inserted < num_rows:
+        batch = [row for _, row in zip(range(chunk), rows)]
+        conn.executemany('''
+            INSERT INTO gps_data (imei, timestamp, latitude, longitude, altitude, angle, satellites, speed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+        inserted += len(batch)
+    return time.perf_counter() - start
+
+
+def measure(label, func, repeat):
+    func()  # calentar caché
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<28} {elapsed * 1000:10.2f} ms")
+    return elapsed
+
+
+def run_queries(imeis, history_day, repeat):
+    from data.database import Database
+
+    day = history_day.strftime('%Y-%m-%d')
+    rng = random.Random(1)
+    pick = lambda: rng.choice(imeis)
+    return {
+        'latest_location': measure('get_latest_location', lambda: Database.get_latest_location(pick()), repeat),
+        'data_by_imei': measure('get_gps_data_by_imei(100)', lambda: Database.get_gps_data_by_imei(pick(), 100), repeat),
+        'history': measure('get_gps_history(1 day)', lambda: Database.get_gps_history(pick(), day, day), repeat),
+        'summary': measure('get_gps_summary', lambda: Database.get_gps_summary(pick()), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--interval', type=int, default=30, help="segundos entre registros de un dispositivo")
+    parser.add_argument('--repeat-before', type=int, default=3, help="repeticiones sin índice (scans completos)")
+    parser.add_argument('--repeat-after', type=int, default=200)
+    parser.add_argument('--db', default=None, help="archivo SQLite (por defecto uno temporal)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_queries.db')
+    os.environ['SQLITE_PATH'] = db_path
+    logging.disable(logging.WARNING)
+
+    from data.database import Database, MIGRATIONS
+
+    conn = Database.get_connection()
+    # Volver al esquema anterior: sin índices y user_version = 0
+    for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'gps_data' AND sql IS NOT NULL").fetchall():
+        conn.execute(f"DROP INDEX {row[0]}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+
+    existing = conn.execute("SELECT COUNT(*) FROM gps_data").fetchone()[0]
+    if existing < args.rows:
+        elapsed = populate(conn, args.rows - existing, args.devices, args.interval)
+        print(f"Inserted {args.rows - existing:,} rows in {elapsed:.1f} s -> {db_path}")
+    total = conn.execute("SELECT COUNT(*) FROM gps_data").fetchone()[0]
+    imeis = [row[0] for row in conn.execute("SELECT DISTINCT imei FROM gps_data").fetchall()]
+    size_mb = os.path.getsize(db_path) / 1e6
+    print(f"{total:,} rows, {len(imeis)} devices, {size_mb:,.0f} MB, "
+          f"journal_mode={conn.execute('PRAGMA journal_mode').fetchone()[0]}")
+
+    steps = total // max(len(imeis), 1)
+    history_day = START_TIME + timedelta(seconds=steps * args.interval // 2)
+
+    print("Without index:")
+    before = run_queries(imeis, history_day, args.repeat_before)
+
+    start = time.perf_counter()
+    version = Database.migrate(conn)
+    print(f"Migrated to schema version {version} (latest {MIGRATIONS[-1][0]}) "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    print("With (imei, timestamp) index:")
+    after = run_queries(imeis, history_day, args.repeat_after)
+
+    print("Speedup:")
+    for name in before:
+        print(f"  {name:<28} {before[name] / after[name]:10.0f}x")
+
+
+if __name__ == '__main__':
+    main()
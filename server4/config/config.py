@@ -39,13 +39,30 @@ class Config:
         'timeout': float(os.getenv('SERVER_TIMEOUT', '1.0')),
         'max_connections': int(os.getenv('MAX_CONNECTIONS', '100')),
         'buffer_size': int(os.getenv('BUFFER_SIZE', '8192')),
-        'reuse_port': True
+        'max_frame_size': int(os.getenv('MAX_FRAME_SIZE', '65536')),
+        'reuse_port': True,
+        # Motor de ingesta: 'threaded' (un thread por conexión) o 'asyncio'
+        'engine': os.getenv('SERVER_ENGINE', 'threaded').lower(),
+        'worker_threads': int(os.getenv('SERVER_WORKER_THREADS', '16')),
+        # Procesos de ingesta que comparten el puerto con SO_REUSEPORT (1: sin supervisor)
+        'processes': int(os.getenv('SERVER_PROCESSES', '1')),
+        'stats_interval': float(os.getenv('SERVER_STATS_INTERVAL', '5.0')),  # reporte de métricas de cada proceso
+        # Procesos que decodifican los paquetes AVL (0: en el thread de I/O)
+        'decode_processes': int(os.getenv('SERVER_DECODE_PROCESSES', '0')),
+        'decode_batch_size': int(os.getenv('SERVER_DECODE_BATCH_SIZE', '64')),  # paquetes por envío al pool
+        'decode_batch_delay': float(os.getenv('SERVER_DECODE_BATCH_DELAY', '0.002')),  # espera máxima para agrupar
+        'decode_timeout': float(os.getenv('SERVER_DECODE_TIMEOUT', '5.0')),
+        # Resolución (s) de la rueda de plazos de autenticación/datos de las conexiones
+        'idle_tick': float(os.getenv('SERVER_IDLE_TICK', '1.0')),
     }
 
     # API
     API_CONFIG = {
         'host': os.getenv('API_HOST', '0.0.0.0'),
         'port': int(os.getenv('PORT', '8080')),  # DigitalOcean usa la variable PORT
+        # Paginación del historial (/api/gps/<imei>/history?page_size=&cursor=)
+        'history_page_size': int(os.getenv('API_HISTORY_PAGE_SIZE', '1000')),
+        'history_max_page_size': int(os.getenv('API_HISTORY_MAX_PAGE_SIZE', '10000')),
     }
 
     # Database
@@ -57,13 +74,97 @@ class Config:
             'user': os.getenv('MYSQL_USER', 'root'),
             'password': os.getenv('MYSQL_PASSWORD', ''),
             'database': os.getenv('MYSQL_DATABASE', 'gps_devline'),
+            'connect_timeout': int(os.getenv('MYSQL_CONNECT_TIMEOUT', '10')),
+            # Pool de conexiones compartido por todos los threads/greenlets
+            'pool_size': int(os.getenv('MYSQL_POOL_SIZE', '10')),
+            'pool_timeout': float(os.getenv('MYSQL_POOL_TIMEOUT', '5.0')),
+            'pool_ping_interval': float(os.getenv('MYSQL_POOL_PING_INTERVAL', '30')),
+            # Particiones mensuales de `ubicaciones` (python -m data.partitions)
+            'partition_months_ahead': int(os.getenv('MYSQL_PARTITION_MONTHS_AHEAD', '2')),
+            'ubicaciones_retention_months': int(os.getenv('MYSQL_UBICACIONES_RETENTION_MONTHS', '0')),  # 0: sin límite
         },
         'sqlite': {
             'database': os.getenv('SQLITE_DATABASE_NAME', 'gps_tracking.db'),
             'path': os.getenv('SQLITE_PATH', str(BASE_DIR / 'data' / 'gps_tracking.db')),
+            # PRAGMAs aplicados a cada conexión
+            'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+            'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'normal'),
+            'cache_size_kb': int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536')),
+            'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+            'busy_timeout_ms': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+            # gps_data en un archivo por mes, adjuntado a demanda (data/partitions.py)
+            'partitioned': _get_boolean(os.getenv('SQLITE_PARTITIONED', 'False')),
+            'partition_dir': os.getenv('SQLITE_PARTITION_DIR', str(BASE_DIR / 'data' / 'partitions')),
+            'max_attached': int(os.getenv('SQLITE_MAX_ATTACHED', '8')),  # SQLite admite 10 por defecto
+            'retention_months': int(os.getenv('SQLITE_RETENTION_MONTHS', '0')),  # 0: sin límite
         }
     }
 
+    # Cola de escritura entre la ingesta y la base de datos
+    WRITE_QUEUE_CONFIG = {
+        'enabled': _get_boolean(os.getenv('WRITE_QUEUE_ENABLED', 'True')),
+        'max_size': int(os.getenv('WRITE_QUEUE_MAX_SIZE', '10000')),  # paquetes en espera
+        'batch_size': int(os.getenv('WRITE_QUEUE_BATCH_SIZE', '200')),  # paquetes por commit
+        'flush_interval': float(os.getenv('WRITE_QUEUE_FLUSH_INTERVAL', '0.2')),
+        'workers': int(os.getenv('WRITE_QUEUE_WORKERS', '1')),
+        'ack_mode': os.getenv('WRITE_QUEUE_ACK_MODE', 'commit'),  # 'commit' o 'enqueue'
+        'enqueue_timeout': float(os.getenv('WRITE_QUEUE_ENQUEUE_TIMEOUT', '1.0')),
+        'commit_timeout': float(os.getenv('WRITE_QUEUE_COMMIT_TIMEOUT', '10.0')),
+    }
+
+    # Caché en memoria de la última posición de cada dispositivo
+    LATEST_CACHE_CONFIG = {
+        'enabled': _get_boolean(os.getenv('LATEST_CACHE_ENABLED', 'True')),
+        'max_size': int(os.getenv('LATEST_CACHE_MAX_SIZE', '50000')),  # dispositivos
+    }
+
+    # Eventos de entrada/salida de zonas de control
+    ZONE_EVENTS_CONFIG = {
+        'enabled': _get_boolean(os.getenv('ZONE_EVENTS_ENABLED', 'True')),
+        'max_size': int(os.getenv('ZONE_EVENTS_QUEUE_MAX_SIZE', '10000')),  # paquetes de eventos en espera
+        'batch_size': int(os.getenv('ZONE_EVENTS_BATCH_SIZE', '500')),
+        'flush_interval': float(os.getenv('ZONE_EVENTS_FLUSH_INTERVAL', '1.0')),
+    }
+
+    # Índice de zonas en memoria (utils/geofence.py)
+    ZONE_INDEX_CONFIG = {
+        # s entre consultas de la versión de las zonas, para ver cambios hechos por otros procesos
+        'check_interval': float(os.getenv('ZONE_INDEX_CHECK_INTERVAL', '2.0')),
+    }
+
+    # Resúmenes por dispositivo y día/hora que mantiene la ingesta (data/rollups.py)
+    ROLLUP_CONFIG = {
+        'enabled': _get_boolean(os.getenv('ROLLUPS_ENABLED', 'True')),
+        'moving_speed': float(os.getenv('ROLLUP_MOVING_SPEED', '3')),  # km/h desde la que hay movimiento
+        'max_gap': float(os.getenv('ROLLUP_MAX_GAP', '300')),  # s máximos entre posiciones en movimiento
+    }
+
+    # Archivo frío columnar de gps_data, un segmento por dispositivo y día (data/archive.py)
+    ARCHIVE_CONFIG = {
+        'enabled': _get_boolean(os.getenv('ARCHIVE_ENABLED', 'False')),
+        'directory': os.getenv('ARCHIVE_DIR', str(BASE_DIR / 'data' / 'archive')),
+        'hot_months': int(os.getenv('ARCHIVE_HOT_MONTHS', '1')),  # meses (el actual incluido) que quedan en gps_data
+        'compression_level': int(os.getenv('ARCHIVE_COMPRESSION_LEVEL', '6')),  # zlib, 1-9
+    }
+
+    # Socket.IO
+    SOCKET_CONFIG = {
+        # Segundos entre recargas del mapa IMEI -> rooms (empresa/usuario asignados)
+        'assignments_ttl': float(os.getenv('SOCKET_ASSIGNMENTS_TTL', '60')),
+        # Segundos entre envíos agrupados de gps_updates (0: un gps_update por posición)
+        'push_interval': float(os.getenv('SOCKET_PUSH_INTERVAL', '1.0')),
+        # Paquetes sin enviar desde los que un cliente recibe sólo la última posición
+        'max_client_backlog': int(os.getenv('SOCKET_MAX_CLIENT_BACKLOG', '64')),
+    }
+
+    # Bus interno entre la ingesta TCP y la API (Socket.IO)
+    MESSAGE_BUS_CONFIG = {
+        'backend': os.getenv('MESSAGE_BUS_BACKEND', 'inprocess'),  # 'inprocess' o 'redis'
+        'redis_url': os.getenv('MESSAGE_BUS_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')),
+        'channel_prefix': os.getenv('MESSAGE_BUS_CHANNEL_PREFIX', 'gps:'),
+        'max_size': int(os.getenv('MESSAGE_BUS_MAX_SIZE', '10000')),  # mensajes en espera
+    }
+
     # CORS
     CORS_CONFIG = {
         'origins': [
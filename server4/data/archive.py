@@ -0,0 +1,470 @@
+"""
+Archivo frío de gps_data: un segmento columnar comprimido por dispositivo y día.
+
+Los meses cerrados salen de gps_data (la base principal o sus archivos
+mensuales) a `ARCHIVE_DIR/<imei>/<AAAA-MM-DD>.gpsc`. Cada columna se
+guarda por separado y comprimida con zlib: enteros, timestamps
+(microsegundos) y coordenadas (grados * 1e7, la resolución de Teltonika)
+como diferencias con la fila anterior, que en un recorrido son números
+chicos y repetidos. Una lectura sólo descomprime las columnas que usa.
+
+Las lecturas de historial de Database combinan los segmentos con las
+filas que siguen en gps_data, así los datos archivados y los que llegan
+atrasados para un día ya archivado se ven juntos y en orden.
+
+Uso:
+    python -m data.archive compact              # archiva los meses cerrados (cron diario)
+    python -m data.archive compact --months 3   # deja en gps_data los últimos 3 meses
+"""
+import os
+import sys
+import json
+import zlib
+import struct
+import sqlite3
+import logging
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él las columnas se decodifican en Python
+    np = None
+
+from .partitions import add_months, current_month
+
+# Columnas de gps_data que guarda cada segmento (el imei es el directorio)
+ARCHIVE_COLUMNS = ('id', 'timestamp', 'latitude', 'longitude', 'altitude', 'angle', 'satellites', 'speed')
+_KINDS = {'timestamp': 'timestamp', 'latitude': 'coordinate', 'longitude': 'coordinate'}
+
+# Cabecera: magic, versión, filas, columnas; luego por columna: índice, codificación, largo
+MAGIC = b'GPSC'
+VERSION = 1
+_HEADER = struct.Struct('<4sBIB')
+_COLUMN = struct.Struct('<BBI')
+
+# Codificaciones de columna; JSON cubre lo que no entra en las demás (nulos, timestamps fuera de UTC)
+DELTA, TIMESTAMP, SCALED, FLOAT, JSON = range(5)
+
+COORDINATE_SCALE = 10 ** 7
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+SUFFIX = '.gpsc'
+
+# Filas por transacción de la compactación: acota cuánto espera la ingesta
+COMPACT_BATCH_ROWS = 5000
+
+
+def _micros(timestamp: str) -> int:
+    delta = datetime.fromisoformat(timestamp) - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _iso(micros: int) -> str:
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def _iso_column(micros) -> List[str]:
+    """_iso de toda una columna, sin armar un datetime por fila"""
+    if np is not None:
+        micros = np.asarray(micros, dtype='<i8')
+        seconds = np.datetime_as_string((micros // 1000000).astype('datetime64[s]'), unit='s').tolist()
+        fractions = (micros % 1000000).tolist()
+    else:
+        days = {}
+        seconds, fractions = [], []
+        for value in micros:
+            second, fraction = divmod(value, 1000000)
+            day, second = divmod(second, 86400)
+            prefix = days.get(day)
+            if prefix is None:
+                prefix = days[day] = (EPOCH + timedelta(days=day)).date().isoformat()
+            hour, second = divmod(second, 3600)
+            minute, second = divmod(second, 60)
+            seconds.append(f'{prefix}T{hour:02d}:{minute:02d}:{second:02d}')
+            fractions.append(fraction)
+    # Igual que isoformat(): sin fracción cuando los microsegundos son 0
+    return [f'{second}.{fraction:06d}+00:00' if fraction else f'{second}+00:00'
+            for second, fraction in zip(seconds, fractions)]
+
+
+def _pack(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _pack_deltas(values: Sequence[int]) -> bytes:
+    return _pack(array('q', [value - previous for previous, value in zip([0] + list(values), values)]))
+
+
+def _unpack_deltas(data: bytes):
+    if np is not None:
+        return np.frombuffer(data, dtype='<i8').cumsum()
+    return list(accumulate(_unpack('q', data)))
+
+
+def _encode_column(kind: str, values: list):
+    """(codificación, bytes sin comprimir) de una columna; sólo usa una codificación si ida y vuelta da lo mismo"""
+    try:
+        if kind == 'timestamp':
+            micros = [_micros(value) for value in values]
+            if [_iso(value) for value in micros] == values:
+                return TIMESTAMP, _pack_deltas(micros)
+        elif kind == 'coordinate':
+            scaled = [round(value * COORDINATE_SCALE) for value in values]
+            if all(value / COORDINATE_SCALE == original for value, original in zip(scaled, values)):
+                return SCALED, _pack_deltas(scaled)
+            return FLOAT, _pack(array('d', values))
+        elif all(type(value) is int for value in values):
+            return DELTA, _pack_deltas(values)
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return JSON, json.dumps(values).encode()
+
+
+def _decode_column(encoding: int, data: bytes) -> list:
+    if encoding == JSON:
+        return json.loads(data)
+    if encoding == FLOAT:
+        return list(_unpack('d', data))
+    values = _unpack_deltas(data)
+    if encoding == SCALED:
+        return (values / COORDINATE_SCALE).tolist() if np is not None else [value / COORDINATE_SCALE for value in values]
+    if encoding == TIMESTAMP:
+        return _iso_column(values)
+    return values.tolist() if np is not None else values
+
+
+def encode_segment(columns: Dict[str, list], level: int = 6) -> bytes:
+    """Segmento con las columnas de ARCHIVE_COLUMNS (listas del mismo largo)"""
+    count = len(columns['timestamp'])
+    parts = [_HEADER.pack(MAGIC, VERSION, count, len(ARCHIVE_COLUMNS))]
+    for index, name in enumerate(ARCHIVE_COLUMNS):
+        encoding, data = _encode_column(_KINDS.get(name, 'int'), list(columns[name]))
+        data = zlib.compress(data, level)
+        parts.append(_COLUMN.pack(index, encoding, len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def decode_segment(data: bytes, columns: Optional[Sequence[str]] = None) -> Dict[str, list]:
+    """Columnas del segmento; con `columns` sólo se descomprimen ésas"""
+    magic, version, count, column_count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a GPS archive segment (version {version})")
+    wanted = set(ARCHIVE_COLUMNS if columns is None else columns)
+    result = {}
+    offset = _HEADER.size
+    for _ in range(column_count):
+        index, encoding, length = _COLUMN.unpack_from(data, offset)
+        offset += _COLUMN.size
+        name = ARCHIVE_COLUMNS[index]
+        if name in wanted:
+            result[name] = _decode_column(encoding, zlib.decompress(data[offset:offset + length]))
+            if len(result[name]) != count:
+                raise ValueError(f"Corrupt GPS archive segment: column {name} has {len(result[name])} of {count} rows")
+        offset += length
+    return result
+
+
+class GPSArchive:
+    """Segmentos de un directorio de archivo, por IMEI y día (AAAA-MM-DD, UTC)"""
+
+    def __init__(self, directory: str, level: int = 6):
+        self.directory = directory
+        self.level = level
+
+    def _imei_dir(self, imei: str) -> Optional[str]:
+        # El IMEI llega de la URL: nunca se usa como ruta si no es alfanumérico
+        if not imei or not str(imei).isalnum():
+            return None
+        return os.path.join(self.directory, str(imei))
+
+    def path(self, imei: str, day: str) -> str:
+        return os.path.join(self._imei_dir(imei), day + SUFFIX)
+
+    def imeis(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.directory)
+                          if name.isalnum() and os.path.isdir(os.path.join(self.directory, name)))
+        except FileNotFoundError:
+            return []
+
+    def days(self, imei: str, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> List[str]:
+        """Días archivados del dispositivo, en orden, que se superponen con el rango (abierto si es None)"""
+        directory = self._imei_dir(imei)
+        if directory is None:
+            return []
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        start = start_iso[:10] if start_iso else None
+        end = end_iso[:10] if end_iso else None
+        days = (name[:-len(SUFFIX)] for name in names if name.endswith(SUFFIX))
+        return sorted(day for day in days if (start is None or day >= start) and (end is None or day <= end))
+
+    def read(self, imei: str, day: str, columns: Optional[Sequence[str]] = None) -> Dict[str, list]:
+        with open(self.path(imei, day), 'rb') as f:
+            return decode_segment(f.read(), columns)
+
+    def _read_logged(self, imei: str, day: str, columns: Optional[Sequence[str]] = None) -> Optional[Dict[str, list]]:
+        """Como read, pero un segmento ilegible se registra y se saltea (None)"""
+        try:
+            return self.read(imei, day, columns)
+        except FileNotFoundError:  # retención o compactación concurrente
+            return None
+        except (OSError, ValueError, struct.error, zlib.error) as e:
+            logging.error(f"Error reading archive segment {self.path(imei, day)}: {e}")
+            return None
+
+    @staticmethod
+    def _bounds(timestamps: list, start_iso: Optional[str], end_iso: Optional[str]):
+        return (bisect_left(timestamps, start_iso) if start_iso else 0,
+                bisect_right(timestamps, end_iso) if end_iso else len(timestamps))
+
+    def iter_rows(self, imei: str, start_iso: Optional[str] = None, end_iso: Optional[str] = None,
+                  after: Optional[tuple] = None, descending: bool = False) -> Iterator[dict]:
+        """
+        Filas archivadas del rango (abierto si es None) como filas de
+        gps_data, en orden (timestamp, id)
+
+        Los segmentos se leen de a uno, en el orden pedido, recién cuando
+        hace falta; `after` tiene el mismo sentido que en
+        Database.iter_gps_history.
+        """
+        if after is not None:
+            if descending:
+                end_iso = min(end_iso, after[0]) if end_iso else after[0]
+            else:
+                start_iso = max(start_iso, after[0]) if start_iso else after[0]
+        days = self.days(imei, start_iso, end_iso)
+        for day in reversed(days) if descending else days:
+            columns = self._read_logged(imei, day)
+            if columns is None:
+                continue
+            lo, hi = self._bounds(columns['timestamp'], start_iso, end_iso)
+            rows = zip(*(columns[name][lo:hi] for name in ARCHIVE_COLUMNS))
+            for id_, timestamp, latitude, longitude, altitude, angle, satellites, speed in (
+                    reversed(list(rows)) if descending else rows):
+                if after is not None:
+                    key = (timestamp, id_)
+                    if (key >= after) if descending else (key <= after):
+                        continue
+                # Mismas claves y orden que SELECT * FROM gps_data
+                yield {'id': id_, 'imei': imei, 'timestamp': timestamp, 'latitude': latitude, 'longitude': longitude,
+                       'altitude': altitude, 'angle': angle, 'satellites': satellites, 'speed': speed}
+
+    def track(self, imei: str, start_iso: str, end_iso: str) -> List[tuple]:
+        """(timestamp, latitude, longitude) del rango en orden; sólo descomprime esas columnas"""
+        track = []
+        for day in self.days(imei, start_iso, end_iso):
+            columns = self._read_logged(imei, day, ('timestamp', 'latitude', 'longitude'))
+            if columns is not None:
+                lo, hi = self._bounds(columns['timestamp'], start_iso, end_iso)
+                track.extend(zip(columns['timestamp'][lo:hi], columns['latitude'][lo:hi], columns['longitude'][lo:hi]))
+        return track
+
+    def aggregate(self, imei: str) -> dict:
+        """Totales archivados del dispositivo, con las columnas del resumen que calcula Database sobre gps_data"""
+        records = speed_count = altitude_count = 0
+        speed_sum = altitude_sum = 0.0
+        first = last = max_speed = None
+        for day in self.days(imei):
+            columns = self._read_logged(imei, day, ('timestamp', 'altitude', 'speed'))
+            if not columns or not columns['timestamp']:
+                continue
+            records += len(columns['timestamp'])
+            first = first or columns['timestamp'][0]
+            last = columns['timestamp'][-1]
+            speeds = [value for value in columns['speed'] if value is not None]
+            altitudes = [value for value in columns['altitude'] if value is not None]
+            speed_count += len(speeds)
+            speed_sum += sum(speeds)
+            altitude_count += len(altitudes)
+            altitude_sum += sum(altitudes)
+            if speeds:
+                max_speed = max(speeds) if max_speed is None else max(max_speed, max(speeds))
+        return {'total_records': records, 'first_record': first, 'last_record': last,
+                'avg_speed': speed_sum / speed_count if speed_count else None, 'max_speed': max_speed,
+                'avg_altitude': altitude_sum / altitude_count if altitude_count else None,
+                'speed_count': speed_count, 'altitude_count': altitude_count}
+
+    def write(self, imei: str, day: str, rows: List[tuple]) -> int:
+        """
+        Guarda filas (en el orden de ARCHIVE_COLUMNS) en el segmento del día
+
+        Si el día ya tiene segmento (posiciones atrasadas que llegaron
+        después de archivarlo) se reescribe con ambas; una fila idéntica a
+        una ya archivada (una compactación interrumpida antes de borrar de
+        gps_data) no se duplica. El archivo nuevo reemplaza al anterior
+        con un rename, así una lectura concurrente ve uno u otro entero.
+
+        Returns:
+            int: Filas del segmento
+        """
+        path = self.path(imei, day)
+        if os.path.exists(path):
+            existing = self.read(imei, day)
+            archived = list(zip(*(existing[name] for name in ARCHIVE_COLUMNS)))
+            seen = {row[1:] for row in archived}
+            rows = archived + [row for row in rows if row[1:] not in seen]
+        rows = sorted(rows, key=lambda row: (row[1], row[0]))
+        data = encode_segment(dict(zip(ARCHIVE_COLUMNS, zip(*rows))), self.level)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        return len(rows)
+
+    def drop_before(self, day: str) -> int:
+        """Borra los segmentos de días anteriores a `day`; devuelve cuántos"""
+        removed = 0
+        for imei in self.imeis():
+            for expired in self.days(imei, end_iso=day):
+                if expired < day:
+                    try:
+                        os.remove(self.path(imei, expired))
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+
+def _compact_source(archive: GPSArchive, path: str, cutoff: str, busy_timeout: float) -> int:
+    """
+    Archiva las filas de gps_data de un archivo SQLite anteriores a `cutoff`
+
+    Por dispositivo y día, en transacciones de escritura cortas (BEGIN
+    IMMEDIATE) de a lo sumo COMPACT_BATCH_ROWS filas: leer, escribir el
+    segmento (con fsync) y borrar esas filas. La ingesta que escriba en el
+    mismo archivo sólo espera una de ellas, y una posición atrasada no puede
+    llegar entre la lectura y el DELETE. Si el proceso se corta en el medio,
+    la próxima corrida no duplica lo ya archivado.
+    """
+    conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+    moved = 0
+    try:
+        imeis = [row[0] for row in conn.execute(
+            "SELECT DISTINCT imei FROM gps_data WHERE timestamp < ? AND imei IS NOT NULL", (cutoff,))]
+        for imei in imeis:
+            if archive._imei_dir(imei) is None:
+                logging.warning(f"Skipping archive of invalid IMEI {imei!r} in {path}")
+                continue
+            days = [row[0] for row in conn.execute(
+                "SELECT DISTINCT substr(timestamp, 1, 10) FROM gps_data WHERE imei = ? AND timestamp < ?",
+                (imei, cutoff))]
+            for day in days:
+                try:
+                    end = min((datetime.fromisoformat(day) + timedelta(days=1)).date().isoformat(), cutoff)
+                except ValueError:
+                    logging.warning(f"Skipping archive of invalid day {day!r} for IMEI {imei} in {path}")
+                    continue
+                while True:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        rows = conn.execute(f'''
+                            SELECT {', '.join(ARCHIVE_COLUMNS)} FROM gps_data
+                            WHERE imei = ? AND timestamp >= ? AND timestamp < ?
+                            ORDER BY timestamp, id LIMIT ?
+                        ''', (imei, day, end, COMPACT_BATCH_ROWS)).fetchall()
+                        if rows:
+                            archive.write(imei, day, rows)
+                            conn.execute('''
+                                DELETE FROM gps_data WHERE id IN (
+                                    SELECT id FROM gps_data
+                                    WHERE imei = ? AND timestamp >= ? AND timestamp < ?
+                                    ORDER BY timestamp, id LIMIT ?)
+                            ''', (imei, day, end, COMPACT_BATCH_ROWS))
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+                    moved += len(rows)
+                    if len(rows) < COMPACT_BATCH_ROWS:
+                        break
+        return moved
+    finally:
+        conn.close()
+
+
+def _compact(Database, archive: GPSArchive, months: int) -> int:
+    """
+    Mueve al archivo las posiciones anteriores a los últimos `months` meses
+    (el actual incluido): de la base principal o, con particiones, de cada
+    mes cerrado. Un mes particionado que queda vacío se compacta (VACUUM)
+    pero no se borra: la ingesta puede seguir escribiendo ahí posiciones
+    atrasadas, que archiva la corrida siguiente.
+    """
+    from config.config import Config
+    from utils.metrics import Metrics
+
+    sqlite_config = Config.DB_CONFIG['sqlite']
+    key = add_months(current_month(), -(max(months, 1) - 1))
+    cutoff = key.replace('_', '-') + '-01'
+    busy_timeout = sqlite_config['busy_timeout_ms'] / 1000
+    partitions = Database.partitions()
+    if partitions is None:
+        sources = [sqlite_config['path']]
+    else:
+        sources = [partitions.path(month) for month in partitions.keys() if month < key]
+
+    total = 0
+    for path in sources:
+        moved = _compact_source(archive, path, cutoff, busy_timeout)
+        if not moved:
+            continue
+        total += moved
+        Metrics.increment('archive.rows', moved)
+        logging.info(f"Archived {moved} records from {path}")
+        if partitions is not None:
+            conn = sqlite3.connect(path, timeout=busy_timeout)
+            try:
+                if conn.execute("SELECT 1 FROM gps_data LIMIT 1").fetchone() is None:
+                    conn.execute("VACUUM")
+            finally:
+                conn.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['compact'])
+    parser.add_argument('--months', type=int, help="meses (el actual incluido) que quedan en gps_data")
+    args = parser.parse_args()
+
+    from config.config import Config
+    from data.database import Database
+
+    Config.setup_logging()
+    archive = Database.archive()
+    if archive is None:
+        logging.error("ARCHIVE_ENABLED is disabled; enable it before compacting")
+        return 1
+    months = args.months if args.months is not None else Config.ARCHIVE_CONFIG['hot_months']
+    try:
+        logging.info(f"Archived {_compact(Database, archive, months)} records to {archive.directory}")
+    except (sqlite3.Error, OSError, ValueError) as e:
+        logging.error(f"Error compacting GPS data into the archive: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,34 +1,212 @@
+import time
 import logging
-from .database import Database
+import threading
+from datetime import datetime, timedelta
+from itertools import islice
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from .database import Database, GPS_COLUMNS
+from .write_queue import PartialWriteError, WriteBehindQueue
+from .latest_cache import LatestPositionCache
+from .rollups import ROLLUP_PERIODS
+from utils.geofence import ZoneIndex, inside_runs, points_in_zone
+from utils.zone_transitions import ZoneTransitionEngine
+from utils.track_simplify import bucket_rows, simplify_rows
+from utils.message_bus import get_message_bus, TOPIC_ZONE_EVENTS
 from config.config import Config
 
 class DataManager:
+    _write_queue = None
+    _write_queue_lock = threading.Lock()
+    latest_cache = LatestPositionCache(Config.LATEST_CACHE_CONFIG['max_size'])
+    _zone_index = None
+    _zone_index_lock = threading.Lock()
+    # Versión de las zonas (Database.get_zones_version) con que se cargó el índice y
+    # cuándo se consultó por última vez
+    _zone_index_version = None
+    _zone_index_checked = 0.0
+    zone_engine = ZoneTransitionEngine(
+        lambda imei, latitude, longitude: DataManager.find_zones(imei, latitude, longitude),
+        Database.get_current_zone_ids
+    )
+    _zone_events_queue = None
+    _zone_events_lock = threading.Lock()
+
+    @classmethod
+    def get_write_queue(cls):
+        """
+        Obtiene la cola de escritura compartida, iniciándola en el primer uso
+
+        Returns:
+            WriteBehindQueue: La cola, o None si está deshabilitada en la configuración
+        """
+        config = Config.WRITE_QUEUE_CONFIG
+        if not config['enabled']:
+            return None
+        if cls._write_queue is None:
+            with cls._write_queue_lock:
+                if cls._write_queue is None:
+                    write_queue = WriteBehindQueue(
+                        DataManager.save_batch,
+                        max_size=config['max_size'],
+                        batch_size=config['batch_size'],
+                        flush_interval=config['flush_interval'],
+                        workers=config['workers'],
+                        ack_mode=config['ack_mode'],
+                        enqueue_timeout=config['enqueue_timeout'],
+                        commit_timeout=config['commit_timeout']
+                    )
+                    write_queue.start()
+                    cls._write_queue = write_queue
+        return cls._write_queue
+
+    @classmethod
+    def store_records(cls, imei, records):
+        """
+        Persiste los registros de un paquete a través de la cola de escritura
+
+        En modo 'commit' espera a que la transacción termine; en modo
+        'enqueue' retorna apenas el paquete queda en la cola.
+
+        Returns:
+            bool: True si se puede confirmar (ACK) el paquete al dispositivo
+        """
+        write_queue = cls.get_write_queue()
+        if write_queue is None:
+            return cls.save_data(imei, records)
+
+        future = write_queue.submit(imei, records)
+        if future is None:
+            return False
+        if write_queue.ack_mode == WriteBehindQueue.ACK_ON_ENQUEUE:
+            return True
+        try:
+            return future.result(timeout=write_queue.commit_timeout)
+        except FutureTimeoutError:
+            logging.warning(f"Timed out waiting for commit of IMEI {imei} records")
+            return False
+
     @staticmethod
     def save_data(imei, records):
         try:
-            for record in records:
-                Database.insert_gps_data(imei, record)
-            logging.info(f"Saved {len(records)} records for IMEI {imei}")
+            saved = Database.insert_gps_data_batch([(imei, records)])
+            logging.info(f"Saved {saved} records for IMEI {imei}")
+            if saved:
+                DataManager.update_latest([(imei, records)])
+            return saved == len(records)
         except Exception as e:
             logging.error(f"Failed to save data for IMEI {imei}: {e}")
+            return False
+
+    @staticmethod
+    def save_batch(batch):
+        """
+        Guarda los paquetes de varios dispositivos en una sola transacción
+
+        Args:
+            batch: Lista de tuplas (imei, records)
+
+        Returns:
+            int: Número de filas guardadas (0 si falló la transacción)
+        """
+        try:
+            saved = Database.insert_gps_data_batch(batch)
+            logging.info(f"Saved {saved} records from {len(batch)} packets")
+            if saved:
+                DataManager.update_latest(batch)
+            return saved
+        except PartialWriteError as e:
+            DataManager.update_latest(batch[:e.packets])
+            raise
+        except Exception as e:
+            logging.error(f"Failed to save batch of {len(batch)} packets: {e}")
+            return 0
 
 
     @staticmethod
     def get_data_by_imei(imei, limit=100):
         return Database.get_gps_data_by_imei(imei, limit)
 
-    @staticmethod
-    def get_latest_location(imei):
-        return Database.get_latest_location(imei)
+    @classmethod
+    def update_latest(cls, batch):
+        """
+        Actualiza la caché de última posición con registros ya guardados
+
+        Args:
+            batch: Lista de tuplas (imei, records)
+        """
+        if not Config.LATEST_CACHE_CONFIG['enabled']:
+            return
+        for imei, records in batch:
+            if records:
+                newest = max(records, key=lambda record: record['DateTime'])
+                cls.latest_cache.update(imei, Database.gps_row_dict(imei, newest))
+
+    @classmethod
+    def get_latest_location(cls, imei):
+        """
+        Última posición del dispositivo, desde la caché o, si no está, desde la base de datos
+        """
+        if not Config.LATEST_CACHE_CONFIG['enabled']:
+            return Database.get_latest_location(imei)
+        location = cls.latest_cache.get(imei)
+        if location is None:
+            row = Database.get_latest_location(imei)
+            if not row:
+                return row
+            # Mismas columnas que las entradas que agrega la ingesta
+            location = {column: row[column] for column in GPS_COLUMNS}
+            cls.latest_cache.update(imei, dict(location))
+        return location
 
     @staticmethod
     def get_gps_history(imei, start_date, end_date, limit=1000):
         return Database.get_gps_history(imei, start_date, end_date, limit)
 
+    @staticmethod
+    def iter_gps_history(imei, start_date, end_date, after=None, descending=True, limit=None,
+                         simplify=None, bucket=None):
+        """
+        Historial del rango como generador de filas (ver Database.iter_gps_history)
+
+        Con `bucket` se conserva la primera posición de cada intervalo de
+        `bucket` segundos (en streaming); con `simplify` se aplica
+        Ramer-Douglas-Peucker con esa tolerancia en metros, que necesita el
+        recorrido completo en memoria (conviene combinarlo con `bucket` en
+        rangos largos). Con cualquiera de los dos se lee todo el rango y
+        `limit` se aplica al resultado simplificado.
+
+        Raises:
+            ValueError: Si alguna fecha no tiene un formato reconocido
+        """
+        start_iso, end_iso = Database.history_bounds(start_date, end_date)
+        if not simplify and not bucket:
+            return Database.iter_gps_history(imei, start_iso, end_iso, after=after, descending=descending, limit=limit)
+
+        rows = Database.iter_gps_history(imei, start_iso, end_iso, after=after, descending=descending)
+        if bucket:
+            rows = bucket_rows(rows, bucket)
+        if simplify:
+            rows = simplify_rows(rows, simplify)
+        return islice(rows, limit)
+
     @staticmethod
     def get_gps_summary(imei):
         return Database.get_gps_summary(imei)
 
+    @staticmethod
+    def get_gps_rollups(imei, start_date, end_date, period='day'):
+        """
+        Resúmenes por día u hora del rango (conteo, distancia, velocidades,
+        tiempo en movimiento y primera/última posición)
+
+        Raises:
+            ValueError: Si el período o alguna fecha no son válidos
+        """
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Período no válido: {period}")
+        start_iso, end_iso = Database.history_bounds(start_date, end_date)
+        return Database.get_rollups(imei, period, start_iso, end_iso)
+
     @staticmethod
     def get_connected_devices():
         return Database.get_connected_devices()
@@ -40,6 +218,8 @@ class DataManager:
             logging.info(f"Intentando insertar zona de control: {name}")
             zone_id = Database.insert_zone(name, coordinates, imeis)
             if zone_id:
+                DataManager._update_zone_index(lambda index: index.add_zone(
+                    {'id': zone_id, 'name': name, 'coordinates': coordinates, 'imeis': imeis}))
                 logging.info(f"Zona de control '{name}' insertada con ID {zone_id}")
                 return zone_id
             else:
@@ -54,6 +234,8 @@ class DataManager:
         try:
             success = Database.update_zone(zone_id, name, coordinates, imeis)
             if success:
+                DataManager._update_zone_index(lambda index: index.add_zone(
+                    {'id': zone_id, 'name': name, 'coordinates': coordinates, 'imeis': imeis}))
                 logging.info(f"Zone ID {zone_id} updated successfully")
             else:
                 logging.error(f"Failed to update zone ID {zone_id}")
@@ -67,6 +249,7 @@ class DataManager:
         try:
             success = Database.delete_zone(zone_id)
             if success:
+                DataManager._update_zone_index(lambda index: index.remove_zone(zone_id))
                 logging.info(f"Zone ID {zone_id} deleted successfully")
             else:
                 logging.error(f"Failed to delete zone ID {zone_id}")
@@ -86,6 +269,193 @@ class DataManager:
             logging.exception(f"Error al obtener zonas de control: {e}")
             return []
 
+    @classmethod
+    def get_zone_index(cls):
+        """
+        Obtiene el índice de zonas, cargándolo desde la base de datos si no existe
+        o si las zonas cambiaron
+
+        Cada ZONE_INDEX_CONFIG['check_interval'] segundos compara la versión
+        de las zonas en la base, así también se ven los cambios hechos desde
+        otro proceso (workers de la API, SERVER_PROCESSES > 1).
+
+        Returns:
+            ZoneIndex: Índice de sólo lectura
+        """
+        interval = Config.ZONE_INDEX_CONFIG['check_interval']
+        zone_index = cls._zone_index
+        if zone_index is not None and time.monotonic() - cls._zone_index_checked < interval:
+            return zone_index
+        with cls._zone_index_lock:
+            zone_index = cls._zone_index
+            now = time.monotonic()
+            if zone_index is not None and now - cls._zone_index_checked < interval:
+                return zone_index
+            # La versión se lee antes que las zonas: un cambio durante la carga fuerza otra
+            version = Database.get_zones_version()
+            cls._zone_index_checked = now
+            if zone_index is None or (version is not None and version != cls._zone_index_version):
+                zone_index = ZoneIndex(cls.get_all_control_zones())
+                cls._zone_index = zone_index
+                cls._zone_index_version = version
+                logging.info(f"Índice de zonas cargado ({len(zone_index)} zonas, versión {version})")
+        return zone_index
+
+    @classmethod
+    def invalidate_zone_index(cls):
+        """Descarta el índice de zonas; se vuelve a cargar en la próxima consulta"""
+        with cls._zone_index_lock:
+            cls._zone_index = None
+
+    @classmethod
+    def _update_zone_index(cls, change):
+        """
+        Aplica un cambio de zona al índice ya cargado (si no está cargado, lo
+        incluirá al cargarse); ante un error lo descarta para recargarlo.
+        Así el cambio se ve en seguida en este proceso; los demás lo toman
+        por la versión de las zonas en get_zone_index.
+        """
+        with cls._zone_index_lock:
+            if cls._zone_index is None:
+                return
+            try:
+                change(cls._zone_index)
+            except Exception as e:
+                logging.error(f"Failed to update zone index, reloading it: {e}")
+                cls._zone_index = None
+
+    @classmethod
+    def find_zone(cls, imei, latitude, longitude):
+        """
+        Primera zona asignada al IMEI que contiene el punto
+
+        Returns:
+            PreparedZone: La zona, o None si el punto no está en ninguna
+        """
+        try:
+            return cls.get_zone_index().find_zone(imei, latitude, longitude)
+        except Exception as e:
+            logging.error(f"Failed to evaluate zones for IMEI {imei}: {e}")
+            return None
+
+    @classmethod
+    def find_zones(cls, imei, latitude, longitude):
+        """Zonas asignadas al IMEI que contienen el punto, ordenadas por id"""
+        return cls.get_zone_index().find_zones(imei, latitude, longitude)
+
+    @classmethod
+    def get_zone_events_queue(cls):
+        """
+        Obtiene la cola que guarda los eventos de zonas por lotes, iniciándola en el primer uso
+        """
+        if cls._zone_events_queue is None:
+            with cls._zone_events_lock:
+                if cls._zone_events_queue is None:
+                    config = Config.ZONE_EVENTS_CONFIG
+                    events_queue = WriteBehindQueue(
+                        DataManager.save_zone_events,
+                        max_size=config['max_size'],
+                        batch_size=config['batch_size'],
+                        flush_interval=config['flush_interval'],
+                        ack_mode=WriteBehindQueue.ACK_ON_ENQUEUE,
+                        name='zone_events_queue'
+                    )
+                    events_queue.start()
+                    cls._zone_events_queue = events_queue
+        return cls._zone_events_queue
+
+    @staticmethod
+    def save_zone_events(batch):
+        """
+        Guarda los eventos de zonas de varios paquetes en una transacción
+
+        Args:
+            batch: Lista de tuplas (imei, events)
+
+        Returns:
+            int: Número de eventos guardados
+        """
+        return Database.insert_zone_events_batch(event for _, events in batch for event in events)
+
+    @classmethod
+    def process_zone_transitions(cls, imei, records):
+        """
+        Genera los eventos de entrada/salida de zonas de un paquete ya guardado,
+        los encola para guardarlos y los publica para la API
+
+        Returns:
+            list: Eventos generados
+        """
+        if not Config.ZONE_EVENTS_CONFIG['enabled']:
+            return []
+        events = cls.zone_engine.process(imei, records)
+        if events:
+            cls.get_zone_events_queue().submit(imei, events, block=False)
+            get_message_bus().publish(TOPIC_ZONE_EVENTS, events)
+        return events
+
+    @classmethod
+    def get_zone_dwell(cls, zone_id, start_date, end_date, imei=None):
+        """
+        Intervalos de permanencia en una zona y tiempo total por dispositivo
+
+        Clasifica todo el historial del rango contra la zona de una vez
+        (vectorizado con NumPy si está instalado). Un intervalo empieza en
+        la primera posición dentro y termina en la primera posición fuera;
+        si el rango termina con el dispositivo dentro, el intervalo queda
+        abierto ('exit' None) y se cuenta hasta la última posición.
+
+        Args:
+            zone_id: ID de la zona
+            start_date (str): Fecha inicial (inclusive)
+            end_date (str): Fecha final (inclusive, hasta el final del día)
+            imei (str): Dispositivo; por defecto todos los asignados a la zona
+
+        Returns:
+            dict: Resultado por dispositivo, o None si la zona no existe
+        """
+        zone_index = cls.get_zone_index()
+        zone = zone_index.zones.get(zone_id)
+        if zone is None:
+            return None
+        start_iso = Database.parse_date(start_date).isoformat()
+        end_iso = (Database.parse_date(end_date) + timedelta(days=1) - timedelta(seconds=1)).isoformat()
+        imeis = [imei] if imei else sorted(zone_index.imeis_by_zone.get(zone_id, ()))
+
+        devices = []
+        for device in imeis:
+            timestamps, latitudes, longitudes = Database.get_track(device, start_iso, end_iso)
+            inside = points_in_zone(zone, latitudes, longitudes)
+            intervals = []
+            total = 0.0
+            fixes_inside = 0
+            for start, end in inside_runs(inside):
+                fixes_inside += (end if end is not None else len(timestamps)) - start
+                entered = datetime.fromisoformat(timestamps[start])
+                left = datetime.fromisoformat(timestamps[end if end is not None else -1])
+                duration = (left - entered).total_seconds()
+                total += duration
+                intervals.append({
+                    'enter': timestamps[start],
+                    'exit': timestamps[end] if end is not None else None,
+                    'duration_seconds': duration,
+                })
+            devices.append({
+                'imei': device,
+                'fixes': len(timestamps),
+                'fixes_inside': fixes_inside,
+                'intervals': intervals,
+                'total_seconds': total,
+            })
+
+        return {
+            'zone_id': zone.id,
+            'zone_name': zone.name,
+            'start': start_iso,
+            'end': end_iso,
+            'devices': devices,
+        }
+
     @staticmethod
     def get_zones_for_imei(imei):
         try:
@@ -100,4 +470,4 @@ class DataManager:
             Database.close()
             logging.info("Conexión a la base de datos cerrada correctamente")
         except Exception as e:
-            logging.exception(f"Error al cerrar la conexión a la base de datos: {e}")
\ No newline at end of file
+            logging.exception(f"Error al cerrar la conexión a la base de datos: {e}")
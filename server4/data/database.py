@@ -2,13 +2,118 @@ import sqlite3
 import logging
 import threading
 import json
+import time
+import heapq
 from datetime import datetime, timedelta
+from itertools import islice
+from operator import itemgetter
 import pytz
 from config.config import Config
+from utils.metrics import Metrics
+from .rollups import ROLLUP_COLUMNS, ROLLUP_PERIODS, RollupAccumulator, rollup_dict
+from .partitions import SQLitePartitions, month_key, retention_cutoff
+from .archive import GPSArchive
+from .write_queue import PartialWriteError
+
+# Migraciones del esquema, en orden. PRAGMA user_version guarda la última aplicada,
+# así cada base existente se actualiza una sola vez al abrirse.
+MIGRATIONS = [
+    # 1: historial y última posición por dispositivo (WHERE imei = ? ORDER BY timestamp)
+    (1, [
+        'CREATE INDEX IF NOT EXISTS idx_gps_data_imei_timestamp ON gps_data (imei, timestamp)',
+    ]),
+    # 2: entradas y salidas de zonas de control
+    (2, [
+        '''
+        CREATE TABLE IF NOT EXISTS zone_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            imei TEXT NOT NULL,
+            zone_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_zone_events_imei_zone ON zone_events (imei, zone_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_zone_events_zone_timestamp ON zone_events (zone_id, timestamp)',
+    ]),
+    # 3: resúmenes por dispositivo y día/hora (data/rollups.py); se llenan con la
+    # ingesta y, para el historial previo, con `python -m data.rollups`
+    (3, [
+        '''
+        CREATE TABLE IF NOT EXISTS gps_rollups (
+            imei TEXT NOT NULL,
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            records INTEGER NOT NULL,
+            distance REAL NOT NULL,
+            moving_seconds REAL NOT NULL,
+            speed_sum REAL NOT NULL,
+            max_speed REAL,
+            altitude_sum REAL NOT NULL,
+            first_fix TEXT,
+            last_fix TEXT,
+            last_latitude REAL,
+            last_longitude REAL,
+            PRIMARY KEY (imei, period, bucket)
+        )
+        ''',
+    ]),
+    # 4: dispositivos con historial anterior a sus resúmenes; get_gps_summary no
+    # usa sus resúmenes hasta que `python -m data.rollups` los reconstruye
+    (4, [
+        'CREATE TABLE IF NOT EXISTS gps_rollups_pending (imei TEXT PRIMARY KEY)',
+        'INSERT OR IGNORE INTO gps_rollups_pending (imei) SELECT DISTINCT imei FROM gps_data WHERE imei IS NOT NULL',
+    ]),
+    # 5: contador de cambios de zonas (incluso de otros procesos); DataManager lo
+    # compara para recargar su índice de zonas
+    (5, [
+        'CREATE TABLE IF NOT EXISTS zones_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)',
+        'INSERT OR IGNORE INTO zones_version (id, version) VALUES (1, 0)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS zones_version_insert AFTER INSERT ON zones
+        BEGIN UPDATE zones_version SET version = version + 1; END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS zones_version_update AFTER UPDATE ON zones
+        BEGIN UPDATE zones_version SET version = version + 1; END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS zones_version_delete AFTER DELETE ON zones
+        BEGIN UPDATE zones_version SET version = version + 1; END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS zone_imei_version_insert AFTER INSERT ON zone_imei
+        BEGIN UPDATE zones_version SET version = version + 1; END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS zone_imei_version_update AFTER UPDATE ON zone_imei
+        BEGIN UPDATE zones_version SET version = version + 1; END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS zone_imei_version_delete AFTER DELETE ON zone_imei
+        BEGIN UPDATE zones_version SET version = version + 1; END
+        ''',
+    ]),
+]
+
+GPS_COLUMNS = ('imei', 'timestamp', 'latitude', 'longitude', 'altitude', 'angle', 'satellites', 'speed')
+
+# Orden de las filas del historial (hot y archivadas) para intercalarlas
+_history_key = itemgetter('timestamp', 'id')
+
+_JOURNAL_MODES = ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')
+_SYNCHRONOUS_MODES = ('off', 'normal', 'full', 'extra')
+
 
 class Database:
     _local = threading.local()
     _lock = threading.Lock()
+    _schema_ready = False
+    _archive = None
+    # None hasta revisar si la base principal aún tiene gps_data sin migrar a particiones
+    _unmigrated = None
 
     @classmethod
     def get_connection(cls):
@@ -16,11 +121,141 @@ class Database:
             with cls._lock:
                 if not hasattr(cls._local, "connection"):
                     db_path = Config.DB_CONFIG['sqlite']['path']
-                    cls._local.connection = sqlite3.connect(db_path, check_same_thread=False)
-                    cls._local.connection.row_factory = sqlite3.Row
-                    cls.create_tables(cls._local.connection)
+                    connection = sqlite3.connect(db_path, check_same_thread=False)
+                    connection.row_factory = sqlite3.Row
+                    cls.configure_connection(connection)
+                    if not cls._schema_ready:
+                        cls.create_tables(connection)
+                        cls.migrate(connection)
+                        pending = connection.execute("SELECT COUNT(*) FROM gps_rollups_pending").fetchone()[0]
+                        if pending:
+                            logging.warning(f"{pending} devices have history older than their rollups; "
+                                            f"run 'python -m data.rollups --pending' to backfill them")
+                        cls._schema_ready = True
+                    cls._local.connection = connection
         return cls._local.connection
 
+    @classmethod
+    def partitions(cls, migrating=False):
+        """
+        Archivos mensuales de gps_data de la conexión del thread (data/partitions.py),
+        o None si gps_data no está particionado
+
+        Mientras la tabla gps_data de la base principal tenga filas (una base
+        anterior a las particiones, sin `python -m data.partitions migrate`)
+        se sigue usando sin particiones, para no ocultar ese historial.
+
+        Args:
+            migrating (bool): Devolver las particiones aunque la base principal tenga filas
+        """
+        config = Config.DB_CONFIG['sqlite']
+        if not config['partitioned']:
+            return None
+        conn = cls.get_connection()
+        if cls._unmigrated is None:
+            cls._unmigrated = conn.execute(
+                "SELECT 1 FROM main.gps_data WHERE timestamp IS NOT NULL LIMIT 1").fetchone() is not None
+            if cls._unmigrated and not migrating:
+                logging.error("SQLITE_PARTITIONED is enabled but the main gps_data table still has rows; "
+                              "GPS data stays unpartitioned until 'python -m data.partitions migrate' moves them")
+        if cls._unmigrated and not migrating:
+            return None
+        partitions = getattr(cls._local, "partitions", None)
+        if partitions is None or partitions.conn is not conn:
+            partitions = SQLitePartitions(conn, config['partition_dir'], config['max_attached'],
+                                          config['journal_mode'].lower(), config['synchronous'].lower())
+            cls._local.partitions = partitions
+        return partitions
+
+    @classmethod
+    def archive(cls):
+        """Archivo frío de gps_data (data/archive.py), o None si está desactivado"""
+        config = Config.ARCHIVE_CONFIG
+        if not config['enabled']:
+            return None
+        if cls._archive is None or cls._archive.directory != config['directory']:
+            cls._archive = GPSArchive(config['directory'], config['compression_level'])
+        return cls._archive
+
+    @classmethod
+    def gps_tables(cls, start_iso=None, end_iso=None, descending=False):
+        """
+        Tablas de gps_data que cubren el rango, en orden cronológico (o inverso)
+
+        Sin particiones es sólo 'gps_data'. Con particiones es un
+        'm_AAAA_MM.gps_data' por cada mes existente que se superpone con el
+        rango; cada mes se adjunta recién al iterar, así una consulta que
+        termina en los primeros meses no abre los demás.
+        """
+        partitions = cls.partitions()
+        if partitions is None:
+            yield 'gps_data'
+            return
+        keys = partitions.keys(start_iso, end_iso)
+        for key in reversed(keys) if descending else keys:
+            schema = partitions.attach(key)
+            if schema is not None:
+                yield f"{schema}.gps_data"
+
+    @staticmethod
+    def configure_connection(conn):
+        """
+        Aplica los PRAGMAs de DB_CONFIG['sqlite'] a una conexión
+
+        WAL permite que las consultas de la API lean mientras la ingesta
+        escribe, y con synchronous=NORMAL un commit no espera un fsync
+        (sólo los checkpoints lo hacen); se pueden perder las últimas
+        transacciones ante un corte de energía, pero la base no se corrompe.
+        """
+        config = Config.DB_CONFIG['sqlite']
+        journal_mode = config['journal_mode'].lower()
+        synchronous = config['synchronous'].lower()
+        if journal_mode not in _JOURNAL_MODES:
+            raise ValueError(f"Invalid SQLite journal mode: {journal_mode}")
+        if synchronous not in _SYNCHRONOUS_MODES:
+            raise ValueError(f"Invalid SQLite synchronous mode: {synchronous}")
+
+        conn.execute(f"PRAGMA busy_timeout = {int(config['busy_timeout_ms'])}")
+        applied = conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+        if applied != journal_mode:
+            logging.warning(f"SQLite journal mode is '{applied}' (requested '{journal_mode}')")
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        # Negativo = tamaño en KiB en lugar de páginas
+        conn.execute(f"PRAGMA cache_size = {-int(config['cache_size_kb'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(config['mmap_size'])}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+    @staticmethod
+    def migrate(conn):
+        """
+        Aplica las migraciones pendientes según PRAGMA user_version
+
+        Cada migración corre en su propia transacción junto con el cambio de
+        versión. En modo WAL las lecturas siguen funcionando mientras se crea
+        un índice; las escrituras esperan hasta `busy_timeout`.
+
+        Returns:
+            int: Versión del esquema después de migrar
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, statements in MIGRATIONS:
+            if target <= version:
+                continue
+            start = time.monotonic()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {int(target)}")
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                logging.error(f"Error aplicando migración {target}: {e}")
+                raise
+            version = target
+            logging.info(f"Migración {target} aplicada en {time.monotonic() - start:.1f}s")
+        return version
+
     @classmethod
     def create_tables(cls, conn):
         cursor = conn.cursor()
@@ -75,40 +310,426 @@ class Database:
             logging.error(f"Error creando tablas: {e}")
             conn.rollback()
 
+    @staticmethod
+    def _gps_row(imei, data):
+        return (
+            imei,
+            data['DateTime'],
+            data['Location']['Latitude'],
+            data['Location']['Longitude'],
+            data['Location']['Altitude'],
+            data['Location']['Angle'],
+            data['Location']['Satellites'],
+            data['Location']['Speed']
+        )
+
+    @classmethod
+    def gps_row_dict(cls, imei, data):
+        """Registro decodificado con las columnas de gps_data (sin id)"""
+        return dict(zip(GPS_COLUMNS, cls._gps_row(imei, data)))
+
     @classmethod
     def insert_gps_data(cls, imei, data):
+        cls.insert_gps_data_batch([(imei, [data])])
+
+    @staticmethod
+    def _insert_rows(conn, table, rows):
+        conn.executemany(f'''
+            INSERT INTO {table} (imei, timestamp, latitude, longitude, altitude, angle, satellites, speed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+    @classmethod
+    def insert_gps_data_batch(cls, batch):
+        """
+        Inserta los registros de uno o varios paquetes con un solo executemany y un commit
+
+        Args:
+            batch: Iterable de tuplas (imei, records)
+
+        Returns:
+            int: Número de filas insertadas (0 si hubo error)
+
+        Raises:
+            PartialWriteError: Si el lote se guardó en varias transacciones y
+                falló una posterior a la primera
+        """
+        packets = [[cls._gps_row(imei, record) for record in records] for imei, records in batch]
+        rows = [row for packet in packets for row in packet]
+        if not rows:
+            return 0
+        conn = cls.get_connection()
+        try:
+            partitions = cls.partitions()
+            if partitions is None:
+                cls._insert_rows(conn, 'gps_data', rows)
+                # En la misma transacción: los resúmenes nunca quedan desfasados del historial
+                cls._update_rollups(conn, rows)
+                conn.commit()
+                return len(rows)
+
+            # Con particiones: cada fila a su mes; las de meses ya fuera de la
+            # retención se descartan (su archivo ya fue borrado). Los meses del
+            # lote se adjuntan juntos y todo va en una transacción; sólo un lote
+            # con más meses de los que SQLite puede adjuntar (datos muy
+            # atrasados) se divide, por paquetes enteros
+            saved_packets = saved_rows = 0
+            for by_month, packet_count, group_rows in cls._month_groups(
+                    packets, retention_cutoff(Config.DB_CONFIG['sqlite']['retention_months']), partitions.limit):
+                try:
+                    keys = sorted(by_month)
+                    if len(keys) > partitions.limit:
+                        logging.warning(f"Packet spans {len(keys)} months; storing it in several transactions")
+                    for start in range(0, len(keys), partitions.limit):
+                        chunk = keys[start:start + partitions.limit]
+                        chunk_rows = []
+                        for key, schema in zip(chunk, partitions.attach_many(chunk, create=True)):
+                            cls._insert_rows(conn, f"{schema}.gps_data", by_month[key])
+                            chunk_rows.extend(by_month[key])
+                        cls._update_rollups(conn, chunk_rows)
+                        conn.commit()
+                except (sqlite3.Error, ValueError) as e:
+                    if not saved_packets:
+                        raise
+                    conn.rollback()
+                    logging.error(f"Error inserting GPS data batch after {saved_packets} packets were saved: {e}")
+                    # Los paquetes ya guardados se confirman; sólo el resto se reenvía
+                    raise PartialWriteError(saved_packets, saved_rows) from e
+                saved_packets += packet_count
+                saved_rows += group_rows
+            return len(rows)
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Error inserting GPS data batch: {e}")
+            conn.rollback()
+            return 0
+
+    @staticmethod
+    def _month_groups(packets, cutoff, limit):
+        """
+        Agrupa paquetes consecutivos cuyos meses (sin contar los anteriores a
+        `cutoff`) entran juntos en `limit` bases adjuntas
+
+        Yields:
+            tuple: (filas por mes, paquetes del grupo, filas del grupo incluidas las descartadas)
+        """
+        by_month, packet_count, group_rows = {}, 0, 0
+        for packet in packets:
+            packet_months = {}
+            for row in packet:
+                key = month_key(row[1])
+                if cutoff is None or key >= cutoff:
+                    packet_months.setdefault(key, []).append(row)
+            expired = len(packet) - sum(len(month_rows) for month_rows in packet_months.values())
+            if expired:
+                Metrics.increment('partitions.rows_expired', expired)
+            if packet_count and len(by_month.keys() | packet_months.keys()) > limit:
+                yield by_month, packet_count, group_rows
+                by_month, packet_count, group_rows = {}, 0, 0
+            for key, month_rows in packet_months.items():
+                by_month.setdefault(key, []).extend(month_rows)
+            packet_count += 1
+            group_rows += len(packet)
+        yield by_month, packet_count, group_rows
+
+    @classmethod
+    def _update_rollups(cls, conn, rows):
+        """
+        Suma filas nuevas de gps_data a gps_rollups (dentro de la transacción del insert)
+
+        La distancia continúa desde la última posición resumida de cada
+        dispositivo; se lee después del insert, con la transacción de
+        escritura ya tomada, así dos writers no parten del mismo punto.
+        Con los resúmenes desactivados marca los dispositivos en
+        gps_rollups_pending: al reactivarlos, get_gps_summary no usa los
+        resúmenes que les faltan filas hasta reconstruirlos.
+        """
+        config = Config.ROLLUP_CONFIG
+        if not config['enabled']:
+            conn.executemany("INSERT OR IGNORE INTO gps_rollups_pending (imei) VALUES (?)",
+                             [(imei,) for imei in {row[0] for row in rows}])
+            return
+        accumulator = RollupAccumulator(config['moving_speed'], config['max_gap'])
+        for imei in {row[0] for row in rows}:
+            last = conn.execute('''
+                SELECT last_fix, last_latitude, last_longitude FROM gps_rollups
+                WHERE imei = ? AND period = 'day'
+                ORDER BY bucket DESC LIMIT 1
+            ''', (imei,)).fetchone()
+            if last is not None:
+                accumulator.seed(imei, *last)
+        # Por dispositivo y en orden cronológico (sort estable: mismo orden para empates)
+        accumulator.add_rows(sorted(rows, key=lambda row: (row[0], row[1])))
+        conn.executemany(f'''
+            INSERT INTO gps_rollups ({', '.join(ROLLUP_COLUMNS)})
+            VALUES ({', '.join('?' * len(ROLLUP_COLUMNS))})
+            ON CONFLICT (imei, period, bucket) DO UPDATE SET
+                records = records + excluded.records,
+                distance = distance + excluded.distance,
+                moving_seconds = moving_seconds + excluded.moving_seconds,
+                speed_sum = speed_sum + excluded.speed_sum,
+                max_speed = MAX(max_speed, excluded.max_speed),
+                altitude_sum = altitude_sum + excluded.altitude_sum,
+                first_fix = MIN(first_fix, excluded.first_fix),
+                last_latitude = CASE WHEN excluded.last_fix > last_fix THEN excluded.last_latitude ELSE last_latitude END,
+                last_longitude = CASE WHEN excluded.last_fix > last_fix THEN excluded.last_longitude ELSE last_longitude END,
+                last_fix = MAX(last_fix, excluded.last_fix)
+        ''', accumulator.rows())
+
+    @classmethod
+    def rebuild_rollups(cls, imei):
+        """
+        Recalcula desde gps_data (y el archivo frío) todos los resúmenes de un dispositivo
+
+        El historial se recorre sin bloquear la ingesta, hasta el último id
+        de cada archivo de gps_data al empezar. Después, en una transacción
+        de escritura corta (BEGIN IMMEDIATE), se suman las filas que llegaron
+        mientras tanto y se reemplazan los resúmenes, así ninguna posición
+        queda fuera o contada dos veces. Con particiones, cada mes se lee con
+        una conexión propia. No debe correr junto con `python -m data.archive
+        compact`, que mueve filas de gps_data al archivo frío.
+
+        Returns:
+            int: Posiciones resumidas, o None si hubo error
+        """
+        config = Config.ROLLUP_CONFIG
+        conn = cls.get_connection()
+        accumulator = RollupAccumulator(config['moving_speed'], config['max_gap'])
+        partitions = cls.partitions()
+        archive = cls.archive()
+
+        def sources():
+            """(ruta del archivo o None para la base principal, conexión) de cada archivo de gps_data"""
+            for path in [None] if partitions is None else [partitions.path(key) for key in partitions.keys()]:
+                source = conn if path is None else sqlite3.connect(path)
+                try:
+                    yield path, source
+                finally:
+                    if source is not conn:
+                        source.close()
+
+        def hot_rows(snapshot):
+            for path, source in sources():
+                last_id = source.execute("SELECT MAX(id) FROM gps_data").fetchone()[0] or 0
+                snapshot[path] = last_id
+                cursor = source.execute('''
+                    SELECT imei, timestamp, latitude, longitude, altitude, angle, satellites, speed
+                    FROM gps_data WHERE imei = ? AND id <= ?
+                    ORDER BY timestamp, id
+                ''', (imei, last_id))
+                while True:
+                    rows = cursor.fetchmany(5000)
+                    if not rows:
+                        break
+                    yield from rows
+
+        def rows_since(snapshot):
+            """Filas del dispositivo posteriores a `snapshot` (archivo -> último id ya leído)"""
+            new_rows = []
+            for path, source in sources():
+                # +imei: recorre sólo los ids nuevos en lugar del índice del dispositivo
+                new_rows.extend(source.execute('''
+                    SELECT imei, timestamp, latitude, longitude, altitude, angle, satellites, speed, id
+                    FROM gps_data WHERE id > ? AND +imei = ?
+                ''', (snapshot.get(path, 0), imei)))
+            new_rows.sort(key=lambda row: (row[1], row[8]))
+            return [tuple(row[:8]) for row in new_rows]
+
+        snapshot = {}
+        try:
+            rows = hot_rows(snapshot)
+            if archive is not None:
+                archived = (tuple(row[column] for column in GPS_COLUMNS) for row in archive.iter_rows(imei))
+                rows = heapq.merge(rows, archived, key=itemgetter(1))
+            count = 0
+            while True:
+                chunk = list(islice(rows, 5000))
+                if not chunk:
+                    break
+                accumulator.add_rows(chunk)
+                count += len(chunk)
+            if conn.in_transaction:
+                conn.commit()
+
+            conn.execute("BEGIN IMMEDIATE")
+            # La ingesta espera desde acá: sólo las filas que llegaron durante el recorrido
+            new_rows = rows_since(snapshot)
+            accumulator.add_rows(new_rows)
+            count += len(new_rows)
+            conn.execute("DELETE FROM gps_rollups WHERE imei = ?", (imei,))
+            conn.executemany(f'''
+                INSERT INTO gps_rollups ({', '.join(ROLLUP_COLUMNS)})
+                VALUES ({', '.join('?' * len(ROLLUP_COLUMNS))})
+            ''', accumulator.rows())
+            # Desde ahora los resúmenes cubren todo su historial
+            conn.execute("DELETE FROM gps_rollups_pending WHERE imei = ?", (imei,))
+            conn.commit()
+            return count
+        except (sqlite3.Error, ValueError) as e:
+            conn.rollback()
+            logging.error(f"Error rebuilding rollups for IMEI {imei}: {e}")
+            return None
+
+    @classmethod
+    def get_rollups(cls, imei, period, start_iso, end_iso):
+        """
+        Resúmenes del dispositivo por día u hora dentro del rango
+
+        Args:
+            period (str): 'day' u 'hour'
+            start_iso, end_iso (str): Rango ISO 8601 (UTC); cuenta cada período que toca
+
+        Returns:
+            list: Un diccionario por período, en orden cronológico
+        """
+        length = ROLLUP_PERIODS[period]
+        try:
+            cursor = cls.get_connection().execute('''
+                SELECT * FROM gps_rollups
+                WHERE imei = ? AND period = ? AND bucket BETWEEN ? AND ?
+                ORDER BY bucket
+            ''', (imei, period, start_iso[:length], end_iso[:length]))
+            return [rollup_dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logging.error(f"Error fetching rollups for IMEI {imei}: {e}")
+            return []
+
+    @classmethod
+    def get_rollups_pending(cls):
+        """IMEIs con historial anterior a sus resúmenes, aún sin reconstruir"""
+        try:
+            return [row[0] for row in cls.get_connection().execute("SELECT imei FROM gps_rollups_pending ORDER BY imei")]
+        except sqlite3.Error as e:
+            logging.error(f"Error fetching devices pending rollup rebuild: {e}")
+            return []
+
+    @classmethod
+    def get_imeis(cls):
+        """IMEIs con posiciones en gps_data o en el archivo frío"""
         try:
             conn = cls.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO gps_data (imei, timestamp, latitude, longitude, altitude, angle, satellites, speed)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                imei,
-                data['DateTime'],
-                data['Location']['Latitude'],
-                data['Location']['Longitude'],
-                data['Location']['Altitude'],
-                data['Location']['Angle'],
-                data['Location']['Satellites'],
-                data['Location']['Speed']
-            ))
+            imeis = set()
+            for table in cls.gps_tables():
+                imeis.update(row[0] for row in conn.execute(f'SELECT DISTINCT imei FROM {table} WHERE imei IS NOT NULL'))
+            archive = cls.archive()
+            if archive is not None:
+                imeis.update(archive.imeis())
+            return sorted(imeis)
+        except sqlite3.Error as e:
+            logging.error(f"Error fetching IMEIs: {e}")
+            return []
+
+    @classmethod
+    def apply_retention(cls, months):
+        """
+        Borra las posiciones anteriores a los últimos `months` meses (el actual incluido)
+
+        Con particiones se borran los archivos de los meses vencidos, sin
+        tocar los demás; sin particiones queda el DELETE sobre toda la tabla.
+        Los segmentos vencidos del archivo frío también se borran. Los
+        resúmenes (gps_rollups) se conservan.
+
+        Returns:
+            int: Meses borrados con particiones, o filas borradas sin ellas
+        """
+        cutoff = retention_cutoff(months)
+        if cutoff is None:
+            return 0
+        archive = cls.archive()
+        if archive is not None:
+            removed = archive.drop_before(cutoff.replace('_', '-') + '-01')
+            if removed:
+                logging.info(f"Dropped {removed} archived GPS segments")
+        partitions = cls.partitions()
+        if partitions is not None:
+            expired = [key for key in partitions.keys() if key < cutoff]
+            for key in expired:
+                partitions.drop(key)
+                logging.info(f"Dropped GPS data partition {key}")
+            Metrics.increment('partitions.dropped', len(expired))
+            return len(expired)
+
+        conn = cls.get_connection()
+        try:
+            cursor = conn.execute("DELETE FROM gps_data WHERE timestamp < ?", (cutoff.replace('_', '-'),))
+            conn.commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            conn.rollback()
+            logging.error(f"Error applying GPS data retention: {e}")
+            return 0
+
+    @classmethod
+    def insert_zone_events_batch(cls, events):
+        """
+        Inserta eventos de entrada/salida de zonas con un solo executemany y un commit
+
+        Args:
+            events: Iterable de diccionarios con imei, zone_id, type, timestamp, latitude y longitude
+
+        Returns:
+            int: Número de eventos insertados (0 si hubo error)
+        """
+        rows = [(event['imei'], event['zone_id'], event['type'], event['timestamp'],
+                 event['latitude'], event['longitude']) for event in events]
+        if not rows:
+            return 0
+        conn = cls.get_connection()
+        try:
+            conn.executemany('''
+                INSERT INTO zone_events (imei, zone_id, event, timestamp, latitude, longitude)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
             conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            logging.error(f"Error inserting zone events: {e}")
+            conn.rollback()
+            return 0
+
+    @classmethod
+    def get_current_zone_ids(cls, imei):
+        """
+        Zonas en las que está el dispositivo según su último evento en cada una
+
+        Returns:
+            list: IDs de las zonas cuyo último evento es una entrada
+        """
+        try:
+            conn = cls.get_connection()
+            cursor = conn.execute('''
+                SELECT zone_id, event FROM zone_events
+                WHERE id IN (
+                    SELECT MAX(id) FROM zone_events WHERE imei = ? GROUP BY zone_id
+                )
+            ''', (imei,))
+            return [row['zone_id'] for row in cursor.fetchall() if row['event'] == 'zone_enter']
         except sqlite3.Error as e:
-            logging.error(f"Error inserting GPS data: {e}")
+            logging.error(f"Error fetching current zones for IMEI {imei}: {e}")
+            return []
 
     @classmethod
     def get_gps_data_by_imei(cls, imei, limit=100):
         try:
             conn = cls.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM gps_data
-                WHERE imei = ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ''', (imei, limit))
-            return [dict(row) for row in cursor.fetchall()]
+            results = []
+            # Del mes más reciente hacia atrás, hasta completar el límite
+            for table in cls.gps_tables(descending=True):
+                cursor = conn.execute(f'''
+                    SELECT * FROM {table}
+                    WHERE imei = ?
+                    ORDER BY timestamp DESC
+                    LIMIT ?
+                ''', (imei, limit - len(results)))
+                results.extend(dict(row) for row in cursor.fetchall())
+                if len(results) >= limit:
+                    break
+            archive = cls.archive()
+            days = archive.days(imei) if archive is not None else []
+            # El archivo sólo entra si alcanza a las filas que se devuelven
+            if days and (len(results) < limit or results[-1]['timestamp'][:10] <= days[-1]):
+                results = list(islice(heapq.merge(results, archive.iter_rows(imei, descending=True),
+                                                  key=_history_key, reverse=True), limit))
+            return results
         except sqlite3.Error as e:
             logging.error(f"Error fetching GPS data: {e}")
             return []
@@ -117,51 +738,155 @@ class Database:
     def get_latest_location(cls, imei):
         try:
             conn = cls.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM gps_data
-                WHERE imei = ?
-                ORDER BY timestamp DESC
-                LIMIT 1
-            ''', (imei,))
-            return dict(cursor.fetchone())
+            for table in cls.gps_tables(descending=True):
+                row = conn.execute(f'''
+                    SELECT * FROM {table}
+                    WHERE imei = ?
+                    ORDER BY timestamp DESC
+                    LIMIT 1
+                ''', (imei,)).fetchone()
+                if row:
+                    latest = dict(row)
+                    break
+            else:
+                latest = None
+            archive = cls.archive()
+            days = archive.days(imei) if archive is not None else []
+            if days and (latest is None or latest['timestamp'][:10] <= days[-1]):
+                archived = next(archive.iter_rows(imei, days[-1], descending=True), None)
+                if archived is not None and (latest is None or _history_key(archived) > _history_key(latest)):
+                    latest = archived
+            return latest
         except sqlite3.Error as e:
             logging.error(f"Error fetching latest location: {e}")
             return None
 
     @classmethod
     def get_gps_history(cls, imei, start_date, end_date, limit=1000):
-        try:
-            connection = cls.get_connection()
-            cursor = connection.cursor()
-            
-            # Convertir las fechas a objetos datetime y ajustar el rango
-            start_datetime = cls.parse_date(start_date)
-            end_datetime = cls.parse_date(end_date) + timedelta(days=1) - timedelta(seconds=1)
-            
-            # Convertir a formato ISO 8601
-            start_iso = start_datetime.isoformat()
-            end_iso = end_datetime.isoformat()
-            
-            query = '''
-                SELECT * FROM gps_data
-                WHERE imei = ? AND timestamp BETWEEN ? AND ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            '''
-            cursor.execute(query, (imei, start_iso, end_iso, limit))
-            
-            results = [dict(row) for row in cursor.fetchall()]
-            
-            if not results:
-                logging.info(f"No se encontraron datos para IMEI {imei} entre {start_iso} y {end_iso}")
+        start_iso, end_iso = cls.history_bounds(start_date, end_date)
+        results = list(cls.iter_gps_history(imei, start_iso, end_iso, limit=limit))
+
+        if not results:
+            logging.info(f"No se encontraron datos para IMEI {imei} entre {start_iso} y {end_iso}")
+        else:
+            logging.info(f"Se encontraron {len(results)} registros para IMEI {imei}")
+
+        return results
+
+    @classmethod
+    def history_bounds(cls, start_date, end_date):
+        """
+        Rango ISO 8601 de días completos: desde el inicio de `start_date`
+        hasta el último segundo de `end_date`
+
+        Returns:
+            tuple: (start_iso, end_iso)
+        """
+        start_datetime = cls.parse_date(start_date)
+        end_datetime = cls.parse_date(end_date) + timedelta(days=1) - timedelta(seconds=1)
+        return start_datetime.isoformat(), end_datetime.isoformat()
+
+    @classmethod
+    def iter_gps_history(cls, imei, start_iso, end_iso, after=None, descending=True, limit=None, chunk_size=500):
+        """
+        Posiciones del rango en orden (timestamp, id), leídas del cursor por bloques
+
+        Paginación por clave (keyset): `after` es el (timestamp, id) de la última
+        fila ya entregada y la consulta continúa desde ahí por el índice
+        (imei, timestamp), sin OFFSET. Nunca se arma la lista completa, así la
+        memoria no depende del largo del rango. Con particiones sólo se leen
+        los meses del rango, uno tras otro en el orden pedido. Con el archivo
+        frío activo, sus segmentos del rango se intercalan con gps_data.
+
+        Args:
+            after (tuple): (timestamp, id) desde donde continuar, excluido
+            descending (bool): Más recientes primero
+            limit (int): Máximo de filas; None para todo el rango
+            chunk_size (int): Filas por fetchmany
+
+        Returns:
+            Iterator[dict]: Filas de gps_data
+        """
+        archive = cls.archive()
+        if archive is None or not archive.days(imei, start_iso, end_iso):
+            return cls._iter_hot_history(imei, start_iso, end_iso, after, descending, limit, chunk_size)
+        # Ambas fuentes ya vienen en orden (timestamp, id): se intercalan sin ordenar
+        rows = heapq.merge(cls._iter_hot_history(imei, start_iso, end_iso, after, descending, None, chunk_size),
+                           archive.iter_rows(imei, start_iso, end_iso, after, descending),
+                           key=_history_key, reverse=descending)
+        return islice(rows, limit)
+
+    @classmethod
+    def _iter_hot_history(cls, imei, start_iso, end_iso, after, descending, limit, chunk_size):
+        """Filas de iter_gps_history que siguen en gps_data"""
+        op = '<' if descending else '>'
+        direction = 'DESC' if descending else 'ASC'
+        query = 'SELECT * FROM {table} WHERE imei = ? AND timestamp BETWEEN ? AND ?'
+        params = [imei, start_iso, end_iso]
+        if after is not None:
+            # Equivale a (timestamp, id) < (?, ?), escrito para que use el rango del índice
+            query += f' AND timestamp {op}= ? AND (timestamp {op} ? OR id {op} ?)'
+            params.extend((after[0], after[0], after[1]))
+            # Los meses ya recorridos por el cursor no se vuelven a leer
+            if descending:
+                end_iso = min(end_iso, after[0])
             else:
-                logging.info(f"Se encontraron {len(results)} registros para IMEI {imei}")
-            
-            return results
+                start_iso = max(start_iso, after[0])
+        query += f' ORDER BY timestamp {direction}, id {direction} LIMIT ?'
+
+        remaining = limit
+        cursor = None
+        try:
+            for table in cls.gps_tables(start_iso, end_iso, descending):
+                # Sin límite, -1 en SQLite
+                cursor = cls.get_connection().execute(query.format(table=table),
+                                                      params + [-1 if remaining is None else remaining])
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    if remaining is not None:
+                        remaining -= len(rows)
+                    for row in rows:
+                        yield dict(row)
+                cursor.close()
+                cursor = None
+                if remaining is not None and remaining <= 0:
+                    break
         except sqlite3.Error as e:
             logging.error(f"Error fetching GPS history: {e}")
-            return []
+        finally:
+            if cursor is not None:
+                cursor.close()
+
+    @classmethod
+    def get_track(cls, imei, start_iso, end_iso):
+        """
+        Posiciones del dispositivo en el rango, en orden cronológico y sin límite
+
+        Returns:
+            tuple: Listas (timestamps, latitudes, longitudes)
+        """
+        try:
+            conn = cls.get_connection()
+            rows = []
+            for table in cls.gps_tables(start_iso, end_iso):
+                rows.extend(conn.execute(f'''
+                    SELECT timestamp, latitude, longitude FROM {table}
+                    WHERE imei = ? AND timestamp BETWEEN ? AND ?
+                    ORDER BY timestamp
+                ''', (imei, start_iso, end_iso)))
+            archive = cls.archive()
+            if archive is not None:
+                rows = list(heapq.merge(rows, archive.track(imei, start_iso, end_iso), key=itemgetter(0)))
+        except sqlite3.Error as e:
+            logging.error(f"Error fetching track for IMEI {imei}: {e}")
+            rows = []
+        if not rows:
+            return [], [], []
+        timestamps, latitudes, longitudes = zip(*rows)
+        return list(timestamps), list(latitudes), list(longitudes)
+
     @staticmethod
     def parse_date(date_string):
         # Intentar varios formatos de fecha
@@ -183,21 +908,60 @@ class Database:
             return date_string + " 00:00:00"
     @classmethod
     def get_gps_summary(cls, imei):
+        """
+        Totales del dispositivo, sumando sus resúmenes diarios en lugar de
+        recorrer todo su historial; si aún no tiene resúmenes, o tiene
+        historial anterior a ellos sin reconstruir (gps_rollups_pending), se
+        calcula sobre gps_data y el archivo frío, sin distancia ni tiempo en
+        movimiento
+        """
         try:
             conn = cls.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
+            pending = conn.execute("SELECT 1 FROM gps_rollups_pending WHERE imei = ?", (imei,)).fetchone()
+            if Config.ROLLUP_CONFIG['enabled'] and pending is None:
+                row = conn.execute('''
+                    SELECT
+                        SUM(records) as total_records,
+                        MIN(first_fix) as first_record,
+                        MAX(last_fix) as last_record,
+                        SUM(speed_sum) * 1.0 / SUM(records) as avg_speed,
+                        MAX(max_speed) as max_speed,
+                        SUM(altitude_sum) * 1.0 / SUM(records) as avg_altitude,
+                        SUM(distance) as distance,
+                        SUM(moving_seconds) as moving_seconds
+                    FROM gps_rollups
+                    WHERE imei = ? AND period = 'day'
+                ''', (imei,)).fetchone()
+                if row['total_records']:
+                    return dict(row)
+
+            parts = [conn.execute(f'''
                 SELECT 
                     COUNT(*) as total_records,
                     MIN(timestamp) as first_record,
                     MAX(timestamp) as last_record,
                     AVG(speed) as avg_speed,
                     MAX(speed) as max_speed,
-                    AVG(altitude) as avg_altitude
-                FROM gps_data
+                    AVG(altitude) as avg_altitude,
+                    COUNT(speed) as speed_count,
+                    COUNT(altitude) as altitude_count
+                FROM {table}
                 WHERE imei = ?
-            ''', (imei,))
-            return dict(cursor.fetchone())
+            ''', (imei,)).fetchone() for table in cls.gps_tables()]
+            archive = cls.archive()
+            if archive is not None:
+                parts.append(archive.aggregate(imei))
+            parts = [part for part in parts if part['total_records']]
+            summary = {'total_records': sum(part['total_records'] for part in parts),
+                       'first_record': min((part['first_record'] for part in parts), default=None),
+                       'last_record': max((part['last_record'] for part in parts), default=None),
+                       'max_speed': max((part['max_speed'] for part in parts if part['max_speed'] is not None), default=None)}
+            # Promedios de cada mes ponderados por sus filas
+            for column, count in (('avg_speed', 'speed_count'), ('avg_altitude', 'altitude_count')):
+                total = sum(part[count] for part in parts)
+                summary[column] = sum(part[column] * part[count] for part in parts if part[count]) / total if total else None
+            summary.update(distance=None, moving_seconds=None)
+            return summary
         except sqlite3.Error as e:
             logging.error(f"Error fetching GPS summary: {e}")
             return {}
@@ -206,12 +970,14 @@ class Database:
     def get_connected_devices(cls):
         try:
             conn = cls.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT DISTINCT imei FROM gps_data
-                WHERE timestamp > datetime('now', '-5 minutes')
-            ''')
-            return [row[0] for row in cursor.fetchall()]
+            since = (datetime.now(pytz.UTC) - timedelta(minutes=5)).isoformat()
+            imeis = set()
+            for table in cls.gps_tables(since):
+                imeis.update(row[0] for row in conn.execute(f'''
+                    SELECT DISTINCT imei FROM {table}
+                    WHERE timestamp > datetime('now', '-5 minutes')
+                '''))
+            return list(imeis)
         except sqlite3.Error as e:
             logging.error(f"Error fetching connected devices: {e}")
             return []
@@ -397,6 +1163,22 @@ class Database:
             conn.rollback()
             return False
 
+    @classmethod
+    def get_zones_version(cls):
+        """
+        Contador que aumenta con cada cambio en zones o zone_imei, hecho por
+        cualquier proceso
+
+        Returns:
+            int: Versión actual, o None si hubo error
+        """
+        try:
+            row = cls.get_connection().execute("SELECT version FROM zones_version WHERE id = 1").fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            logging.error(f"Error reading zones version: {e}")
+            return None
+
     @classmethod
     def get_all_zones(cls):
         conn = cls.get_connection()
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from utils.metrics import Metrics
+
+
+class LatestPositionCache:
+    """
+    Última posición conocida de cada dispositivo, compartida por el proceso.
+
+    La ingesta la actualiza después de guardar cada paquete y la API la
+    lee antes de ir a la base de datos. Guarda a lo sumo `max_size`
+    dispositivos; al llenarse descarta el que lleva más tiempo sin
+    actualizarse ni leerse (LRU).
+    """
+
+    def __init__(self, max_size: int = 50000):
+        if max_size < 1:
+            raise ValueError(f"Invalid cache size: {max_size}")
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, imei: str) -> Optional[Dict[str, Any]]:
+        """Retorna una copia de la última posición del IMEI, o None si no está en caché"""
+        with self._lock:
+            entry = self._entries.get(imei)
+            if entry is not None:
+                self._entries.move_to_end(imei)
+        if entry is None:
+            Metrics.increment('latest_cache.misses')
+            return None
+        Metrics.increment('latest_cache.hits')
+        return dict(entry)
+
+    def update(self, imei: str, position: Dict[str, Any]) -> bool:
+        """
+        Guarda la posición si es más reciente que la que hay en caché
+
+        Los dispositivos reenvían registros atrasados al reconectarse, por
+        eso se compara el `timestamp` (ISO 8601 en UTC) y no el orden de llegada.
+
+        Returns:
+            bool: True si la posición reemplazó a la anterior
+        """
+        with self._lock:
+            current = self._entries.get(imei)
+            if current is not None and current['timestamp'] > position['timestamp']:
+                return False
+            self._entries[imei] = position
+            self._entries.move_to_end(imei)
+            evicted = len(self._entries) > self.max_size
+            if evicted:
+                self._entries.popitem(last=False)
+            size = len(self._entries)
+        if evicted:
+            Metrics.increment('latest_cache.evictions')
+        Metrics.set_gauge('latest_cache.size', size)
+        return True
+
+    def invalidate(self, imei: str = None) -> None:
+        """Elimina un IMEI de la caché, o toda la caché si no se indica"""
+        with self._lock:
+            if imei is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(imei, None)
+            size = len(self._entries)
+        Metrics.set_gauge('latest_cache.size', size)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
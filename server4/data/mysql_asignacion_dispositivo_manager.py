@@ -109,6 +109,21 @@ class MySQLAsignacionDispositivoManager:
             logging.exception(f"Error getting asignaciones por empresa: {str(e)}")
             raise
 
+    def get_imei_assignments(self):
+        """
+        Obtiene el IMEI de cada asignación con su usuario y empresa.
+        """
+        try:
+            query = f"""
+                SELECT d.imei, a.usuario_id, a.empresa_id
+                FROM {self.table_name} a
+                INNER JOIN dispositivos_gps d ON a.dispositivo_gps_id = d.id
+            """
+            return MySQLDatabase.execute_query(query)
+        except Exception as e:
+            logging.exception(f"Error getting IMEI assignments: {str(e)}")
+            raise
+
     def get_asignacion_por_dispositivo(self, dispositivo_gps_id):
         """
         Obtiene la asignación de un dispositivo específico.
@@ -1,182 +1,240 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 import logging
 from config.config import Config
-from typing import Optional, List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
 import threading
+from utils.metrics import Metrics
+from .mysql_pool import MySQLConnectionPool, PoolTimeoutError
+
+# Errores que indican que el servidor cerró la conexión; la conexión se descarta.
+# Sólo CR_SERVER_GONE_ERROR se reintenta: la consulta no llegó a enviarse, mientras
+# que con CR_SERVER_LOST el servidor pudo haberla ejecutado.
+_CONNECTION_LOST_ERRORS = (
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+)
+
 
 class MySQLDatabase:
     """Clase para manejar la conexión y operaciones con MySQL"""
-    
-    _local = threading.local()
+
+    _pool: Optional[MySQLConnectionPool] = None
     _lock = threading.Lock()
+    _local = threading.local()  # Transacción en curso de cada thread
 
     @classmethod
-    def get_connection(cls) -> Optional[mysql.connector.connection.MySQLConnection]:
+    def get_pool(cls) -> MySQLConnectionPool:
         """
-        Obtiene una conexión MySQL del pool de conexiones o crea una nueva.
-        
+        Obtiene el pool de conexiones compartido, creándolo en el primer uso.
+
         Returns:
-            MySQLConnection: Conexión a MySQL o None si hay error
+            MySQLConnectionPool: Pool acotado según DB_CONFIG['mysql']
         """
-        if not hasattr(cls._local, "connection"):
+        if cls._pool is None:
             with cls._lock:
-                try:
+                if cls._pool is None:
                     db_config = Config.DB_CONFIG['mysql']
-                    connection = mysql.connector.connect(
-                        host=db_config['host'],
-                        port=db_config['port'],
-                        user=db_config['user'],
-                        password=db_config['password'],
-                        database=db_config['database']
+                    cls._pool = MySQLConnectionPool(
+                        cls._connect,
+                        size=db_config['pool_size'],
+                        timeout=db_config['pool_timeout'],
+                        ping_interval=db_config['pool_ping_interval']
                     )
-                    cls._local.connection = connection
-                    logging.debug("Nueva conexión MySQL creada")
-                except Error as e:
-                    logging.error(f"Error al conectar a MySQL: {e}")
-                    return None
-        
-        return cls._local.connection
+                    logging.info(f"Pool MySQL creado (máximo {db_config['pool_size']} conexiones)")
+        return cls._pool
+
+    @staticmethod
+    def _connect() -> mysql.connector.connection.MySQLConnection:
+        """Abre una conexión nueva a MySQL"""
+        db_config = Config.DB_CONFIG['mysql']
+        return mysql.connector.connect(
+            host=db_config['host'],
+            port=db_config['port'],
+            user=db_config['user'],
+            password=db_config['password'],
+            database=db_config['database'],
+            connection_timeout=db_config['connect_timeout']
+        )
 
     @classmethod
-    def execute_query(cls, query: str, params: Optional[tuple] = None) -> Optional[List[Dict[str, Any]]]:
+    def _execute(cls, query: str, params: Optional[tuple], operation: str,
+                 handler: Callable[[Any], Any], default: Any, dictionary: bool = False) -> Any:
         """
-        Ejecuta una consulta SQL y retorna los resultados.
-        
+        Ejecuta una sentencia con una conexión del pool y la confirma.
+
+        Dentro de una transacción (`start_transaction`) usa la conexión de la
+        transacción, no confirma y propaga los errores para que el llamador
+        haga rollback.
+
         Args:
-            query: Consulta SQL a ejecutar
-            params: Parámetros para la consulta (opcional)
-            
-        Returns:
-            Lista de diccionarios con los resultados o None si hay error
+            query: Sentencia SQL
+            params: Parámetros (opcional)
+            operation: Nombre de la operación para los logs
+            handler: Función que recibe el cursor ya ejecutado y retorna el resultado
+            default: Valor a retornar si hay error
+            dictionary: Usar un cursor que retorna diccionarios
         """
-        connection = cls.get_connection()
-        if connection is None:
-            return None
+        transaction = getattr(cls._local, "transaction", None)
+        if transaction is not None:
+            return cls._run(transaction, query, params, operation, handler, dictionary)
+
+        pool = cls.get_pool()
+        for attempt in range(2):
+            try:
+                # En el reintento, verificar la conexión: si el servidor se reinició,
+                # las demás conexiones ociosas también están cerradas
+                connection = pool.acquire(verify=attempt > 0)
+            except PoolTimeoutError as e:
+                logging.error(f"Error al obtener conexión MySQL: {e}")
+                return default
+            except Error as e:
+                logging.error(f"Error al conectar a MySQL: {e}")
+                return default
 
-        cursor = None
+            discard = False
+            try:
+                result = cls._run(connection, query, params, operation, handler, dictionary)
+                connection.commit()
+                return result
+            except Error as e:
+                if e.errno in _CONNECTION_LOST_ERRORS:
+                    discard = True
+                    Metrics.increment('mysql_pool.connection_lost')
+                    if e.errno == errorcode.CR_SERVER_GONE_ERROR and attempt == 0:
+                        logging.warning("MySQL server has gone away, reintentando con otra conexión")
+                        continue
+                logging.error(f"Error al ejecutar {operation} MySQL: {e}")
+                discard = discard or not cls._rollback(connection)
+                return default
+            except Exception as e:
+                logging.error(f"Error inesperado en MySQL: {e}")
+                discard = not cls._rollback(connection)
+                return default
+            finally:
+                pool.release(connection, discard=discard)
+        return default
+
+    @staticmethod
+    def _run(connection, query: str, params: Optional[tuple], operation: str,
+             handler: Callable[[Any], Any], dictionary: bool) -> Any:
+        cursor = connection.cursor(dictionary=dictionary)
         try:
-            cursor = connection.cursor(dictionary=True)
             if params:
                 cursor.execute(query, params)
-                logging.debug(f"Ejecutando query con parámetros: {query} - {params}")
+                logging.debug(f"Ejecutando {operation} con parámetros: {query} - {params}")
             else:
                 cursor.execute(query)
-                logging.debug(f"Ejecutando query: {query}")
-
-            result = cursor.fetchall()
-            connection.commit()
-            return result
+                logging.debug(f"Ejecutando {operation}: {query}")
+            return handler(cursor)
+        finally:
+            cursor.close()
 
+    @staticmethod
+    def _rollback(connection) -> bool:
+        try:
+            connection.rollback()
+            return True
         except Error as e:
-            logging.error(f"Error al ejecutar query MySQL: {e}")
-            if connection:
-                connection.rollback()
-            return None
-        except Exception as e:
-            logging.error(f"Error inesperado en MySQL: {e}")
-            if connection:
-                connection.rollback()
-            return None
-        finally:
-            if cursor:
-                cursor.close()
+            logging.error(f"Error al hacer rollback en MySQL: {e}")
+            return False
+
+    @classmethod
+    def execute_query(cls, query: str, params: Optional[tuple] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Ejecuta una consulta SQL y retorna los resultados.
+
+        Args:
+            query: Consulta SQL a ejecutar
+            params: Parámetros para la consulta (opcional)
+
+        Returns:
+            Lista de diccionarios con los resultados o None si hay error
+        """
+        def fetch(cursor):
+            return cursor.fetchall() if cursor.with_rows else []
+
+        return cls._execute(query, params, "query", fetch, None, dictionary=True)
 
     @classmethod
     def execute_insert(cls, query: str, params: Optional[tuple] = None) -> Optional[int]:
         """
         Ejecuta una inserción y retorna el ID insertado.
-        
+
         Args:
             query: Consulta SQL de inserción
             params: Parámetros para la inserción (opcional)
-            
+
         Returns:
             ID del registro insertado o None si hay error
         """
-        connection = cls.get_connection()
-        if connection is None:
-            return None
-
-        cursor = None
-        try:
-            cursor = connection.cursor()
-            if params:
-                cursor.execute(query, params)
-                logging.debug(f"Ejecutando inserción con parámetros: {query} - {params}")
-            else:
-                cursor.execute(query)
-                logging.debug(f"Ejecutando inserción: {query}")
-
-            connection.commit()
-            return cursor.lastrowid
-
-        except Error as e:
-            logging.error(f"Error al ejecutar inserción MySQL: {e}")
-            if connection:
-                connection.rollback()
-            return None
-        except Exception as e:
-            logging.error(f"Error inesperado en MySQL: {e}")
-            if connection:
-                connection.rollback()
-            return None
-        finally:
-            if cursor:
-                cursor.close()
+        return cls._execute(query, params, "inserción", lambda cursor: cursor.lastrowid, None)
 
     @classmethod
     def execute_update(cls, query: str, params: Optional[tuple] = None) -> bool:
         """
         Ejecuta una actualización y retorna si fue exitosa.
-        
+
         Args:
             query: Consulta SQL de actualización
             params: Parámetros para la actualización (opcional)
-            
+
         Returns:
             True si la actualización fue exitosa, False en caso contrario
         """
-        connection = cls.get_connection()
-        if connection is None:
-            return False
+        return cls._execute(query, params, "actualización", lambda cursor: True, False)
+
+    @classmethod
+    def start_transaction(cls) -> None:
+        """
+        Inicia una transacción en el thread actual.
 
-        cursor = None
+        La conexión queda reservada para el thread hasta `commit` o
+        `rollback`; mientras tanto los `execute_*` la usan sin confirmar.
+        """
+        if getattr(cls._local, "transaction", None) is not None:
+            raise RuntimeError("Ya hay una transacción MySQL en curso en este thread")
+        pool = cls.get_pool()
+        connection = pool.acquire()
         try:
-            cursor = connection.cursor()
-            if params:
-                cursor.execute(query, params)
-                logging.debug(f"Ejecutando actualización con parámetros: {query} - {params}")
-            else:
-                cursor.execute(query)
-                logging.debug(f"Ejecutando actualización: {query}")
+            connection.start_transaction()
+        except Exception:
+            pool.release(connection, discard=True)
+            raise
+        cls._local.transaction = connection
 
-            connection.commit()
-            return True
+    @classmethod
+    def commit(cls) -> None:
+        """Confirma la transacción del thread actual y libera su conexión"""
+        cls._end_transaction(commit=True)
 
-        except Error as e:
-            logging.error(f"Error al ejecutar actualización MySQL: {e}")
-            if connection:
-                connection.rollback()
-            return False
-        except Exception as e:
-            logging.error(f"Error inesperado en MySQL: {e}")
-            if connection:
+    @classmethod
+    def rollback(cls) -> None:
+        """Descarta la transacción del thread actual y libera su conexión"""
+        cls._end_transaction(commit=False)
+
+    @classmethod
+    def _end_transaction(cls, commit: bool) -> None:
+        connection = getattr(cls._local, "transaction", None)
+        if connection is None:
+            raise RuntimeError("No hay una transacción MySQL en curso en este thread")
+        del cls._local.transaction
+        discard = False
+        try:
+            if commit:
+                connection.commit()
+            else:
                 connection.rollback()
-            return False
+        except Error:
+            discard = True
+            raise
         finally:
-            if cursor:
-                cursor.close()
+            cls.get_pool().release(connection, discard=discard)
 
     @classmethod
     def close_connection(cls) -> None:
-        """Cierra la conexión a MySQL si existe"""
-        if hasattr(cls._local, "connection"):
-            try:
-                if cls._local.connection.is_connected():
-                    cls._local.connection.close()
-                    logging.debug("Conexión MySQL cerrada")
-            except Error as e:
-                logging.error(f"Error al cerrar conexión MySQL: {e}")
-            finally:
-                delattr(cls._local, "connection")
\ No newline at end of file
+        """Cierra las conexiones ociosas del pool"""
+        if cls._pool is not None:
+            cls._pool.close_all()
+            logging.debug("Conexiones MySQL cerradas")
@@ -0,0 +1,177 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, List, Tuple
+from utils.metrics import Metrics
+
+
+class PoolTimeoutError(Exception):
+    """No se liberó ninguna conexión dentro del tiempo de espera"""
+
+
+class MySQLConnectionPool:
+    """
+    Pool acotado de conexiones MySQL.
+
+    Las conexiones se crean a demanda hasta `size`; cuando están todas en
+    uso, `acquire` espera hasta `timeout` segundos a que se libere una.
+    Una conexión que estuvo ociosa más de `ping_interval` segundos se
+    verifica con un ping antes de entregarse y se reemplaza si el servidor
+    la cerró.
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = 10, timeout: float = 5.0,
+                 ping_interval: float = 30.0, name: str = 'mysql_pool'):
+        """
+        Args:
+            connect: Función que abre una conexión nueva
+            size (int): Máximo de conexiones abiertas
+            timeout (float): Espera máxima (s) por una conexión libre
+            ping_interval (float): Segundos ociosa tras los cuales se verifica la conexión
+            name (str): Prefijo de las métricas
+        """
+        if size < 1:
+            raise ValueError(f"Invalid pool size: {size}")
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.name = name
+        self._idle: List[Tuple[Any, float]] = []  # (conexión, momento en que se liberó)
+        self._opened = 0
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float = None, verify: bool = False):
+        """
+        Obtiene una conexión del pool
+
+        Args:
+            timeout (float): Espera máxima (s); por defecto la del pool
+            verify (bool): Verificar la conexión con un ping aunque haya estado poco tiempo ociosa
+
+        Raises:
+            PoolTimeoutError: Si no hay conexión libre dentro de `timeout`
+            mysql.connector.Error: Si no se pudo abrir una conexión nueva
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = None
+        with self._condition:
+            while not self._idle and self._opened >= self.size:
+                if waited is None:
+                    waited = time.monotonic()
+                    Metrics.increment(f'{self.name}.waits')
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    Metrics.increment(f'{self.name}.timeouts')
+                    raise PoolTimeoutError(f"No MySQL connection available after {timeout}s "
+                                           f"({self._in_use}/{self.size} in use)")
+                self._condition.wait(remaining)
+            if waited is not None:
+                Metrics.observe(f'{self.name}.wait_time', time.monotonic() - waited)
+
+            if self._idle:
+                connection, released = self._idle.pop()
+            else:
+                connection, released = None, None
+                self._opened += 1
+            self._in_use += 1
+            self._update_gauges()
+
+        try:
+            if connection is None:
+                return self._open()
+            idle_time = time.monotonic() - released
+            if (verify or idle_time >= self.ping_interval) and not self._is_alive(connection):
+                Metrics.increment(f'{self.name}.reconnects')
+                logging.warning("Conexión MySQL del pool cerrada por el servidor, reconectando")
+                self._close(connection)
+                return self._open()
+            return connection
+        except Exception:
+            with self._condition:
+                self._opened -= 1
+                self._in_use -= 1
+                self._update_gauges()
+                self._condition.notify()
+            raise
+
+    def release(self, connection, discard: bool = False):
+        """
+        Devuelve una conexión al pool
+
+        Args:
+            connection: Conexión obtenida con `acquire`
+            discard (bool): Cerrarla en lugar de reutilizarla (p. ej. tras perder el servidor)
+        """
+        if discard:
+            self._close(connection)
+        with self._condition:
+            self._in_use -= 1
+            if discard:
+                self._opened -= 1
+                Metrics.increment(f'{self.name}.discarded')
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._update_gauges()
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """Context manager que adquiere una conexión y la devuelve al salir"""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, discard=not self._is_connected(connection))
+            raise
+        self.release(connection)
+
+    def close_all(self):
+        """Cierra las conexiones ociosas; las que están en uso se cierran al liberarse"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._update_gauges()
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._condition:
+            return {'size': self.size, 'opened': self._opened, 'in_use': self._in_use, 'idle': len(self._idle)}
+
+    def _open(self):
+        start = time.monotonic()
+        connection = self.connect()
+        Metrics.increment(f'{self.name}.connections_opened')
+        Metrics.observe(f'{self.name}.connect_time', time.monotonic() - start)
+        logging.debug("Nueva conexión MySQL creada")
+        return connection
+
+    def _update_gauges(self):
+        Metrics.set_gauge(f'{self.name}.in_use', self._in_use)
+        Metrics.set_gauge(f'{self.name}.opened', self._opened)
+
+    @staticmethod
+    def _is_alive(connection) -> bool:
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _is_connected(connection) -> bool:
+        try:
+            return connection.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception as e:
+            logging.debug(f"Error al cerrar conexión MySQL: {e}")
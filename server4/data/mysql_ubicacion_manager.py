@@ -1,6 +1,8 @@
 # Archivo: data/mysql_ubicacion_manager.py
 import logging
+from typing import List, Optional
 from .mysql_database import MySQLDatabase
+from .partitions import add_months, current_month
 
 class MySQLUbicacionManager:
     def __init__(self):
@@ -39,17 +41,27 @@ class MySQLUbicacionManager:
             logging.exception(f"Error creating ubicacion: {str(e)}")
             raise
 
-    def get_ubicaciones_por_dispositivo(self, dispositivo_gps_id):
+    def get_ubicaciones_por_dispositivo(self, dispositivo_gps_id, fecha_inicio=None, fecha_fin=None):
         """
-        Obtiene todas las ubicaciones de un dispositivo específico.
+        Obtiene las ubicaciones de un dispositivo específico, opcionalmente
+        dentro de un rango de fecha_hora (con la tabla particionada, MySQL
+        sólo lee las particiones de ese rango).
         """
         try:
+            conditions = ["dispositivo_gps_id = %s"]
+            params = [dispositivo_gps_id]
+            if fecha_inicio is not None:
+                conditions.append("fecha_hora >= %s")
+                params.append(fecha_inicio)
+            if fecha_fin is not None:
+                conditions.append("fecha_hora <= %s")
+                params.append(fecha_fin)
             query = f"""
                 SELECT * FROM {self.table_name} 
-                WHERE dispositivo_gps_id = %s 
+                WHERE {' AND '.join(conditions)}
                 ORDER BY fecha_hora DESC
             """
-            return MySQLDatabase.execute_query(query, (dispositivo_gps_id,))
+            return MySQLDatabase.execute_query(query, tuple(params))
         except Exception as e:
             logging.exception(f"Error getting ubicaciones por dispositivo: {str(e)}")
             raise
@@ -69,4 +81,104 @@ class MySQLUbicacionManager:
             return result[0] if result else None
         except Exception as e:
             logging.exception(f"Error getting última ubicación: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    # Particiones mensuales (RANGE COLUMNS sobre fecha_hora): pAAAAMM guarda
+    # el mes AAAA-MM y pmax lo posterior a la última partición mensual
+
+    @staticmethod
+    def _partition_name(key: str) -> str:
+        return "p" + key.replace('_', '')
+
+    @staticmethod
+    def _partition_clause(key: str) -> str:
+        """PARTITION del mes `key` ('AAAA_MM'): filas anteriores al primer día del mes siguiente"""
+        upper = add_months(key, 1).replace('_', '-') + '-01'
+        return f"PARTITION {MySQLUbicacionManager._partition_name(key)} VALUES LESS THAN ('{upper}')"
+
+    def get_partitions(self) -> Optional[List[str]]:
+        """
+        Meses ('AAAA_MM') con partición propia, en orden; lista vacía si la
+        tabla no está particionada y None si hubo error
+        """
+        rows = MySQLDatabase.execute_query("""
+            SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """, (self.table_name,))
+        if rows is None:
+            return None
+        return [f"{row['name'][1:5]}_{row['name'][5:7]}" for row in rows if row['name'] != 'pmax']
+
+    def partition_table(self, months_ahead: int = 2) -> bool:
+        """
+        Particiona la tabla por mes desde su fecha_hora más antigua hasta
+        `months_ahead` meses después del actual, más pmax.
+
+        Reescribe toda la tabla: se corre una vez, en una ventana de
+        mantenimiento. MySQL exige que fecha_hora forme parte de cada clave
+        única (p. ej. PRIMARY KEY (id, fecha_hora)).
+        """
+        existing = self.get_partitions()
+        if existing is None:
+            return False
+        if existing:
+            logging.info(f"Table {self.table_name} is already partitioned")
+            return True
+        rows = MySQLDatabase.execute_query(f"SELECT MIN(fecha_hora) AS first FROM {self.table_name}")
+        if rows is None:
+            return False
+        first = rows[0]['first']
+        key = first.strftime('%Y_%m') if first else current_month()
+        last = add_months(current_month(), months_ahead)
+        clauses = []
+        while key <= last:
+            clauses.append(self._partition_clause(key))
+            key = add_months(key, 1)
+        clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        logging.info(f"Partitioning {self.table_name} into {len(clauses)} partitions")
+        return MySQLDatabase.execute_update(
+            f"ALTER TABLE {self.table_name} PARTITION BY RANGE COLUMNS(fecha_hora) ({', '.join(clauses)})")
+
+    def ensure_partitions(self, months_ahead: int = 2) -> bool:
+        """
+        Crea las particiones de los próximos `months_ahead` meses separándolas
+        de pmax (que debería estar vacía, así el REORGANIZE no mueve filas)
+        """
+        existing = self.get_partitions()
+        if existing is None:
+            return False
+        if not existing:
+            logging.warning(f"Table {self.table_name} is not partitioned; run 'python -m data.partitions mysql-partition'")
+            return True
+        last = add_months(current_month(), months_ahead)
+        key = add_months(existing[-1], 1)
+        clauses = []
+        while key <= last:
+            clauses.append(self._partition_clause(key))
+            key = add_months(key, 1)
+        if not clauses:
+            return True
+        clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        return MySQLDatabase.execute_update(
+            f"ALTER TABLE {self.table_name} REORGANIZE PARTITION pmax INTO ({', '.join(clauses)})")
+
+    def drop_partitions_before(self, cutoff: Optional[str]) -> Optional[List[str]]:
+        """
+        Borra las particiones de los meses anteriores a `cutoff` ('AAAA_MM');
+        cada una se descarta entera, sin DELETE fila por fila
+
+        Returns:
+            list: Particiones borradas, o None si hubo error
+        """
+        existing = self.get_partitions()
+        if existing is None:
+            return None
+        if cutoff is None:
+            return []
+        expired = [self._partition_name(key) for key in existing if key < cutoff]
+        if not expired:
+            return []
+        if not MySQLDatabase.execute_update(f"ALTER TABLE {self.table_name} DROP PARTITION {', '.join(expired)}"):
+            return None
+        return expired
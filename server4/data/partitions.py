@@ -0,0 +1,261 @@
+"""
+Almacenamiento de las posiciones particionado por mes.
+
+SQLite: con DB_CONFIG['sqlite']['partitioned'], gps_data vive en un archivo
+por mes (gps_data_AAAA_MM.db) dentro de `partition_dir`. Cada conexión
+adjunta (ATTACH) sólo los meses que toca una consulta o una inserción, y la
+retención borra meses completos como archivos, sin DELETE ni reindexar.
+Mientras la base principal conserve filas de gps_data (falta `migrate`),
+el servidor registra un error y sigue sin particiones; `migrate` debe
+correr con la ingesta detenida.
+
+MySQL: `ubicaciones` particionada por RANGE COLUMNS(fecha_hora), una
+partición por mes (pAAAAMM) más `pmax`; la retención usa DROP PARTITION y
+las consultas con rango de fechas sólo leen las particiones que lo cubren.
+
+Uso:
+    python -m data.partitions maintain         # retención y meses siguientes de MySQL (cron diario)
+    python -m data.partitions migrate          # mueve gps_data de la base principal a los archivos mensuales
+    python -m data.partitions mysql-partition  # particiona `ubicaciones` por primera vez
+"""
+import os
+import re
+import sys
+import sqlite3
+import logging
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional
+
+_FILE_RE = re.compile(r'^gps_data_(\d{4}_\d{2})\.db$')
+
+# Bases adjuntas por conexión con la compilación por defecto de SQLite (SQLITE_MAX_ATTACHED)
+SQLITE_ATTACH_LIMIT = 10
+
+# Mismo esquema que gps_data en la base principal
+PARTITION_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.gps_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        imei TEXT,
+        timestamp TEXT,
+        latitude REAL,
+        longitude REAL,
+        altitude INTEGER,
+        angle INTEGER,
+        satellites INTEGER,
+        speed INTEGER
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_gps_data_imei_timestamp ON gps_data (imei, timestamp)',
+]
+
+
+def month_key(timestamp: str) -> str:
+    """Mes ('AAAA_MM') de un timestamp ISO 8601"""
+    return f"{timestamp[:4]}_{timestamp[5:7]}"
+
+
+def add_months(key: str, months: int) -> str:
+    year, month = int(key[:4]), int(key[5:7])
+    index = year * 12 + month - 1 + months
+    return f"{index // 12:04d}_{index % 12 + 1:02d}"
+
+
+def current_month() -> str:
+    return datetime.now(timezone.utc).strftime('%Y_%m')
+
+
+def retention_cutoff(months: int) -> Optional[str]:
+    """
+    Primer mes que se conserva con una retención de `months` meses (el
+    actual incluido), o None si la retención está desactivada
+    """
+    if months <= 0:
+        return None
+    return add_months(current_month(), -(months - 1))
+
+
+class SQLitePartitions:
+    """
+    Archivos mensuales de gps_data adjuntados a una conexión.
+
+    SQLite admite pocas bases adjuntas a la vez (10 por defecto): se
+    mantienen hasta `max_attached` y se separa la usada hace más tiempo
+    cuando hace falta otra. Nunca se separa una base dentro de una
+    transacción abierta. `attach_many` puede pasar de `max_attached`, hasta
+    el límite de SQLite (`limit`), para que una escritura que toca muchos
+    meses entre en una sola transacción.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, directory: str, max_attached: int = 8,
+                 journal_mode: str = 'wal', synchronous: str = 'normal'):
+        self.conn = conn
+        self.directory = directory
+        self.max_attached = max_attached
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.attached: 'OrderedDict[str, str]' = OrderedDict()  # mes -> schema
+        # getlimit existe desde Python 3.11
+        getlimit = getattr(conn, 'getlimit', None)
+        self.limit = getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if getlimit else SQLITE_ATTACH_LIMIT
+        self._keys: List[str] = []
+        self._listed_at: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"gps_data_{key}.db")
+
+    def keys(self, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> List[str]:
+        """Meses existentes, en orden, que se superponen con el rango (abierto si es None)"""
+        # El mtime del directorio cambia al crear o borrar archivos
+        listed_at = os.stat(self.directory).st_mtime_ns
+        if listed_at != self._listed_at:
+            self._keys = sorted(match.group(1) for match in map(_FILE_RE.match, os.listdir(self.directory)) if match)
+            self._listed_at = listed_at
+        start = month_key(start_iso) if start_iso else None
+        end = month_key(end_iso) if end_iso else None
+        return [key for key in self._keys if (start is None or key >= start) and (end is None or key <= end)]
+
+    def attach(self, key: str, create: bool = False, evict: bool = True) -> Optional[str]:
+        """
+        Adjunta el mes a la conexión si no lo está
+
+        Args:
+            evict (bool): Separar los meses usados hace más tiempo para no pasar de max_attached
+
+        Returns:
+            str: Nombre del schema (m_AAAA_MM), o None si el mes no existe y `create` es False
+        """
+        schema = self.attached.get(key)
+        if schema is not None:
+            self.attached.move_to_end(key)
+            return schema
+        path = self.path(key)
+        if not create and not os.path.exists(path):
+            return None
+        if self.conn.in_transaction:
+            raise sqlite3.OperationalError(f"Cannot attach partition {key} inside a transaction")
+        while self.attached and len(self.attached) >= (self.max_attached if evict else self.limit):
+            self.detach(next(iter(self.attached)))
+
+        schema = f"m_{key}"
+        self.conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+        self.attached[key] = schema
+        self.conn.execute(f"PRAGMA {schema}.journal_mode = {self.journal_mode}")
+        self.conn.execute(f"PRAGMA {schema}.synchronous = {self.synchronous}")
+        if create:
+            for statement in PARTITION_SCHEMA:
+                self.conn.execute(statement.format(schema=schema))
+            self.conn.commit()
+        return schema
+
+    def attach_many(self, keys: List[str], create: bool = False) -> List[Optional[str]]:
+        """
+        Adjunta juntos todos los meses de `keys`, para usarlos en una misma
+        transacción; se separan antes los que no están en `keys`
+
+        Raises:
+            ValueError: Si son más meses de los que SQLite puede adjuntar a la vez
+        """
+        if len(keys) > self.limit:
+            raise ValueError(f"Cannot attach {len(keys)} partitions at once (SQLite limit is {self.limit})")
+        wanted = set(keys)
+        missing = len(wanted - set(self.attached))
+        for key in [key for key in self.attached if key not in wanted]:
+            if len(self.attached) + missing <= self.max_attached:
+                break
+            self.detach(key)
+        return [self.attach(key, create, evict=False) for key in keys]
+
+    def detach(self, key: str):
+        schema = self.attached.pop(key, None)
+        if schema is not None:
+            self.conn.execute(f"DETACH DATABASE {schema}")
+
+    def drop(self, key: str) -> bool:
+        """
+        Borra el archivo del mes (y su WAL). Otras conexiones que lo tengan
+        adjunto siguen leyendo el archivo ya borrado hasta separarlo.
+        """
+        self.detach(key)
+        removed = False
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path(key) + suffix)
+                removed = True
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+def _migrate(Database) -> int:
+    """Mueve gps_data de la base principal a los archivos mensuales, un mes por transacción"""
+    conn = Database.get_connection()
+    partitions = Database.partitions(migrating=True)
+    months = [row[0] for row in conn.execute(
+        "SELECT DISTINCT substr(timestamp, 1, 7) FROM main.gps_data WHERE timestamp IS NOT NULL ORDER BY 1")]
+    moved = 0
+    for month in months:
+        key = month.replace('-', '_')
+        start, end = month, add_months(key, 1).replace('_', '-')
+        schema = partitions.attach(key, create=True)
+        try:
+            cursor = conn.execute(f'''
+                INSERT INTO {schema}.gps_data (imei, timestamp, latitude, longitude, altitude, angle, satellites, speed)
+                SELECT imei, timestamp, latitude, longitude, altitude, angle, satellites, speed
+                FROM main.gps_data WHERE timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp, id
+            ''', (start, end))
+            count = cursor.rowcount
+            conn.execute("DELETE FROM main.gps_data WHERE timestamp >= ? AND timestamp < ?", (start, end))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logging.error(f"Error migrating month {key} to its partition: {e}")
+            raise
+        moved += count
+        logging.info(f"Moved {count} records of {key} to {partitions.path(key)}")
+    Database._unmigrated = None
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['maintain', 'migrate', 'mysql-partition'])
+    parser.add_argument('--skip-mysql', action='store_true', help="sólo SQLite")
+    args = parser.parse_args()
+
+    from config.config import Config
+    from data.database import Database
+
+    Config.setup_logging()
+    if args.command == 'migrate':
+        if not Config.DB_CONFIG['sqlite']['partitioned']:
+            logging.error("SQLITE_PARTITIONED is disabled; enable it before migrating")
+            return 1
+        logging.info(f"Moved {_migrate(Database)} records to monthly partitions")
+        return 0
+
+    from data.mysql_ubicacion_manager import MySQLUbicacionManager
+    ubicaciones = MySQLUbicacionManager()
+    mysql_config = Config.DB_CONFIG['mysql']
+    if args.command == 'mysql-partition':
+        return 0 if ubicaciones.partition_table(mysql_config['partition_months_ahead']) else 1
+
+    dropped = Database.apply_retention(Config.DB_CONFIG['sqlite']['retention_months'])
+    unit = 'partitions' if Config.DB_CONFIG['sqlite']['partitioned'] else 'rows'
+    logging.info(f"SQLite retention removed {dropped} {unit}")
+    if not args.skip_mysql:
+        if not ubicaciones.ensure_partitions(mysql_config['partition_months_ahead']):
+            return 1
+        dropped = ubicaciones.drop_partitions_before(retention_cutoff(mysql_config['ubicaciones_retention_months']))
+        if dropped is None:
+            return 1
+        logging.info(f"MySQL retention dropped partitions: {', '.join(dropped) or 'none'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Resúmenes (rollups) por dispositivo y por día/hora de gps_data.
+
+La ingesta los actualiza en la misma transacción que inserta las
+posiciones (Database.insert_gps_data_batch); este módulo arma los
+incrementos y sirve de comando para reconstruirlos desde el historial.
+
+Uso:
+    python -m data.rollups                     # todos los dispositivos
+    python -m data.rollups --pending           # sólo los que tienen historial anterior a sus resúmenes
+    python -m data.rollups --imei 356307042441013
+"""
+import sys
+import math
+import time
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Largo del prefijo del timestamp ISO 8601 (UTC) que identifica cada período
+ROLLUP_PERIODS = {'day': 10, 'hour': 13}
+
+ROLLUP_COLUMNS = ('imei', 'period', 'bucket', 'records', 'distance', 'moving_seconds', 'speed_sum',
+                  'max_speed', 'altitude_sum', 'first_fix', 'last_fix', 'last_latitude', 'last_longitude')
+
+EARTH_RADIUS = 6371000.0  # metros
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia en metros entre dos puntos"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _seconds(timestamp: str) -> float:
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class RollupAccumulator:
+    """
+    Acumula posiciones en incrementos por (imei, período, bucket).
+
+    La distancia y el tiempo en movimiento salen de cada posición y la
+    anterior del mismo dispositivo: un tramo cuenta si la posición nueva
+    reporta al menos `moving_speed` km/h, y su tiempo sólo si el salto es
+    de hasta `max_gap` segundos (más es equipo apagado o sin señal). Una
+    posición más antigua que la última conocida (datos atrasados del
+    buffer del equipo) suma a los conteos y velocidades pero no a la
+    distancia; una reconstrucción con `python -m data.rollups` la ubica
+    en su lugar.
+    """
+
+    def __init__(self, moving_speed: float = 3.0, max_gap: float = 300.0):
+        """
+        Args:
+            moving_speed (float): Velocidad (km/h) desde la que el equipo se considera en movimiento
+            max_gap (float): Segundos máximos entre posiciones para sumar tiempo en movimiento
+        """
+        self.moving_speed = moving_speed
+        self.max_gap = max_gap
+        self.buckets: Dict[Tuple[str, str, str], list] = {}
+        # imei -> (timestamp, segundos, latitud, longitud) de la última posición
+        self.last: Dict[str, tuple] = {}
+
+    def seed(self, imei: str, timestamp: Optional[str], latitude: Optional[float], longitude: Optional[float]):
+        """Última posición ya resumida del dispositivo, para continuar la distancia desde ahí"""
+        if timestamp is not None and latitude is not None and longitude is not None:
+            self.last[imei] = (timestamp, _seconds(timestamp), latitude, longitude)
+
+    def add(self, imei: str, timestamp: str, latitude: float, longitude: float,
+            altitude: Optional[float], speed: Optional[float]):
+        speed = speed or 0
+        seconds = _seconds(timestamp)
+        distance = moving = 0.0
+        previous = self.last.get(imei)
+        if previous is None or timestamp > previous[0]:
+            if previous is not None and speed >= self.moving_speed:
+                distance = haversine(previous[2], previous[3], latitude, longitude)
+                elapsed = seconds - previous[1]
+                if elapsed <= self.max_gap:
+                    moving = elapsed
+            self.last[imei] = (timestamp, seconds, latitude, longitude)
+
+        for period, length in ROLLUP_PERIODS.items():
+            key = (imei, period, timestamp[:length])
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = [1, distance, moving, speed, speed, altitude or 0,
+                                     timestamp, timestamp, latitude, longitude]
+                continue
+            bucket[0] += 1
+            bucket[1] += distance
+            bucket[2] += moving
+            bucket[3] += speed
+            bucket[4] = max(bucket[4], speed)
+            bucket[5] += altitude or 0
+            bucket[6] = min(bucket[6], timestamp)
+            if timestamp > bucket[7]:
+                bucket[7:10] = [timestamp, latitude, longitude]
+
+    def add_rows(self, rows: Iterable[tuple]):
+        """Agrega filas (imei, timestamp, latitude, longitude, altitude, angle, satellites, speed)"""
+        for imei, timestamp, latitude, longitude, altitude, _, _, speed in rows:
+            self.add(imei, timestamp, latitude, longitude, altitude, speed)
+
+    def rows(self) -> List[tuple]:
+        """Incrementos en el orden de ROLLUP_COLUMNS"""
+        return [key + tuple(values) for key, values in self.buckets.items()]
+
+
+def rollup_dict(row) -> dict:
+    """Fila de gps_rollups con los promedios ya calculados"""
+    data = dict(row)
+    records = data.get('records') or 0
+    data['avg_speed'] = data.pop('speed_sum') / records if records else None
+    data['avg_altitude'] = data.pop('altitude_sum') / records if records else None
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--imei', action='append', help="dispositivo a reconstruir (se puede repetir)")
+    parser.add_argument('--pending', action='store_true',
+                        help="sólo los dispositivos con historial anterior a sus resúmenes")
+    args = parser.parse_args()
+
+    from config.config import Config
+    from data.database import Database
+
+    Config.setup_logging()
+    if args.imei:
+        imeis = args.imei
+    elif args.pending:
+        imeis = Database.get_rollups_pending()
+    else:
+        imeis = Database.get_imeis()
+    start = time.monotonic()
+    total = 0
+    for index, imei in enumerate(imeis, 1):
+        rows = Database.rebuild_rollups(imei)
+        if rows is None:
+            return 1
+        total += rows
+        logging.info(f"Rollups rebuilt for IMEI {imei} ({rows} records, {index}/{len(imeis)})")
+    logging.info(f"Rebuilt rollups for {len(imeis)} devices and {total} records in {time.monotonic() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
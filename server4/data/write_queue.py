@@ -0,0 +1,179 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from utils.metrics import Metrics
+
+_STOP = object()
+
+
+class PartialWriteError(Exception):
+    """El writer guardó (y confirmó) sólo los primeros `packets` paquetes del lote antes de fallar"""
+
+    def __init__(self, packets: int, rows: int):
+        super().__init__(f"Only the first {packets} packets ({rows} records) were saved")
+        self.packets = packets
+        self.rows = rows
+
+
+class WriteBehindQueue:
+    """
+    Cola acotada entre la ingesta y el almacenamiento.
+
+    Los handlers encolan paquetes decodificados y uno o más writers los
+    agrupan y guardan con una sola transacción, cuando se juntan
+    `batch_size` paquetes o cuando el primero lleva `flush_interval`
+    segundos esperando. Cada paquete encolado recibe un Future que se
+    resuelve con True/False cuando su transacción termina, para poder
+    enviar el ACK después del commit.
+    """
+
+    ACK_ON_ENQUEUE = 'enqueue'
+    ACK_ON_COMMIT = 'commit'
+
+    def __init__(self, writer: Callable[[list], int], max_size: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 0.2, workers: int = 1, ack_mode: str = ACK_ON_COMMIT,
+                 enqueue_timeout: float = 1.0, commit_timeout: float = 10.0, name: str = 'write_queue'):
+        """
+        Args:
+            writer: Función que guarda una lista de (imei, records) y retorna las filas guardadas
+            max_size (int): Máximo de paquetes en espera (backpressure)
+            batch_size (int): Paquetes por transacción
+            flush_interval (float): Espera máxima (s) de un paquete antes de guardarse
+            workers (int): Threads escritores
+            ack_mode (str): 'commit' (ACK tras el commit) o 'enqueue' (ACK al encolar)
+            enqueue_timeout (float): Espera máxima (s) por espacio en la cola antes de descartar
+            commit_timeout (float): Espera máxima (s) por el commit en modo 'commit'
+            name (str): Prefijo de las métricas y nombre de los threads
+        """
+        if ack_mode not in (self.ACK_ON_ENQUEUE, self.ACK_ON_COMMIT):
+            raise ValueError(f"Invalid ack mode: {ack_mode}")
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.num_workers = workers
+        self.ack_mode = ack_mode
+        self.enqueue_timeout = enqueue_timeout
+        self.commit_timeout = commit_timeout
+        self.name = name
+        self.workers: List[threading.Thread] = []
+        self.is_running = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Inicia los threads escritores"""
+        with self._lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+            atexit.register(self.stop)
+        logging.info(f"Write-behind queue '{self.name}' started ({self.num_workers} writers, "
+                     f"batch={self.batch_size}, interval={self.flush_interval}s, ack={self.ack_mode})")
+
+    def submit(self, imei: str, records: list, block: bool = True) -> Optional[Future]:
+        """
+        Encola los registros de un paquete
+
+        Args:
+            imei (str): IMEI del dispositivo
+            records (list): Registros decodificados
+            block (bool): Esperar hasta `enqueue_timeout` si la cola está llena
+
+        Returns:
+            Future: Se resuelve con True/False al terminar el commit,
+                o None si la cola está llena y el paquete se descartó
+        """
+        future = Future()
+        try:
+            self.queue.put((imei, records, future, time.monotonic()), block, self.enqueue_timeout)
+        except queue.Full:
+            Metrics.increment(f'{self.name}.dropped')
+            logging.warning(f"Write queue full, dropping {len(records)} records from IMEI {imei}")
+            return None
+        Metrics.increment(f'{self.name}.enqueued')
+        Metrics.set_gauge(f'{self.name}.depth', self.queue.qsize())
+        return future
+
+    def _run(self):
+        """Bucle de un writer: arma lotes por tamaño o plazo y los guarda"""
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = item[3] + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+            if stop:
+                break
+
+    def _flush(self, batch: list):
+        """Guarda un lote en una transacción y resuelve sus Futures"""
+        start = time.monotonic()
+        rows = sum(len(records) for _, records, _, _ in batch)
+        saved_packets = 0
+        try:
+            saved = self.writer([(imei, records) for imei, records, _, _ in batch])
+        except PartialWriteError as e:
+            logging.error(f"Write-behind flush of '{self.name}' partially failed: {e}")
+            saved, saved_packets = e.rows, e.packets
+        except Exception as e:
+            logging.error(f"Write-behind flush of '{self.name}' failed: {e}")
+            saved = 0
+        finished = time.monotonic()
+        success = saved == rows
+
+        Metrics.observe(f'{self.name}.flush', finished - start)
+        Metrics.observe(f'{self.name}.commit_latency', finished - batch[0][3])
+        Metrics.set_gauge(f'{self.name}.depth', self.queue.qsize())
+        if success:
+            Metrics.increment(f'{self.name}.rows_written', rows)
+        else:
+            if saved_packets:
+                Metrics.increment(f'{self.name}.rows_written', saved)
+            Metrics.increment(f'{self.name}.rows_failed', rows - saved if saved_packets else rows)
+            logging.error(f"Failed to write {rows - saved if saved_packets else rows} records "
+                          f"from {len(batch) - saved_packets} packets")
+
+        # Con un guardado parcial, los primeros paquetes ya están confirmados
+        for index, (_, _, future, _) in enumerate(batch):
+            future.set_result(success or index < saved_packets)
+
+    def stop(self, timeout: float = 10.0):
+        """Detiene los writers después de guardar lo pendiente"""
+        with self._lock:
+            if not self.is_running:
+                return
+            self.is_running = False
+            for _ in self.workers:
+                try:
+                    self.queue.put(_STOP, timeout=timeout)
+                except queue.Full:
+                    logging.error("Write queue full while stopping, pending records may be lost")
+            for worker in self.workers:
+                worker.join(timeout)
+            self.workers.clear()
+        logging.info(f"Write-behind queue '{self.name}' stopped")
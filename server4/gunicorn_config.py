@@ -3,7 +3,9 @@ import multiprocessing
 
 # Configuración del servidor
 bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
-workers = 1
+# Más de un worker requiere MESSAGE_BUS_BACKEND=redis: la ingesta corre en el
+# proceso principal (preload_app) y cada worker recibe las posiciones por Redis
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
 worker_class = 'eventlet'
 worker_connections = 1000
 timeout = 120
@@ -30,6 +32,10 @@ def on_starting(server):
 
 def post_worker_init(worker):
     """Se ejecuta después de que cada worker se inicializa"""
+    # Iniciar en el worker los threads del bus (los del proceso principal no sobreviven al
+    # fork) y recibir ahí, no en el proceso principal, lo que publica la ingesta
+    from utils.message_bus import get_message_bus
+    get_message_bus().listen()
     worker.log.info("Worker initialized")
 
 def on_exit(server):
@@ -6,6 +6,7 @@ from threading import Thread, Event
 from config.config import Config
 from server.gps_server import start_server, GPSServer
 from api.api import app, socketio
+from utils.message_bus import get_message_bus
 
 # Evento para controlar el ciclo de vida del servidor
 server_shutdown = Event()
@@ -95,6 +96,7 @@ def main():
         else:
             logging.info("Starting in development mode")
             port = int(os.getenv('PORT', Config.API_CONFIG['port']))
+            get_message_bus().listen()
             socketio.run(
                 app,
                 host=Config.API_CONFIG['host'],
@@ -0,0 +1,391 @@
+import os
+import asyncio
+import binascii
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Event
+from typing import Dict, List, Optional, Tuple
+from data.data_manager import DataManager
+from utils.message_bus import get_message_bus, TOPIC_GPS_UPDATE
+from utils.metrics import Metrics
+from utils.timer_wheel import TimerWheel
+from config.config import Config
+from .decode_pool import DecodePool, DecodedPacket, decode_packet, get_decode_pool
+from .protocol import (
+    IMEI_ACCEPTED, IMEI_REJECTED, AVL_HEADER_SIZE, FrameError,
+    pack_ack, parse_frame_header, parse_imei, validate_imei
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class AsyncGPSServer:
+    """
+    Servidor GPS basado en asyncio: una sola coroutine por dispositivo en lugar
+    de un thread por conexión. Implementa el mismo handshake de IMEI y ACK AVL
+    que ClientHandler; la decodificación y el guardado corren en un pool de
+    threads acotado para no bloquear el event loop.
+    """
+
+    AUTH_TIMEOUT = 30  # segundos para autenticación
+    DATA_TIMEOUT = 60  # segundos para datos GPS
+
+    def __init__(self):
+        """Inicializa el servidor GPS asíncrono"""
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.is_running = False
+        self.clients: Dict[str, asyncio.StreamWriter] = {}
+        self.active_connections = 0
+        self.server_thread: Optional[Thread] = None
+        self._ready = Event()
+        self._stopped: Optional[asyncio.Event] = None
+
+        # Cargar configuración
+        self.config = Config.get_server_config()
+        self.host = '0.0.0.0'  # Forzar escucha en todas las interfaces
+        self.port = int(self.config['port'])
+        self.backlog = self.config['backlog']
+        self.max_connections = self.config['max_connections']
+        self.buffer_size = self.config['buffer_size']
+        self.max_frame_size = self.config['max_frame_size']
+        # Worker del supervisor: comparte el puerto con los demás procesos (SO_REUSEPORT)
+        self.shard_port = False
+        # Plazos de autenticación y datos: una rueda revisada una vez por tick
+        # en lugar de un wait_for (con su timer) por cada lectura
+        self.deadlines = TimerWheel(tick=self.config['idle_tick'])
+        self._timed_out = set()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config['worker_threads'],
+            thread_name_prefix="GPSWorker"
+        )
+
+    def start(self) -> bool:
+        """Inicia el event loop del servidor en un thread dedicado"""
+        if self.is_running:
+            logging.warning("GPS Server is already running")
+            return True
+
+        self._raise_file_limit()
+        self.is_running = True
+        self._ready.clear()
+        self.server_thread = Thread(target=self._run_loop, name="AsyncGPSServerLoop")
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        if not self._ready.wait(10) or self.server is None:
+            logging.error("Async GPS Server failed to start")
+            self.is_running = False
+            return False
+
+        logging.info(f"Async GPS Server listening for connections on {self.host}:{self.port}")
+        logging.info("Waiting for GPS device connections...")
+        return True
+
+    def _run_loop(self):
+        """Ejecuta el event loop hasta que se detenga el servidor"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        except Exception as e:
+            logging.error(f"Error in async server loop: {e}")
+        finally:
+            self.is_running = False
+            self._ready.set()
+            self.loop.close()
+
+    async def _serve(self):
+        """Abre el socket de escucha y atiende conexiones"""
+        self._stopped = asyncio.Event()
+        try:
+            self.server = await asyncio.start_server(
+                self._handle_client,
+                self.host,
+                self.port,
+                backlog=max(self.backlog, 1024),
+                reuse_address=True,
+                reuse_port=self.shard_port or None,
+                limit=self.buffer_size
+            )
+        except Exception as e:
+            logging.error(f"Error initializing async GPS server: {e}")
+            self._ready.set()
+            return
+
+        logging.info(f"Async GPS Server initialized and bound to {self.host}:{self.port}")
+        self._ready.set()
+        reaper = asyncio.ensure_future(self._reap_idle())
+        try:
+            async with self.server:
+                await self._stopped.wait()
+        finally:
+            reaper.cancel()
+
+    async def _reap_idle(self):
+        """Cierra en bloque, una vez por tick, las conexiones cuyo plazo venció"""
+        while True:
+            await asyncio.sleep(self.deadlines.tick)
+            expired = self.deadlines.advance()
+            if not expired:
+                continue
+            for writer, _ in expired:
+                # La lectura pendiente del handler termina con EOF al cerrar el transporte
+                self._timed_out.add(writer)
+                writer.close()
+            Metrics.increment('connections.timed_out', len(expired))
+            logging.info(f"Closed {len(expired)} idle connections")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Atiende un dispositivo: autenticación y bucle de datos AVL"""
+        addr = writer.get_extra_info('peername')
+
+        # En producción, ignorar conexiones locales (health checks)
+        if os.getenv('FLASK_ENV') == 'production' and addr and addr[0] in ['127.0.0.1', 'localhost']:
+            logging.warning(f"Ignoring local connection from {addr}")
+            writer.close()
+            return
+
+        if self.active_connections >= self.max_connections:
+            logging.warning(f"Connection limit reached. Rejecting {addr}")
+            writer.close()
+            return
+
+        self.active_connections += 1
+        imei = "unknown"
+        try:
+            logging.info(f"New GPS device connection from {addr}")
+            self.deadlines.schedule(writer, self.AUTH_TIMEOUT)
+            imei = await self._authenticate(reader, writer)
+            if imei is None:
+                return
+
+            old_writer = self.clients.get(imei)
+            if old_writer is not None and old_writer is not writer:
+                old_writer.close()
+            self.clients[imei] = writer
+            logging.info(f"GPS device registered - IMEI: {imei}")
+            self.deadlines.schedule(writer, self.DATA_TIMEOUT)
+
+            while self.is_running:
+                frame = await self._read_frame(reader)
+                if frame is None:
+                    if writer in self._timed_out:
+                        logging.warning(f"Timeout for {addr} (IMEI: {imei})")
+                    else:
+                        logging.info(f"Connection closed by client {imei}")
+                    break
+                self.deadlines.touch(writer, self.DATA_TIMEOUT)
+                if not await self._handle_data(imei, frame, writer):
+                    break
+
+        except FrameError as e:
+            # El flujo quedó desalineado: cerrar para que el dispositivo reconecte y reenvíe
+            logging.warning(f"Invalid GPS data received from IMEI {imei}: {e}")
+            writer.write(pack_ack(0))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            if writer in self._timed_out:
+                logging.warning(f"Timeout for {addr} (IMEI: {imei})")
+            else:
+                logging.info(f"Connection lost for {addr} (IMEI: {imei})")
+        except Exception as e:
+            logging.error(f"Error handling client {addr}: {e}")
+        finally:
+            self.deadlines.cancel(writer)
+            self._timed_out.discard(writer)
+            self.active_connections -= 1
+            if self.clients.get(imei) is writer:
+                del self.clients[imei]
+            writer.close()
+            logging.info(f"Connection closed for {addr}")
+
+    async def _authenticate(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[str]:
+        """Lee el paquete de IMEI y responde 0x01 / 0x00"""
+        header = await reader.readexactly(2)
+        imei_length = int.from_bytes(header, 'big')
+        body = await reader.readexactly(imei_length)
+        logging.debug(f"Received authentication data: {binascii.hexlify(header + body).decode()}")
+
+        try:
+            imei = parse_imei(header + body)
+        except UnicodeDecodeError:
+            imei = None
+
+        if imei is None or not validate_imei(imei):
+            logging.error("Authentication error: Invalid IMEI format")
+            writer.write(IMEI_REJECTED)
+            await writer.drain()
+            return None
+
+        logging.info(f"Device authenticated | IMEI: {imei}")
+        writer.write(IMEI_ACCEPTED)
+        await writer.drain()
+        return imei
+
+    async def _read_frame(self, reader: asyncio.StreamReader) -> Optional[bytes]:
+        """
+        Lee exactamente un paquete AVL usando el preámbulo y el largo de datos
+
+        Returns:
+            bytes: Paquete completo, o None si el dispositivo cerró la conexión
+        """
+        try:
+            header = await reader.readexactly(AVL_HEADER_SIZE)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise
+            return None
+        frame_size = parse_frame_header(header, 0, self.max_frame_size)
+        return header + await reader.readexactly(frame_size - AVL_HEADER_SIZE)
+
+    async def _handle_data(self, imei: str, buff: bytes, writer: asyncio.StreamWriter) -> bool:
+        """
+        Procesa un paquete AVL y envía el ACK
+
+        Returns:
+            bool: True si la conexión debe mantenerse abierta
+        """
+        pool = get_decode_pool()
+        if pool is None:
+            decoded = await self.loop.run_in_executor(self.executor, self._process_packet, imei, buff)
+        else:
+            decoded = await self._process_packet_pooled(pool, imei, buff)
+        if decoded is None:
+            return False
+
+        records, is_command = decoded
+        if is_command:
+            # Respuestas Codec 12: no llevan ACK de registros
+            return True
+
+        if records and not await self._store_records(imei, records):
+            logging.warning(f"Records from IMEI {imei} not stored, sending NACK")
+            writer.write(pack_ack(0))
+            await writer.drain()
+            return True
+
+        writer.write(pack_ack(len(records)))
+        await writer.drain()
+
+        if records:
+            logging.info(f"Processed {len(records)} records from IMEI: {imei}")
+            self.executor.submit(self._emit_update, imei, records)
+        else:
+            logging.warning("No valid records decoded")
+        return True
+
+    async def _store_records(self, imei: str, records: List[dict]) -> bool:
+        """
+        Entrega los registros a la cola de escritura sin bloquear el event loop
+
+        Returns:
+            bool: True si el paquete puede confirmarse al dispositivo
+        """
+        write_queue = DataManager.get_write_queue()
+        if write_queue is None:
+            return await self.loop.run_in_executor(self.executor, DataManager.save_data, imei, records)
+
+        future = write_queue.submit(imei, records, block=False)
+        if future is None:
+            return False
+        if write_queue.ack_mode == write_queue.ACK_ON_ENQUEUE:
+            return True
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), write_queue.commit_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Timed out waiting for commit of IMEI {imei} records")
+            return False
+
+    @staticmethod
+    def _process_packet(imei: str, buff: bytes) -> Optional[Tuple[List[dict], bool]]:
+        """
+        Verifica y decodifica un paquete (se ejecuta en el pool de threads)
+
+        Returns:
+            Tuple: (registros decodificados, True si fue un paquete Codec 12),
+                o None si hubo un error
+        """
+        Metrics.increment('avl.frames_received')
+        try:
+            decoded = decode_packet(imei, buff)
+        except Exception as e:
+            logging.error(f"Error processing GPS records: {str(e)}")
+            return None
+        return AsyncGPSServer._decoded_result(imei, decoded)
+
+    @staticmethod
+    async def _process_packet_pooled(pool: DecodePool, imei: str, buff: bytes) -> Optional[Tuple[List[dict], bool]]:
+        """
+        Como _process_packet, pero decodificando en el pool de procesos sin ocupar un thread
+
+        Con la cola del pool llena no espera (bloquearía el event loop): da
+        ([], False) para responder NACK y que el dispositivo reenvíe.
+        """
+        Metrics.increment('avl.frames_received')
+        future = pool.submit(imei, buff, block=False)
+        if future is None:
+            logging.warning(f"Decode pool busy, sending NACK to IMEI {imei}")
+            return [], False
+        try:
+            decoded = await asyncio.wait_for(asyncio.wrap_future(future), pool.timeout)
+        except Exception as e:
+            logging.error(f"Error processing GPS records: {str(e)}")
+            return None
+        return AsyncGPSServer._decoded_result(imei, decoded)
+
+    @staticmethod
+    def _decoded_result(imei: str, decoded: DecodedPacket) -> Tuple[List[dict], bool]:
+        """(registros, es Codec 12) de un DecodedPacket; un CRC inválido da ([], False) para responder NACK"""
+        if not decoded.crc_ok:
+            Metrics.increment('avl.frames_crc_failed')
+            logging.warning(f"CRC mismatch in AVL packet from IMEI {imei}, sending NACK")
+            return [], False
+        for response in decoded.responses:
+            logging.info(f"Command {response['Type']} from IMEI {imei}: {response['Message']}")
+        return decoded.records, decoded.is_command
+
+    @staticmethod
+    def _emit_update(imei: str, records: List[dict]):
+        """Genera los eventos de zonas y publica la última ubicación para la API"""
+        try:
+            DataManager.process_zone_transitions(imei, records)
+        except Exception as e:
+            logging.error(f"Error processing zone transitions: {e}")
+        get_message_bus().publish(TOPIC_GPS_UPDATE, {'imei': imei, 'data': records[-1]})
+
+    @staticmethod
+    def _raise_file_limit():
+        """Sube el límite de descriptores abiertos al máximo permitido"""
+        if resource is None:
+            return
+        try:
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if soft < hard:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+                logging.info(f"Raised open file limit from {soft} to {hard}")
+        except (ValueError, OSError) as e:
+            logging.warning(f"Could not raise open file limit: {e}")
+
+    def cleanup(self):
+        """Detiene el event loop y cierra todas las conexiones"""
+        self.is_running = False
+
+        if self.loop and self._stopped and not self.loop.is_closed():
+            def _shutdown():
+                for writer in list(self.clients.values()):
+                    writer.close()
+                self.clients.clear()
+                self._stopped.set()
+            try:
+                self.loop.call_soon_threadsafe(_shutdown)
+            except RuntimeError:
+                pass
+
+        if self.server_thread:
+            self.server_thread.join(timeout=5)
+
+        self.executor.shutdown(wait=False)
+        logging.info("Async GPS Server shut down cleanly")
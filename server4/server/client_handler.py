@@ -3,34 +3,53 @@ import binascii
 import struct
 import socket
 from threading import Thread
-from utils.decoder import Decoder
 from data.data_manager import DataManager
-from api.api import emit_gps_update
+from utils.message_bus import get_message_bus, TOPIC_GPS_UPDATE
+from utils.metrics import Metrics
+from utils.timer_wheel import TimerWheel
+from config.config import Config
+from .protocol import (
+    IMEI_ACCEPTED, IMEI_REJECTED, AVLFrameReader, FrameError,
+    parse_imei, validate_imei
+)
+from .decode_pool import decode
 
 class ClientHandler(Thread):
-    def __init__(self, conn, addr):
+    def __init__(self, conn, addr, deadlines: TimerWheel = None):
+        """
+        Args:
+            conn: Socket del dispositivo
+            addr: Dirección del dispositivo
+            deadlines: Rueda de plazos del servidor; si no se indica, los plazos
+                se controlan con el timeout del socket
+        """
         super().__init__()
         self.conn = conn
         self.addr = addr
         self.imei = "unknown"
         self.daemon = True
         self.is_running = True
+        self.deadlines = deadlines
+        self.timed_out = False
         
         # Configuración de timeouts
         self.AUTH_TIMEOUT = 30  # segundos para autenticación
         self.DATA_TIMEOUT = 60  # segundos para datos GPS
         self.BUFFER_SIZE = 8192
         
+        # Reensamblado de paquetes AVL partidos o concatenados por TCP
+        self.frame_reader = AVLFrameReader(Config.SERVER_CONFIG['max_frame_size'])
+        
     def run(self):
         """Método principal del thread"""
         logging.info(f"New connection from {self.addr}")
         try:
             # Establecer timeout para autenticación
-            self.conn.settimeout(self.AUTH_TIMEOUT)
+            self.set_deadline(self.AUTH_TIMEOUT)
             self.handle_authentication()
             
             # Cambiar timeout para datos GPS
-            self.conn.settimeout(self.DATA_TIMEOUT)
+            self.set_deadline(self.DATA_TIMEOUT)
             
             while self.is_running:
                 try:
@@ -50,6 +69,25 @@ class ClientHandler(Thread):
         finally:
             self.cleanup()
 
+    def set_deadline(self, seconds: float):
+        """Plazo para recibir datos, en la rueda del servidor o como timeout del socket"""
+        if self.deadlines is not None:
+            self.deadlines.schedule(self, seconds)
+        else:
+            self.conn.settimeout(seconds)
+
+    def expire(self):
+        """
+        Cierra la conexión porque venció su plazo (lo llama el servidor desde
+        la rueda); el recv bloqueado del thread retorna y el thread termina
+        """
+        self.timed_out = True
+        self.is_running = False
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
     def handle_authentication(self):
         """Maneja el proceso de autenticación del dispositivo"""
         logging.info("Waiting for device authentication...")
@@ -57,6 +95,8 @@ class ClientHandler(Thread):
         try:
             # Recibir datos de autenticación
             buff = self.receive_with_retry(retries=3)
+            if not buff and self.timed_out:
+                raise socket.timeout("authentication deadline expired")
             if not buff:
                 raise Exception("No authentication data received")
                 
@@ -64,26 +104,26 @@ class ClientHandler(Thread):
             logging.debug(f"Received authentication data: {received}")
             
             # Validar y procesar datos de autenticación
-            if len(received) > 2:
-                imei_length = int(received[:4], 16)
-                if len(received) < 4 + imei_length * 2:
+            if len(buff) > 1:
+                imei = parse_imei(buff)
+                if imei is None:
                     raise Exception("Incomplete IMEI data received")
                     
-                self.imei = bytes.fromhex(received[4:4+imei_length*2]).decode('ascii')
+                self.imei = imei
                 
                 # Validar formato IMEI
                 if not self.validate_imei(self.imei):
                     raise Exception("Invalid IMEI format")
                     
                 logging.info(f"Device authenticated | IMEI: {self.imei}")
-                self.send_with_retry(b'\x01')
+                self.send_with_retry(IMEI_ACCEPTED)
                 return True
             else:
                 raise Exception("Invalid authentication data format")
                 
         except Exception as e:
             logging.error(f"Authentication error: {str(e)}")
-            self.send_with_retry(b'\x00')
+            self.send_with_retry(IMEI_REJECTED)
             raise
 
     def handle_data(self) -> bool:
@@ -95,41 +135,74 @@ class ClientHandler(Thread):
         """
         try:
             buff = self.receive_with_retry(retries=2)
+            if not buff and self.timed_out:
+                # La rueda de plazos cerró el socket: se trata como un timeout
+                raise socket.timeout("data deadline expired")
             if not buff:
                 logging.info(f"Connection closed by client {self.imei}")
                 return False
+            if self.deadlines is not None:
+                self.deadlines.touch(self, self.DATA_TIMEOUT)
                 
-            received = binascii.hexlify(buff).decode()
-            logging.debug(f"GPS data received: {received}")
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f"GPS data received: {binascii.hexlify(buff).decode()}")
 
-            if len(received) > 8:
-                return self.process_gps_data(received)
-            else:
-                logging.warning("Invalid GPS data received")
+            try:
+                frames = self.frame_reader.feed(buff)
+            except FrameError as e:
+                # El flujo quedó desalineado: cerrar para que el dispositivo reconecte y reenvíe
+                logging.warning(f"Invalid GPS data received from IMEI {self.imei}: {e}")
                 self.send_with_retry(struct.pack("!L", 0))
+                return False
+
+            if not frames:
+                logging.debug(f"Waiting for rest of AVL packet ({self.frame_reader.pending} bytes buffered)")
                 return True
+
+            for frame in frames:
+                if not self.process_gps_data(frame):
+                    return False
+            return True
                 
+        except socket.timeout:
+            raise
         except Exception as e:
             logging.error(f"Error processing GPS data: {str(e)}")
             return False
 
-    def process_gps_data(self, received: str) -> bool:
+    def process_gps_data(self, received: bytes) -> bool:
         """
         Procesa los datos GPS recibidos
         
         Args:
-            received (str): Datos GPS en formato hexadecimal
+            received (bytes): Paquete AVL completo
             
         Returns:
             bool: True si los datos se procesaron correctamente
         """
         try:
-            decoder = Decoder(payload=received, imei=self.imei)
-            records = decoder.decode_data()
+            Metrics.increment('avl.frames_received')
+            # En el pool de decodificación si está habilitado (SERVER_DECODE_PROCESSES)
+            decoded = decode(self.imei, received)
+            if not decoded.crc_ok:
+                # Paquete corrupto: NACK para que el dispositivo lo reenvíe
+                Metrics.increment('avl.frames_crc_failed')
+                logging.warning(f"CRC mismatch in AVL packet from IMEI {self.imei}, sending NACK")
+                return self.send_with_retry(struct.pack("!L", 0))
+
+            records = decoded.records
+
+            if decoded.is_command:
+                # Respuestas Codec 12: no llevan ACK de registros
+                for response in decoded.responses:
+                    logging.info(f"Command {response['Type']} from IMEI {self.imei}: {response['Message']}")
+                return True
 
             if records:
-                # Guardar datos
-                DataManager.save_data(self.imei, records)
+                # Guardar datos (vía la cola de escritura); sin confirmación el dispositivo reenvía
+                if not DataManager.store_records(self.imei, records):
+                    logging.warning(f"Records from IMEI {self.imei} not stored, sending NACK")
+                    return self.send_with_retry(struct.pack("!L", 0))
                 
                 # Enviar confirmación
                 if not self.send_with_retry(struct.pack("!L", len(records))):
@@ -137,11 +210,14 @@ class ClientHandler(Thread):
                     
                 logging.info(f"Processed {len(records)} records from IMEI: {self.imei}")
                 
-                # Emitir última ubicación
+                # Eventos de entrada/salida de zonas
                 try:
-                    emit_gps_update(self.imei, records[-1])
+                    DataManager.process_zone_transitions(self.imei, records)
                 except Exception as e:
-                    logging.error(f"Error emitting GPS update: {e}")
+                    logging.error(f"Error processing zone transitions: {e}")
+
+                # Publicar la última ubicación para la API (no espera la emisión)
+                get_message_bus().publish(TOPIC_GPS_UPDATE, {'imei': self.imei, 'data': records[-1]})
                     
                 return True
             else:
@@ -212,12 +288,13 @@ class ClientHandler(Thread):
         Returns:
             bool: True si el formato es válido
         """
-        # Implementar validación según tus requerimientos
-        return len(imei) >= 10 and imei.isdigit()
+        return validate_imei(imei)
 
     def cleanup(self):
         """Limpia los recursos del cliente"""
         self.is_running = False
+        if self.deadlines is not None:
+            self.deadlines.cancel(self)
         try:
             self.conn.close()
         except:
@@ -0,0 +1,195 @@
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+from utils.decoder import Decoder
+from utils.metrics import Metrics
+from config.config import Config
+from .protocol import verify_frame_crc
+
+_STOP = object()
+
+
+class DecodedPacket(NamedTuple):
+    crc_ok: bool
+    records: List[dict]
+    is_command: bool
+    responses: List[dict]
+
+
+def decode_packet(imei: str, buff: bytes) -> DecodedPacket:
+    """Verifica el CRC y decodifica un paquete AVL completo"""
+    if not verify_frame_crc(buff):
+        return DecodedPacket(False, [], False, [])
+    decoder = Decoder(payload=buff, imei=imei)
+    records = decoder.decode_data()
+    return DecodedPacket(True, records, decoder.is_command, decoder.responses)
+
+
+def decode_batch(items: List[Tuple[str, bytes]]) -> list:
+    """
+    Decodifica varios paquetes (se ejecuta en un proceso del pool)
+
+    Returns:
+        list: Un DecodedPacket o la excepción correspondiente por paquete
+    """
+    results = []
+    for imei, buff in items:
+        try:
+            results.append(decode_packet(imei, buff))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _init_process():
+    Config.setup_logging()
+
+
+class DecodePool:
+    """
+    Decodificación de paquetes AVL en procesos separados.
+
+    Los threads de I/O entregan los bytes crudos con `submit` y reciben un
+    Future; un thread agrupa los paquetes (hasta `batch_size` o `max_delay`
+    segundos) y envía cada grupo a un ProcessPoolExecutor, así el costo de
+    IPC se reparte entre varios paquetes y la decodificación no compite por
+    el GIL con los threads que atienden los sockets.
+    """
+
+    def __init__(self, processes: int, batch_size: int = 64, max_delay: float = 0.002,
+                 max_pending: int = 10000, timeout: float = 5.0):
+        """
+        Args:
+            processes (int): Procesos decodificadores
+            batch_size (int): Máximo de paquetes por envío al pool
+            max_delay (float): Espera máxima (s) del primer paquete de un grupo
+            max_pending (int): Paquetes en espera de agruparse (backpressure)
+            timeout (float): Espera máxima (s) por el resultado en `decode`
+        """
+        self.processes = processes
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=max_pending)
+        # spawn: los procesos no heredan threads ni locks del proceso de ingesta
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_process
+        )
+        self.batcher = threading.Thread(target=self._run, name="DecodePoolBatcher", daemon=True)
+        self.batcher.start()
+
+    def submit(self, imei: str, buff: bytes, block: bool = True) -> Optional[Future]:
+        """
+        Encola un paquete
+
+        Args:
+            imei (str): IMEI del dispositivo
+            buff (bytes): Paquete AVL completo
+            block (bool): Esperar hasta `timeout` si la cola está llena; el
+                event loop usa False para no detener las demás conexiones
+
+        Returns:
+            Future: Se resuelve con su DecodedPacket, o None si la cola está llena
+        """
+        future = Future()
+        try:
+            self.queue.put((imei, bytes(buff), future), block, self.timeout)
+        except queue.Full:
+            Metrics.increment('decode_pool.rejected')
+            return None
+        return future
+
+    def decode(self, imei: str, buff: bytes) -> DecodedPacket:
+        """Decodifica un paquete esperando el resultado (para threads de I/O)"""
+        future = self.submit(imei, buff)
+        if future is None:
+            raise queue.Full(f"Decode pool queue full, packet from IMEI {imei} not decoded")
+        return future.result(self.timeout)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            try:
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                    if item is _STOP:
+                        self.queue.put(_STOP)
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: list):
+        futures = [future for _, _, future in batch]
+        try:
+            task = self.executor.submit(decode_batch, [(imei, buff) for imei, buff, _ in batch])
+        except Exception as e:  # Pool cerrado o roto
+            for future in futures:
+                future.set_exception(e)
+            return
+        Metrics.increment('decode_pool.batches')
+        Metrics.observe('decode_pool.batch_size', len(batch))
+        task.add_done_callback(lambda task: self._resolve(task, futures))
+
+    @staticmethod
+    def _resolve(task: Future, futures: List[Future]):
+        try:
+            results = task.result()
+        except Exception as e:
+            logging.error(f"Decode pool batch failed: {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        """Decodifica lo pendiente y detiene el pool"""
+        self.queue.put(_STOP)
+        self.batcher.join(timeout=self.timeout)
+        self.executor.shutdown(wait=True)
+
+
+_pool: Optional[DecodePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_decode_pool() -> Optional[DecodePool]:
+    """Pool de decodificación del proceso, o None si se decodifica en el thread de I/O"""
+    global _pool
+    config = Config.SERVER_CONFIG
+    if config['decode_processes'] <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DecodePool(
+                    config['decode_processes'],
+                    batch_size=config['decode_batch_size'],
+                    max_delay=config['decode_batch_delay'],
+                    timeout=config['decode_timeout']
+                )
+    return _pool
+
+
+def decode(imei: str, buff: bytes) -> DecodedPacket:
+    """Decodifica un paquete en el pool si está habilitado, o en el thread actual"""
+    pool = get_decode_pool()
+    if pool is None:
+        return decode_packet(imei, buff)
+    return pool.decode(imei, buff)
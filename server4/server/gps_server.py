@@ -1,11 +1,16 @@
 import os
+import time
 import socket
 import logging
 import threading
 from typing import Dict, Set, Optional
 from threading import Thread, Event, Lock
 from .client_handler import ClientHandler
+from .async_gps_server import AsyncGPSServer
+from .supervisor import IngestSupervisor
 from config.config import Config
+from utils.metrics import Metrics
+from utils.timer_wheel import TimerWheel
 
 class GPSServerInstance:
     _instance = None
@@ -17,7 +22,15 @@ class GPSServerInstance:
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
-                    cls._instance = GPSServer()
+                    engine = Config.SERVER_CONFIG['engine']
+                    if Config.SERVER_CONFIG['processes'] > 1:
+                        cls._instance = IngestSupervisor()
+                    elif engine == 'asyncio':
+                        cls._instance = AsyncGPSServer()
+                    else:
+                        if engine != 'threaded':
+                            logging.warning(f"Unknown server engine '{engine}', using threaded")
+                        cls._instance = GPSServer()
         return cls._instance
 
 class GPSServer:
@@ -38,6 +51,11 @@ class GPSServer:
         self.backlog = self.config['backlog']
         self.max_connections = self.config['max_connections']
         self.buffer_size = self.config['buffer_size']
+        # Worker del supervisor: comparte el puerto con los demás procesos
+        self.shard_port = False
+        # Plazos de autenticación y datos de todas las conexiones
+        self.deadlines = TimerWheel(tick=self.config['idle_tick'])
+        self.reaper_thread: Optional[Thread] = None
         
         # Estado del servidor
         self._is_initialized = False
@@ -48,22 +66,23 @@ class GPSServer:
             return True
             
         try:
-            # Verificar si el puerto está en uso
-            test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            test_socket.settimeout(1)
-            result = test_socket.connect_ex((self.host, self.port))
-            test_socket.close()
-            
-            if result == 0:
-                logging.error(f"Port {self.port} is already in use")
-                return False
+            # Verificar si el puerto está en uso (con shard_port lo usan los otros workers)
+            if not self.shard_port:
+                test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                test_socket.settimeout(1)
+                result = test_socket.connect_ex((self.host, self.port))
+                test_socket.close()
+                
+                if result == 0:
+                    logging.error(f"Port {self.port} is already in use")
+                    return False
             
             # Crear y configurar el socket principal
             self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             
-            # No usar SO_REUSEPORT en producción
-            if self.config.get('reuse_port', False) and not os.getenv('FLASK_ENV') == 'production':
+            # No usar SO_REUSEPORT en producción, salvo entre los workers del supervisor
+            if self.shard_port or (self.config.get('reuse_port', False) and not os.getenv('FLASK_ENV') == 'production'):
                 self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             
             # Configurar timeout más corto para mejor respuesta
@@ -97,6 +116,9 @@ class GPSServer:
             self.server_thread = Thread(target=self._run_server)
             self.server_thread.daemon = True
             self.server_thread.start()
+            self.reaper_thread = Thread(target=self._reap_idle, name="GPSIdleReaper")
+            self.reaper_thread.daemon = True
+            self.reaper_thread.start()
             
             logging.info(f"GPS Server listening for connections on {self.host}:{self.port}")
             logging.info("Waiting for GPS device connections...")
@@ -113,7 +135,7 @@ class GPSServer:
             try:
                 try:
                     client_socket, client_address = self.server.accept()
-                    client_socket.settimeout(30)  # timeout para clientes
+                    client_socket.settimeout(None)  # los plazos los maneja la rueda (_reap_idle)
                 except socket.timeout:
                     continue
                     
@@ -132,6 +154,18 @@ class GPSServer:
                 if self.is_running:
                     logging.error(f"Error in server loop: {e}")
                     
+    def _reap_idle(self):
+        """Cierra en bloque, una vez por tick, las conexiones cuyo plazo venció"""
+        while self.is_running:
+            time.sleep(self.deadlines.tick)
+            expired = self.deadlines.advance()
+            if not expired:
+                continue
+            for handler, _ in expired:
+                handler.expire()
+            Metrics.increment('connections.timed_out', len(expired))
+            logging.info(f"Closed {len(expired)} idle connections")
+
     def _handle_connection(self, client_socket: socket.socket, client_address: tuple):
         """Maneja una nueva conexión de dispositivo GPS"""
         try:
@@ -145,7 +179,7 @@ class GPSServer:
             
             logging.info(f"New GPS device connection from {client_address}")
             
-            handler = ClientHandler(client_socket, client_address)
+            handler = ClientHandler(client_socket, client_address, self.deadlines)
             handler.daemon = True
             handler.start()
             
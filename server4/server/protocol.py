@@ -0,0 +1,180 @@
+import struct
+from typing import List, Optional
+from utils.crc import crc16_ibm
+
+# Respuestas del handshake de IMEI
+IMEI_ACCEPTED = b'\x01'
+IMEI_REJECTED = b'\x00'
+
+# Estructura de un paquete AVL TCP:
+# preámbulo (4 bytes en cero) + largo del campo de datos (4) + datos + CRC (4)
+AVL_PREAMBLE = b'\x00\x00\x00\x00'
+AVL_HEADER_SIZE = 8
+AVL_CRC_SIZE = 4
+DEFAULT_MAX_FRAME_SIZE = 65536
+
+_ACK = struct.Struct("!L")
+_HEADER = struct.Struct("!4sL")
+_CRC = struct.Struct("!L")
+_COMMAND_HEADER = struct.Struct("!BBBL")  # codec 12, cantidad, tipo, largo
+
+CODEC_12 = 0x0C
+COMMAND_TYPE = 0x05
+
+
+class FrameError(ValueError):
+    """Error de framing: el flujo TCP ya no está alineado con los paquetes AVL"""
+
+
+def pack_ack(num_records: int) -> bytes:
+    """
+    Construye el ACK de un paquete AVL
+
+    Args:
+        num_records (int): Número de registros aceptados (0 para rechazar)
+
+    Returns:
+        bytes: Respuesta de 4 bytes para el dispositivo
+    """
+    return _ACK.pack(num_records)
+
+
+def parse_imei(buff: bytes) -> Optional[str]:
+    """
+    Extrae el IMEI del paquete de autenticación (2 bytes de longitud + IMEI ASCII)
+
+    Args:
+        buff (bytes): Datos recibidos del dispositivo
+
+    Returns:
+        str: IMEI decodificado o None si el paquete está incompleto
+    """
+    if len(buff) < 2:
+        return None
+    imei_length = int.from_bytes(buff[:2], 'big')
+    if len(buff) < 2 + imei_length:
+        return None
+    return bytes(buff[2:2 + imei_length]).decode('ascii')
+
+
+def validate_imei(imei: str) -> bool:
+    """
+    Valida el formato del IMEI
+
+    Args:
+        imei (str): IMEI a validar
+
+    Returns:
+        bool: True si el formato es válido
+    """
+    return len(imei) >= 10 and imei.isdigit()
+
+
+def parse_frame_header(header, offset: int = 0, max_frame_size: int = DEFAULT_MAX_FRAME_SIZE) -> int:
+    """
+    Valida la cabecera de un paquete AVL y calcula su tamaño total
+
+    Args:
+        header: Buffer que contiene al menos 8 bytes a partir de `offset`
+        offset (int): Posición de la cabecera dentro del buffer
+        max_frame_size (int): Tamaño máximo aceptado para el paquete completo
+
+    Returns:
+        int: Tamaño total del paquete (cabecera + datos + CRC)
+
+    Raises:
+        FrameError: Si el preámbulo no es válido o el largo excede el máximo
+    """
+    preamble, data_length = _HEADER.unpack_from(header, offset)
+    if preamble != AVL_PREAMBLE:
+        raise FrameError(f"Invalid AVL preamble: {preamble.hex()}")
+    frame_size = AVL_HEADER_SIZE + data_length + AVL_CRC_SIZE
+    if data_length == 0 or frame_size > max_frame_size:
+        raise FrameError(f"Invalid AVL data length: {data_length}")
+    return frame_size
+
+
+def verify_frame_crc(frame) -> bool:
+    """
+    Verifica el CRC-16/IBM de un paquete AVL completo sin copiarlo
+
+    El CRC se calcula sobre el campo de datos (desde el codec ID hasta el
+    número final de registros) y viaja en los últimos 4 bytes del paquete.
+
+    Args:
+        frame: Paquete completo (bytes/bytearray/memoryview)
+
+    Returns:
+        bool: True si el CRC coincide
+    """
+    if len(frame) < AVL_HEADER_SIZE + AVL_CRC_SIZE:
+        return False
+    expected = _CRC.unpack_from(frame, len(frame) - AVL_CRC_SIZE)[0]
+    return crc16_ibm(frame, AVL_HEADER_SIZE, len(frame) - AVL_CRC_SIZE) == expected
+
+
+def pack_command(command: str) -> bytes:
+    """
+    Construye un paquete Codec 12 con un comando GPRS para el dispositivo
+
+    Args:
+        command (str): Texto del comando (por ejemplo 'getinfo')
+
+    Returns:
+        bytes: Paquete completo con preámbulo, largo y CRC
+    """
+    text = command.encode('ascii')
+    data = _COMMAND_HEADER.pack(CODEC_12, 1, COMMAND_TYPE, len(text)) + text + b'\x01'
+    return AVL_PREAMBLE + _ACK.pack(len(data)) + data + _CRC.pack(crc16_ibm(data))
+
+
+class AVLFrameReader:
+    """
+    Reensambla paquetes AVL a partir de lecturas TCP arbitrarias.
+
+    Un `recv` puede traer medio paquete o varios paquetes juntos; `feed`
+    acumula los bytes y devuelve sólo paquetes completos, usando el
+    preámbulo y el largo del campo de datos para delimitarlos.
+    """
+
+    def __init__(self, max_frame_size: int = DEFAULT_MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Agrega datos recibidos y extrae los paquetes completos
+
+        Args:
+            data (bytes): Bytes leídos del socket
+
+        Returns:
+            List[bytes]: Paquetes AVL completos, en orden de llegada
+
+        Raises:
+            FrameError: Si el flujo contiene una cabecera inválida
+        """
+        self.buffer += data
+        frames = []
+        offset = 0
+        available = len(self.buffer)
+
+        while available - offset >= AVL_HEADER_SIZE:
+            frame_size = parse_frame_header(self.buffer, offset, self.max_frame_size)
+            if available - offset < frame_size:
+                break
+            frames.append(bytes(self.buffer[offset:offset + frame_size]))
+            offset += frame_size
+
+        if offset:
+            del self.buffer[:offset]
+        return frames
+
+    @property
+    def pending(self) -> int:
+        """Bytes recibidos que aún no forman un paquete completo"""
+        return len(self.buffer)
+
+    def reset(self):
+        """Descarta los bytes pendientes"""
+        self.buffer.clear()
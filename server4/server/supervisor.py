@@ -0,0 +1,222 @@
+import os
+import time
+import socket
+import logging
+import threading
+import multiprocessing
+from multiprocessing.connection import Connection, wait
+from typing import Dict, Optional
+from utils.metrics import Metrics
+from config.config import Config
+
+
+def run_worker(worker_id: int, conn, stats_interval: float):
+    """
+    Proceso de ingesta: levanta su propio servidor GPS (decodificación, cola
+    de escritura y caché propias) sobre el puerto compartido con SO_REUSEPORT
+    y reporta sus métricas al supervisor por `conn` cada `stats_interval`
+    segundos, hasta recibir la orden de parar o que el supervisor cierre el pipe
+    """
+    from .gps_server import GPSServerInstance
+
+    Config.SERVER_CONFIG['processes'] = 1  # Un worker no vuelve a supervisar
+    Config.setup_logging()
+    server = GPSServerInstance.get_instance()
+    server.shard_port = True
+    if not server.start():
+        logging.error(f"Ingest worker {worker_id} failed to start")
+        raise SystemExit(1)
+
+    logging.info(f"Ingest worker {worker_id} (pid {os.getpid()}) listening on port {server.port}")
+    try:
+        # Un pipe (no un Event compartido): si un worker muere con SIGKILL no deja
+        # locks tomados, y el EOF avisa a los workers si el supervisor muere
+        while not conn.poll(stats_interval):
+            conn.send((worker_id, os.getpid(), Metrics.snapshot()))
+    except (OSError, EOFError):
+        logging.warning(f"Ingest worker {worker_id} lost its supervisor, exiting")
+    finally:
+        server.cleanup()
+        try:
+            conn.send((worker_id, os.getpid(), Metrics.snapshot()))
+        except (OSError, EOFError):
+            pass
+
+
+class IngestSupervisor:
+    """
+    Ingesta multiproceso: `processes` workers escuchan en el mismo puerto con
+    SO_REUSEPORT y el kernel reparte las conexiones entre ellos, así la
+    decodificación escala con los núcleos en lugar de quedar atada al GIL
+    de un solo proceso.
+
+    Tiene la misma interfaz que GPSServer (start/cleanup/is_running). Un
+    thread monitor junta las métricas de cada worker y reinicia los que
+    mueren; si un worker muere apenas iniciado, los reinicios se espacian
+    (backoff exponencial) para no entrar en un ciclo de fork continuo.
+    """
+
+    STARTUP_GRACE = 10.0  # segundos tras los que un worker se considera estable
+    MAX_BACKOFF = 30.0
+
+    def __init__(self, processes: Optional[int] = None, stats_interval: Optional[float] = None):
+        self.config = Config.get_server_config()
+        self.host = '0.0.0.0'
+        self.port = int(self.config['port'])
+        self.processes = processes or self.config['processes']
+        self.stats_interval = stats_interval or self.config['stats_interval']
+        self.is_running = False
+        # spawn: los workers no heredan threads ni locks del proceso principal
+        self._context = multiprocessing.get_context('spawn')
+        self.workers: Dict[int, multiprocessing.Process] = {}
+        self._conns: Dict[int, Connection] = {}
+        self._started_at: Dict[int, float] = {}
+        self._failures: Dict[int, int] = {}
+        self._restart_at: Dict[int, float] = {}
+        self.restarts: Dict[int, int] = {}
+        self._stats: Dict[int, dict] = {}
+        # Contadores de workers ya reiniciados, para que los totales no retrocedan
+        self._retired_counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.monitor_thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Lanza los workers y el monitor"""
+        if self.is_running:
+            logging.warning("Ingest supervisor is already running")
+            return True
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            logging.error("SO_REUSEPORT is not available on this platform; use SERVER_PROCESSES=1")
+            return False
+        if Config.MESSAGE_BUS_CONFIG['backend'] == 'inprocess':
+            logging.warning("Ingest workers run in separate processes; real-time updates need MESSAGE_BUS_BACKEND=redis")
+
+        self.is_running = True
+        for worker_id in range(self.processes):
+            self._spawn(worker_id)
+        self.monitor_thread = threading.Thread(target=self._monitor, name="IngestSupervisor", daemon=True)
+        self.monitor_thread.start()
+        logging.info(f"Ingest supervisor started {self.processes} workers on {self.host}:{self.port}")
+        return True
+
+    def _spawn(self, worker_id: int):
+        conn, worker_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=run_worker,
+            args=(worker_id, worker_conn, self.stats_interval),
+            name=f"GPSIngestWorker-{worker_id}"
+        )
+        process.start()
+        worker_conn.close()
+        with self._lock:
+            old_conn = self._conns.get(worker_id)
+            if old_conn is not None:
+                old_conn.close()
+            self.workers[worker_id] = process
+            self._conns[worker_id] = conn
+            self._started_at[worker_id] = time.monotonic()
+        Metrics.set_gauge('supervisor.workers_alive', self._alive_count())
+
+    def _monitor(self):
+        while self.is_running:
+            self._collect_stats(timeout=0.5)
+            now = time.monotonic()
+            for worker_id, process in list(self.workers.items()):
+                if not self.is_running:
+                    break
+                if process.is_alive():
+                    if now - self._started_at[worker_id] >= self.STARTUP_GRACE:
+                        self._failures[worker_id] = 0
+                    continue
+                restart_at = self._restart_at.get(worker_id)
+                if restart_at is None:
+                    self._on_worker_exit(worker_id, process, now)
+                elif now >= restart_at:
+                    del self._restart_at[worker_id]
+                    self._spawn(worker_id)
+
+    def _on_worker_exit(self, worker_id: int, process, now: float):
+        """Programa el reinicio de un worker que terminó"""
+        process.join(timeout=0)
+        uptime = now - self._started_at[worker_id]
+        failures = self._failures.get(worker_id, 0) + 1 if uptime < self.STARTUP_GRACE else 0
+        self._failures[worker_id] = failures
+        delay = min(2 ** (failures - 1), self.MAX_BACKOFF) if failures else 0.0
+        logging.warning(f"Ingest worker {worker_id} (pid {process.pid}) exited with code {process.exitcode} "
+                        f"after {uptime:.1f}s; restarting in {delay:.0f}s")
+        with self._lock:
+            self.restarts[worker_id] = self.restarts.get(worker_id, 0) + 1
+            stats = self._stats.pop(worker_id, None)
+            if stats:
+                for name, value in stats['metrics'].get('counters', {}).items():
+                    self._retired_counters[name] = self._retired_counters.get(name, 0) + value
+        self._restart_at[worker_id] = now + delay
+        Metrics.increment('supervisor.restarts')
+        Metrics.set_gauge('supervisor.workers_alive', self._alive_count())
+
+    def _collect_stats(self, timeout: float):
+        with self._lock:
+            conns = {conn: worker_id for worker_id, conn in self._conns.items() if not conn.closed}
+        if not conns:
+            time.sleep(timeout)
+            return
+        for conn in wait(list(conns), timeout):
+            worker_id = conns[conn]
+            try:
+                while conn.poll():
+                    _, pid, snapshot = conn.recv()
+                    with self._lock:
+                        # Ignorar reportes tardíos de un proceso ya reemplazado
+                        if self.workers[worker_id].pid == pid:
+                            self._stats[worker_id] = {'pid': pid, 'metrics': snapshot, 'reported_at': time.time()}
+            except (OSError, EOFError):
+                # El worker terminó; el monitor lo reinicia
+                with self._lock:
+                    if self._conns.get(worker_id) is conn:
+                        conn.close()
+
+    def _alive_count(self) -> int:
+        return sum(1 for process in self.workers.values() if process.is_alive())
+
+    def stats(self) -> dict:
+        """Métricas de cada worker y contadores sumados de todos (incluidos los reiniciados)"""
+        with self._lock:
+            totals = dict(self._retired_counters)
+            workers = []
+            for worker_id, process in sorted(self.workers.items()):
+                stats = self._stats.get(worker_id, {})
+                metrics = stats.get('metrics') or {}
+                for name, value in metrics.get('counters', {}).items():
+                    totals[name] = totals.get(name, 0) + value
+                workers.append({
+                    'worker_id': worker_id,
+                    'pid': process.pid,
+                    'alive': process.is_alive(),
+                    'restarts': self.restarts.get(worker_id, 0),
+                    'reported_at': stats.get('reported_at'),
+                    'metrics': metrics,
+                })
+        return {'processes': self.processes, 'workers': workers, 'counters': totals}
+
+    def cleanup(self):
+        """Detiene los workers (esperando que cierren sus conexiones) y el monitor"""
+        self.is_running = False
+        for conn in self._conns.values():
+            try:
+                conn.send('stop')
+            except (OSError, EOFError):
+                pass
+        deadline = time.monotonic() + 10
+        for process in self.workers.values():
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+        for worker_id, process in self.workers.items():
+            if process.is_alive():
+                logging.warning(f"Ingest worker {worker_id} did not stop, terminating")
+                process.terminate()
+                process.join(timeout=2)
+        if self.monitor_thread:
+            self.monitor_thread.join(timeout=2)
+        for conn in self._conns.values():
+            conn.close()
+        Metrics.set_gauge('supervisor.workers_alive', 0)
+        logging.info("Ingest supervisor shut down cleanly")
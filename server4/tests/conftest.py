@@ -0,0 +1,26 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Los módulos de server4 se importan desde la raíz del paquete, como en main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Database sobre un archivo SQLite temporal, sin particiones ni archivo frío"""
+    from config.config import Config
+    from data.database import Database
+
+    monkeypatch.setitem(Config.DB_CONFIG, 'sqlite', dict(Config.DB_CONFIG['sqlite'], path=str(tmp_path / 'gps.db'),
+                                                         partitioned=False))
+    monkeypatch.setitem(Config.ARCHIVE_CONFIG, 'enabled', False)
+    monkeypatch.setattr(Database, '_local', threading.local())
+    monkeypatch.setattr(Database, '_schema_ready', False)
+    monkeypatch.setattr(Database, '_unmigrated', None)
+    yield Database
+    connection = getattr(Database._local, 'connection', None)
+    if connection is not None:
+        connection.close()
@@ -0,0 +1,122 @@
+"""
+Decodificador AVL contra paquetes capturados de cada codec (Codec 8, 8E, 16 y 12).
+
+Uso:
+    python -m pytest tests
+"""
+import struct
+
+import pytest
+
+from benchmarks.packets import CAPTURED_PACKETS, build_codec8_packet
+from server.decode_pool import decode_packet
+from server.protocol import pack_command, verify_frame_crc
+from utils.crc import crc16_ibm
+from utils.decoder import Decoder
+
+IMEI = '356307042441013'
+
+
+def _flatten(record: dict) -> dict:
+    """Campos del registro y sus elementos IO en un solo nivel, como los valores esperados"""
+    return dict(record, **record.get('I/O Data', {}))
+
+
+def _with_codec(packet: bytes, codec_id: int) -> bytes:
+    """Mismo paquete con otro codec ID y el CRC recalculado"""
+    body = bytes([codec_id]) + packet[9:-4]
+    return packet[:8] + body + struct.pack('>L', crc16_ibm(body))
+
+
+@pytest.mark.parametrize('name, packet_hex, codec_id, num_records, expected', CAPTURED_PACKETS,
+                         ids=[packet[0] for packet in CAPTURED_PACKETS])
+def test_captured_packet(name, packet_hex, codec_id, num_records, expected):
+    decoder = Decoder(bytes.fromhex(packet_hex), IMEI)
+    records = decoder.decode_data()
+
+    assert decoder.codec.codec_id == codec_id
+    assert len(records) == num_records
+    first = decoder.responses[0] if decoder.is_command else records[0]
+    flat = _flatten(first)
+    for key, value in expected.items():
+        assert flat[key] == value, key
+
+
+@pytest.mark.parametrize('name, packet_hex, codec_id, num_records, expected', CAPTURED_PACKETS,
+                         ids=[packet[0] for packet in CAPTURED_PACKETS])
+def test_decode_packet(name, packet_hex, codec_id, num_records, expected):
+    decoded = decode_packet(IMEI, bytes.fromhex(packet_hex))
+
+    assert decoded.crc_ok
+    assert len(decoded.records) == num_records
+    # Sólo Codec 12 trae respuestas y no lleva ACK de registros
+    assert decoded.is_command == (codec_id == 0x0C)
+    assert len(decoded.responses) == (1 if codec_id == 0x0C else 0)
+    for record in decoded.records:
+        assert record['IMEI'] == IMEI
+        assert set(record['Location']) == {'Longitude', 'Latitude', 'Altitude', 'Angle', 'Satellites', 'Speed'}
+
+
+def test_codec12_response():
+    name, packet_hex, *_ = next(packet for packet in CAPTURED_PACKETS if packet[2] == 0x0C)
+    decoder = Decoder(bytes.fromhex(packet_hex), IMEI)
+
+    assert decoder.decode_data() == []
+    assert decoder.is_command
+    assert decoder.responses == [{
+        'IMEI': IMEI,
+        'Type': 'response',
+        'Message': 'DI1:1 DI2:0 DI3:0 AIN1:0 AIN2:16924 DO1:0 DO2:1',
+    }]
+
+
+def test_codec12_command_round_trip():
+    packet = pack_command('getinfo')
+    assert verify_frame_crc(packet)
+
+    decoder = Decoder(packet, IMEI)
+    assert decoder.decode_data() == []
+    assert decoder.responses == [{'IMEI': IMEI, 'Type': 'command', 'Message': 'getinfo'}]
+
+
+def test_synthetic_codec8_packet():
+    packet = build_codec8_packet(25, seed=3)
+    decoded = decode_packet(IMEI, packet)
+
+    assert decoded.crc_ok
+    assert len(decoded.records) == 25
+    # Los 10 elementos IO de cada tamaño (4 + 3 + 2 + 1) y el Event IO ID
+    assert all(len(record['I/O Data']) == 11 for record in decoded.records)
+    assert [record['DateTime'] for record in decoded.records] == sorted(record['DateTime'] for record in decoded.records)
+
+
+@pytest.mark.parametrize('name, packet_hex', [packet[:2] for packet in CAPTURED_PACKETS],
+                         ids=[packet[0] for packet in CAPTURED_PACKETS])
+def test_crc_mismatch(name, packet_hex):
+    packet = bytearray.fromhex(packet_hex)
+    packet[-1] ^= 0xFF
+
+    assert not verify_frame_crc(packet)
+    decoded = decode_packet(IMEI, bytes(packet))
+    assert not decoded.crc_ok
+    assert decoded.records == [] and decoded.responses == []
+
+
+def test_corrupted_payload_fails_crc():
+    packet = bytearray.fromhex(CAPTURED_PACKETS[0][1])
+    packet[20] ^= 0x01
+
+    assert not decode_packet(IMEI, bytes(packet)).crc_ok
+
+
+def test_unsupported_codec():
+    packet = _with_codec(bytes.fromhex(CAPTURED_PACKETS[0][1]), 0x99)
+    assert verify_frame_crc(packet)
+
+    decoder = Decoder(packet, IMEI)
+    assert decoder.decode_data() == []
+    assert decoder.codec is None
+    assert not decoder.is_command
+
+    decoded = decode_packet(IMEI, packet)
+    assert decoded.crc_ok and decoded.records == [] and not decoded.is_command
@@ -0,0 +1,189 @@
+"""
+InProcessBus y RedisBus (con un cliente falso en lugar de Redis).
+
+Uso:
+    python -m pytest tests
+"""
+import fnmatch
+import queue
+import threading
+import time
+
+import pytest
+
+from utils.message_bus import InProcessBus, RedisBus
+
+TIMEOUT = 2.0
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.patterns = []
+        self.messages = queue.Queue()
+        self.fail_reads = 0
+
+    def psubscribe(self, pattern):
+        with self.server.lock:
+            self.patterns.append(pattern)
+            self.server.subscriptions.append(self)
+
+    def get_message(self, timeout=0.0):
+        if self.fail_reads:
+            self.fail_reads -= 1
+            raise ConnectionError("Connection reset by peer")
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.server.lock:
+            if self in self.server.subscriptions:
+                self.server.subscriptions.remove(self)
+
+
+class FakeRedis:
+    """Lo mínimo de redis.Redis que usa RedisBus, compartido entre buses como un servidor"""
+
+    def __init__(self, fail_first_reads=0):
+        self.lock = threading.Lock()
+        self.subscriptions = []
+        self.pubsubs = []
+        self.fail_first_reads = fail_first_reads
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub(self)
+        if not self.pubsubs:
+            pubsub.fail_reads = self.fail_first_reads
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+    def publish(self, channel, data):
+        with self.lock:
+            receivers = [pubsub for pubsub in self.subscriptions
+                         if any(fnmatch.fnmatchcase(channel, pattern) for pattern in pubsub.patterns)]
+        for pubsub in receivers:
+            pubsub.messages.put({'type': 'pmessage', 'channel': channel.encode(), 'data': data.encode()})
+        return len(receivers)
+
+
+class Collector:
+    """Handler que guarda los mensajes y permite esperar a que lleguen"""
+
+    def __init__(self):
+        self.messages = []
+        self.condition = threading.Condition()
+
+    def __call__(self, message):
+        with self.condition:
+            self.messages.append(message)
+            self.condition.notify_all()
+
+    def wait_for(self, count):
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.messages) >= count, TIMEOUT)
+        return self.messages
+
+
+def _wait_until(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def buses():
+    created = []
+    yield created
+    for bus in created:
+        bus.close()
+
+
+def test_in_process_fan_out(buses):
+    bus = InProcessBus()
+    buses.append(bus)
+    first, second, other = Collector(), Collector(), Collector()
+    bus.subscribe('gps_update', first)
+    bus.subscribe('gps_update', second)
+    bus.subscribe('zone_events', other)
+
+    assert bus.publish('gps_update', {'imei': '1'})
+    assert bus.publish('gps_update', {'imei': '2'})
+
+    assert first.wait_for(2) == [{'imei': '1'}, {'imei': '2'}]
+    assert second.wait_for(2) == [{'imei': '1'}, {'imei': '2'}]
+    assert other.messages == []
+
+
+def test_in_process_drops_when_full(buses):
+    bus = InProcessBus(max_size=1)
+    buses.append(bus)
+    delivering, release = threading.Event(), threading.Event()
+    received = Collector()
+
+    def slow_handler(message):
+        delivering.set()
+        release.wait(TIMEOUT)
+        received(message)
+
+    bus.subscribe('gps_update', slow_handler)
+    assert bus.publish('gps_update', 1)
+    assert delivering.wait(TIMEOUT)
+    assert bus.publish('gps_update', 2)      # En la cola
+    assert not bus.publish('gps_update', 3)  # Cola llena: se descarta
+    release.set()
+
+    assert received.wait_for(2) == [1, 2]
+    time.sleep(0.05)
+    assert received.messages == [1, 2]
+
+
+def test_redis_fan_out_to_listening_workers(buses):
+    server = FakeRedis()
+    ingest = RedisBus(client=server)
+    workers = [RedisBus(client=server), RedisBus(client=server)]
+    buses.extend([ingest] + workers)
+    collectors = []
+    for worker in workers:
+        collector = Collector()
+        worker.subscribe('gps_update', collector)
+        worker.listen()
+        collectors.append(collector)
+    _wait_until(lambda: len(server.subscriptions) == 2)
+
+    assert ingest.publish('gps_update', {'imei': '1', 'data': {'Speed': 40}})
+
+    for collector in collectors:
+        assert collector.wait_for(1) == [{'imei': '1', 'data': {'Speed': 40}}]
+
+
+def test_redis_subscribe_without_listen_does_not_consume(buses):
+    # El proceso principal de gunicorn con preload_app: importa la API (subscribe) pero no escucha
+    server = FakeRedis()
+    master = RedisBus(client=server)
+    buses.append(master)
+    collector = Collector()
+    master.subscribe('gps_update', collector)
+
+    assert master.publish('gps_update', {'imei': '1'})
+    time.sleep(0.1)
+    assert server.pubsubs == []
+    assert collector.messages == []
+
+
+def test_redis_listener_resubscribes_after_connection_error(buses, monkeypatch):
+    monkeypatch.setattr(RedisBus, 'retry_delay', 0.01)
+    server = FakeRedis(fail_first_reads=1)
+    ingest, worker = RedisBus(client=server), RedisBus(client=server)
+    buses.extend([ingest, worker])
+    collector = Collector()
+    worker.subscribe('zone_events', collector)
+    worker.listen()
+    _wait_until(lambda: len(server.pubsubs) == 2 and len(server.subscriptions) == 1)
+
+    assert ingest.publish('zone_events', [{'type': 'zone_enter', 'zone_id': 7}])
+
+    assert collector.wait_for(1) == [[{'type': 'zone_enter', 'zone_id': 7}]]
+    assert server.subscriptions == [server.pubsubs[1]]
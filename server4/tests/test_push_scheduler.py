@@ -0,0 +1,171 @@
+"""
+PushScheduler con ticks manuales y un emisor falso.
+
+Uso:
+    python -m pytest tests
+"""
+import pytest
+
+from api.push_scheduler import PushScheduler
+
+
+class FakeSocketIO:
+    """Rooms, clientes y colas de socket simulados; guarda cada emit"""
+
+    def __init__(self):
+        self.rooms = {}      # room -> sids
+        self.backlogs = {}   # sid -> paquetes sin enviar
+        self.emitted = []
+
+    def join(self, sid, *rooms):
+        self.backlogs.setdefault(sid, 0)
+        for room in (sid,) + rooms:
+            self.rooms.setdefault(room, set()).add(sid)
+
+    def disconnect(self, sid):
+        for sids in self.rooms.values():
+            sids.discard(sid)
+        del self.backlogs[sid]
+
+    def participants(self, room):
+        return [(sid, f"eio-{sid}") for sid in sorted(self.rooms.get(room, ()))]
+
+    def backlog(self, eio_sid):
+        return self.backlogs.get(eio_sid[len('eio-'):])
+
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data, to))
+
+    def received(self, sid):
+        """Mensajes que recibió un cliente (directo o en una lista de sids)"""
+        return [data for _, data, to in self.emitted if to == sid or (isinstance(to, list) and sid in to)]
+
+
+ROOMS = {
+    'A': ['imei:A', 'empresa:1'],
+    'B': ['imei:B', 'empresa:1', 'usuario:7'],
+    'C': ['imei:C', 'empresa:2'],
+}
+
+
+@pytest.fixture
+def sio():
+    return FakeSocketIO()
+
+
+@pytest.fixture
+def scheduler(sio):
+    return PushScheduler(sio.emit, ROOMS.get, participants=sio.participants, backlog=sio.backlog, max_backlog=10)
+
+
+def _update(imei, n):
+    return {'imei': imei, 'data': {'n': n}}
+
+
+def test_coalesces_updates_between_ticks(sio, scheduler):
+    sio.join('s1', 'imei:A')
+    for n in range(5):
+        scheduler.push('A', _update('A', n))
+
+    assert scheduler.tick() == 1
+    assert sio.received('s1') == [[_update('A', 4)]]
+    assert scheduler.tick() == 0
+
+
+def test_one_message_per_client_without_duplicates(sio, scheduler):
+    # s1 recibe B por tres rooms y A por uno: un solo mensaje con una entrada por IMEI
+    sio.join('s1', 'imei:B', 'empresa:1', 'usuario:7')
+    sio.join('s2', 'empresa:2')
+    scheduler.push('A', _update('A', 1))
+    scheduler.push('B', _update('B', 1))
+    scheduler.push('C', _update('C', 1))
+
+    assert scheduler.tick() == 2
+    [message] = sio.received('s1')
+    assert sorted(update['imei'] for update in message) == ['A', 'B']
+    assert sio.received('s2') == [[_update('C', 1)]]
+
+
+def test_clients_with_same_updates_share_one_emit(sio, scheduler):
+    sio.join('s1', 'empresa:1')
+    sio.join('s2', 'imei:A', 'imei:B')
+    sio.join('s3', 'imei:A')
+    scheduler.push('A', _update('A', 1))
+    scheduler.push('B', _update('B', 1))
+
+    assert scheduler.tick() == 2
+    targets = sorted(sorted(to) for _, _, to in sio.emitted)
+    assert targets == [['s1', 's2'], ['s3']]
+
+
+def test_slow_client_held_then_released_with_latest(sio, scheduler):
+    sio.join('fast', 'imei:A')
+    sio.join('slow', 'imei:A', 'imei:C')
+    sio.backlogs['slow'] = 11
+
+    scheduler.push('A', _update('A', 1))
+    scheduler.push('C', _update('C', 1))
+    scheduler.tick()
+    scheduler.push('A', _update('A', 2))
+    scheduler.tick()
+    assert sio.received('fast') == [[_update('A', 1)], [_update('A', 2)]]
+    assert sio.received('slow') == []
+
+    # Vació su cola: sólo la última posición de cada IMEI, en un mensaje
+    sio.backlogs['slow'] = 0
+    assert scheduler.tick() == 1
+    [message] = sio.received('slow')
+    assert sorted(message, key=lambda update: update['imei']) == [_update('A', 2), _update('C', 1)]
+    assert scheduler.tick() == 0
+
+
+def test_released_client_gets_held_and_new_in_one_message(sio, scheduler):
+    sio.join('slow', 'imei:A', 'imei:C')
+    sio.backlogs['slow'] = 11
+    scheduler.push('A', _update('A', 1))
+    scheduler.push('C', _update('C', 1))
+    scheduler.tick()
+
+    sio.backlogs['slow'] = 0
+    scheduler.push('A', _update('A', 2))
+    assert scheduler.tick() == 1
+    [message] = sio.received('slow')
+    assert sorted(message, key=lambda update: update['imei']) == [_update('A', 2), _update('C', 1)]
+
+
+def test_released_clients_with_different_held_updates_get_their_own(sio, scheduler):
+    sio.join('s1', 'imei:A')
+    sio.join('s2', 'imei:A')
+    sio.backlogs['s1'] = 11
+    scheduler.push('A', _update('A', 1))
+    scheduler.tick()
+    sio.backlogs['s2'] = 11
+    scheduler.push('A', _update('A', 2))
+    scheduler.tick()
+
+    sio.backlogs['s1'] = sio.backlogs['s2'] = 0
+    assert scheduler.tick() == 1
+    assert sio.received('s1') == [[_update('A', 2)]]
+    assert sio.received('s2') == [[_update('A', 1)], [_update('A', 2)]]
+
+
+def test_disconnected_slow_client_is_forgotten(sio, scheduler):
+    sio.join('slow', 'imei:A')
+    sio.backlogs['slow'] = 11
+    scheduler.push('A', _update('A', 1))
+    scheduler.tick()
+    assert scheduler._held
+
+    sio.disconnect('slow')
+    assert scheduler.tick() == 0
+    assert scheduler._held == {}
+
+
+def test_emits_per_room_without_participants(sio):
+    scheduler = PushScheduler(sio.emit, ROOMS.get)
+    scheduler.push('A', _update('A', 1))
+    scheduler.push('B', _update('B', 1))
+
+    assert scheduler.tick() == 4
+    assert ('gps_updates', [_update('A', 1), _update('B', 1)], 'empresa:1') in sio.emitted
+    assert ('gps_updates', [_update('B', 1)], 'usuario:7') in sio.emitted
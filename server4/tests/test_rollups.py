@@ -0,0 +1,73 @@
+"""
+Reconstrucción de resúmenes con ingesta concurrente y resúmenes desactivados por un tiempo.
+
+Uso:
+    python -m pytest tests
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import data.database
+from config.config import Config
+from data.rollups import RollupAccumulator
+
+IMEI = '356307042441013'
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _records(first: int, count: int) -> list:
+    return [{'DateTime': (START + timedelta(seconds=30 * i)).isoformat(),
+             'Location': {'Latitude': -0.1 + i / 10000, 'Longitude': -78.0, 'Altitude': 2800,
+                          'Angle': 0, 'Satellites': 9, 'Speed': 40}}
+            for i in range(first, first + count)]
+
+
+def _ingest(database, records):
+    """Inserta desde otro thread (otra conexión), como un writer de la ingesta"""
+    thread = threading.Thread(target=database.insert_gps_data_batch, args=([(IMEI, records)],))
+    thread.start()
+    thread.join()
+
+
+@pytest.fixture
+def rollups(database, monkeypatch):
+    monkeypatch.setitem(Config.ROLLUP_CONFIG, 'enabled', True)
+    return database
+
+
+def test_rebuild_counts_rows_ingested_during_the_scan(rollups, monkeypatch):
+    rollups.insert_gps_data_batch([(IMEI, _records(0, 100))])
+
+    class IngestDuringScan(RollupAccumulator):
+        def add_rows(self, rows):
+            rows = list(rows)
+            if rows and rows[0][1] == _records(0, 1)[0]['DateTime']:
+                _ingest(rollups, _records(100, 20))
+            super().add_rows(rows)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(data.database, 'RollupAccumulator', IngestDuringScan)
+        assert rollups.rebuild_rollups(IMEI) == 120
+    with_ingest = rollups.get_gps_summary(IMEI)
+
+    # Una reconstrucción sin ingesta concurrente da los mismos resúmenes
+    assert rollups.rebuild_rollups(IMEI) == 120
+    assert rollups.get_gps_summary(IMEI) == with_ingest
+    assert with_ingest['total_records'] == 120
+
+
+def test_rows_ingested_while_disabled_mark_device_pending(rollups, monkeypatch):
+    rollups.insert_gps_data_batch([(IMEI, _records(0, 10))])
+    assert rollups.get_rollups_pending() == []
+
+    monkeypatch.setitem(Config.ROLLUP_CONFIG, 'enabled', False)
+    rollups.insert_gps_data_batch([(IMEI, _records(10, 5))])
+    monkeypatch.setitem(Config.ROLLUP_CONFIG, 'enabled', True)
+
+    assert rollups.get_rollups_pending() == [IMEI]
+    assert rollups.get_gps_summary(IMEI)['total_records'] == 15
+    assert rollups.rebuild_rollups(IMEI) == 15
+    assert rollups.get_rollups_pending() == []
+    assert rollups.get_gps_summary(IMEI)['total_records'] == 15
@@ -0,0 +1,134 @@
+"""
+R-tree del índice de zonas contra una búsqueda lineal.
+
+Uso:
+    python -m pytest tests
+"""
+import random
+
+import pytest
+
+from utils.rtree import RTree
+
+
+def _random_bbox(rng, size=5.0):
+    x, y = rng.uniform(-100, 100), rng.uniform(-100, 100)
+    return (x, y, x + rng.uniform(0, size), y + rng.uniform(0, size))
+
+
+def _brute_search(items, bbox):
+    return sorted(value for item_bbox, value in items
+                  if item_bbox[0] <= bbox[2] and bbox[0] <= item_bbox[2]
+                  and item_bbox[1] <= bbox[3] and bbox[1] <= item_bbox[3])
+
+
+def _brute_point(items, x, y):
+    return sorted(value for bbox, value in items if bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3])
+
+
+def _check_structure(tree):
+    """Bbox de cada nodo = unión de sus entradas, tamaños dentro del máximo y hojas a la misma altura"""
+    leaf_depths = set()
+
+    def visit(node, depth, is_root):
+        assert len(node.entries) <= tree.max_entries
+        if not is_root:
+            assert node.entries
+        if node.entries:
+            bboxes = [entry[0] for entry in node.entries]
+            assert node.bbox == (min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+                                 max(b[2] for b in bboxes), max(b[3] for b in bboxes))
+        if node.leaf:
+            leaf_depths.add(depth)
+            return len(node.entries)
+        count = 0
+        for bbox, child in node.entries:
+            assert bbox == child.bbox
+            count += visit(child, depth + 1, False)
+        return count
+
+    assert visit(tree.root, 1, True) == len(tree)
+    assert len(leaf_depths) <= 1
+
+
+def _check_queries(tree, items, rng, queries=200):
+    for _ in range(queries):
+        bbox = _random_bbox(rng, size=rng.choice([0.0, 5.0, 40.0]))
+        assert sorted(tree.search(bbox)) == _brute_search(items, bbox)
+        x, y = rng.uniform(-105, 105), rng.uniform(-105, 105)
+        assert sorted(tree.search_point(x, y)) == _brute_point(items, x, y)
+
+
+@pytest.mark.parametrize('count, max_entries', [(0, 16), (1, 16), (15, 4), (500, 4), (2000, 16)])
+def test_bulk_load_matches_brute_force(count, max_entries):
+    rng = random.Random(count)
+    items = [(_random_bbox(rng), i) for i in range(count)]
+    tree = RTree.bulk_load(items, max_entries=max_entries)
+
+    assert len(tree) == count
+    _check_structure(tree)
+    _check_queries(tree, items, rng)
+
+
+@pytest.mark.parametrize('max_entries', [4, 16])
+def test_insert_matches_brute_force(max_entries):
+    rng = random.Random(max_entries)
+    tree, items = RTree(max_entries), []
+    for i in range(800):
+        item = (_random_bbox(rng), i)
+        tree.insert(*item)
+        items.append(item)
+        if i % 100 == 0:
+            _check_structure(tree)
+            _check_queries(tree, items, rng, queries=20)
+    _check_structure(tree)
+    _check_queries(tree, items, rng)
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_delete_matches_brute_force(bulk):
+    rng = random.Random(7)
+    items = [(_random_bbox(rng), i) for i in range(600)]
+    if bulk:
+        tree = RTree.bulk_load(items, max_entries=6)
+    else:
+        tree = RTree(6)
+        for item in items:
+            tree.insert(*item)
+
+    rng.shuffle(items)
+    removed, items = items[:450], items[450:]
+    for bbox, value in removed:
+        assert tree.delete(bbox, value)
+    assert not tree.delete(*removed[0])
+    assert not tree.delete(items[0][0], -1)
+
+    assert len(tree) == len(items)
+    _check_structure(tree)
+    _check_queries(tree, items, rng)
+
+    for bbox, value in items:
+        assert tree.delete(bbox, value)
+    assert len(tree) == 0
+    assert tree.search((-200, -200, 200, 200)) == []
+
+
+def test_mixed_updates_with_overlapping_zones():
+    # Zonas que cambian en el lugar: delete del bbox viejo e insert del nuevo, con muchos solapamientos
+    rng = random.Random(3)
+    current = {i: _random_bbox(rng, size=60.0) for i in range(300)}
+    tree = RTree.bulk_load([(bbox, i) for i, bbox in current.items()], max_entries=8)
+    for _ in range(1500):
+        i = rng.randrange(400)
+        if i in current and rng.random() < 0.5:
+            assert tree.delete(current.pop(i), i)
+        else:
+            if i in current:
+                assert tree.delete(current[i], i)
+            current[i] = _random_bbox(rng, size=60.0)
+            tree.insert(current[i], i)
+
+    items = [(bbox, i) for i, bbox in current.items()]
+    assert len(tree) == len(items)
+    _check_structure(tree)
+    _check_queries(tree, items, rng)
@@ -0,0 +1,63 @@
+"""
+Suscripciones de Socket.IO limitadas a las asignaciones del usuario del token.
+
+Uso:
+    python -m pytest tests
+"""
+import pytest
+
+from api import api
+from api.rooms import DeviceRoomMap
+
+ASSIGNMENTS = [
+    {'imei': '111', 'usuario_id': 1, 'empresa_id': 10},
+    {'imei': '222', 'usuario_id': 2, 'empresa_id': 20},
+]
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    monkeypatch.setattr(api, 'device_rooms', DeviceRoomMap(lambda: ASSIGNMENTS))
+    clients = []
+
+    def connect(usuario_id=None, **kwargs):
+        if usuario_id is not None:
+            kwargs['auth'] = {'token': api.socket_tokens.dumps({'usuario_id': usuario_id})}
+        client = api.socketio.test_client(api.app, **kwargs)
+        clients.append(client)
+        return client
+
+    yield connect
+    for client in clients:
+        client.disconnect()
+
+
+def test_user_subscribes_to_own_rooms(client_for):
+    client = client_for(1)
+    assert client.emit('subscribe', '111', callback=True) == {'success': True, 'rooms': ['imei:111']}
+    assert client.emit('subscribe', {'empresa_id': 10, 'usuario_id': 1}, callback=True) == \
+        {'success': True, 'rooms': ['empresa:10', 'usuario:1']}
+
+
+@pytest.mark.parametrize('request_data, denied', [
+    ('222', ['imei:222']),
+    ({'empresa_id': 20}, ['empresa:20']),
+    ({'usuario_id': 2}, ['usuario:2']),
+    ({'imei': '111', 'empresa_id': 20}, ['empresa:20']),
+])
+def test_rooms_of_other_users_are_rejected(client_for, request_data, denied):
+    client = client_for(1)
+    assert client.emit('subscribe', request_data, callback=True) == {'success': False, 'error': 'Sin acceso',
+                                                                     'rooms': denied}
+
+
+def test_token_in_query_string(client_for):
+    token = api.socket_tokens.dumps({'usuario_id': 2})
+    client = client_for(query_string=f'token={token}')
+    assert client.emit('subscribe', '222', callback=True)['success']
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'auth': {'token': 'forged'}}, {'query_string': 'token=forged'}])
+def test_unauthenticated_socket_cannot_subscribe(client_for, kwargs):
+    client = client_for(**kwargs)
+    assert client.emit('subscribe', '111', callback=True) == {'success': False, 'error': 'No autenticado'}
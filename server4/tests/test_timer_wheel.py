@@ -0,0 +1,136 @@
+"""
+TimerWheel con un reloj simulado: plazos nunca antes de tiempo y a lo sumo un tick tarde.
+
+Uso:
+    python -m pytest tests
+"""
+import random
+
+import pytest
+
+from utils.timer_wheel import TimerWheel
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _run(wheel, clock, until, step, fired):
+    """Avanza el reloj de a `step` hasta `until` anotando cuándo vence cada key"""
+    while clock.now < until:
+        clock.now += step
+        for key, value in wheel.advance():
+            assert key not in fired, f"{key} fired twice"
+            fired[key] = (clock.now, value)
+
+
+def _assert_on_time(deadlines, fired, tick, step):
+    assert fired.keys() == deadlines.keys()
+    for key, deadline in deadlines.items():
+        fired_at = fired[key][0]
+        assert fired_at >= deadline, f"{key} fired early: {fired_at} < {deadline}"
+        assert fired_at < deadline + tick + step, f"{key} fired late: {fired_at} >= {deadline} + {tick}"
+
+
+@pytest.mark.parametrize('start, tick, slots, levels', [
+    (0.0, 1.0, 64, 2),
+    (1000.25, 1.0, 4, 3),   # Niveles chicos: cascadas y vueltas frecuentes
+    (7.5, 0.5, 8, 2),
+])
+def test_deadlines_fire_on_time(start, tick, slots, levels):
+    rng = random.Random(slots)
+    clock = FakeClock(start)
+    wheel = TimerWheel(tick=tick, slots=slots, levels=levels, clock=clock)
+    reach = tick * slots ** levels
+    step = tick / 4
+    deadlines, fired = {}, {}
+
+    for batch in range(20):
+        for i in range(25):
+            key = (batch, i)
+            delay = rng.uniform(0, reach - 2 * tick)
+            wheel.schedule(key, delay, value=batch)
+            deadlines[key] = clock.now + delay
+        _run(wheel, clock, clock.now + rng.uniform(0, reach / 4), step, fired)
+    _run(wheel, clock, clock.now + reach, step, fired)
+
+    _assert_on_time(deadlines, fired, tick, step)
+    assert all(value == key[0] for key, (_, value) in fired.items())
+    assert len(wheel) == 0
+
+
+def test_advance_with_explicit_now_and_large_jump():
+    clock = FakeClock(0.0)
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3, clock=clock)
+    for delay in range(1, 60):
+        wheel.schedule(delay, delay)
+
+    assert wheel.advance(0.99) == []
+    assert [key for key, _ in wheel.advance(1.0)] == [1]
+    # Un salto largo cruza varias vueltas de todos los niveles en una llamada
+    assert sorted(key for key, _ in wheel.advance(40.0)) == list(range(2, 41))
+    assert sorted(key for key, _ in wheel.advance(100.0)) == list(range(41, 60))
+
+
+def test_touch_postpones_deadline():
+    clock = FakeClock(0.0)
+    wheel = TimerWheel(tick=1.0, slots=8, levels=2, clock=clock)
+    wheel.schedule('conn', 10)
+    fired = {}
+    _run(wheel, clock, 6.0, 0.25, fired)
+    assert wheel.touch('conn', 10)
+
+    _run(wheel, clock, 15.75, 0.25, fired)
+    assert fired == {}
+    _run(wheel, clock, 20.0, 0.25, fired)
+    _assert_on_time({'conn': 16.0}, fired, 1.0, 0.25)
+
+
+def test_touch_earlier_moves_entry():
+    clock = FakeClock(0.0)
+    wheel = TimerWheel(tick=1.0, slots=8, levels=3, clock=clock)
+    wheel.schedule('conn', 300)
+    clock.now = 2.0
+    assert wheel.touch('conn', 3)
+
+    fired = {}
+    _run(wheel, clock, 10.0, 0.25, fired)
+    _assert_on_time({'conn': 5.0}, fired, 1.0, 0.25)
+
+
+def test_touch_and_cancel_unknown_key():
+    wheel = TimerWheel(clock=FakeClock())
+    assert not wheel.touch('missing', 5)
+    assert not wheel.cancel('missing')
+
+
+def test_cancel_removes_entry():
+    clock = FakeClock(0.0)
+    wheel = TimerWheel(tick=1.0, slots=4, levels=2, clock=clock)
+    wheel.schedule('a', 3)
+    wheel.schedule('b', 3)
+    assert wheel.cancel('a')
+    assert 'a' not in wheel and 'b' in wheel
+
+    fired = {}
+    _run(wheel, clock, 10.0, 0.5, fired)
+    assert list(fired) == ['b']
+
+
+@pytest.mark.parametrize('delay', [16.0, 17.0, 100.0, 1000.5])
+def test_deadline_beyond_last_level_is_clamped_not_early(delay):
+    # Alcance: 4 ** 2 = 16 ticks; más lejos se recorta a la última ranura y se reubica al vencer esta
+    clock = FakeClock(3.0)
+    wheel = TimerWheel(tick=1.0, slots=4, levels=2, clock=clock)
+    wheel.schedule('far', delay)
+    wheel.schedule('near', 2)
+    # Ranura más lejana del último nivel: (tick 3 + 4 * 3) // 4 % 4
+    assert wheel.positions['far'] == (1, 3)
+
+    fired = {}
+    _run(wheel, clock, 3.0 + delay + 2, 0.5, fired)
+    _assert_on_time({'far': 3.0 + delay, 'near': 5.0}, fired, 1.0, 0.5)
@@ -0,0 +1,186 @@
+"""
+WriteBehindQueue y el ACK que decide DataManager.store_records, con un writer falso.
+
+Uso:
+    python -m pytest tests
+"""
+import itertools
+import threading
+import time
+
+import pytest
+
+from data.data_manager import DataManager
+from data.write_queue import PartialWriteError, WriteBehindQueue
+from utils.metrics import Metrics
+
+TIMEOUT = 2.0
+_names = itertools.count()
+
+
+class StubWriter:
+    """Guarda los lotes; puede fallar, guardar sólo los primeros paquetes o esperar un evento"""
+
+    def __init__(self, fail=False, save_packets=None, release=None):
+        self.fail = fail
+        self.save_packets = save_packets
+        self.release = release
+        self.batches = []
+
+    def __call__(self, batch):
+        if self.release is not None:
+            self.release.wait(TIMEOUT)
+        self.batches.append(batch)
+        if self.fail:
+            raise RuntimeError("database is locked")
+        if self.save_packets is not None:
+            saved = batch[:self.save_packets]
+            raise PartialWriteError(len(saved), sum(len(records) for _, records in saved))
+        return sum(len(records) for _, records in batch)
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(writer, start=True, **kwargs):
+        kwargs.setdefault('flush_interval', 0.05)
+        write_queue = WriteBehindQueue(writer, name=f"test_queue_{next(_names)}", **kwargs)
+        if start:
+            write_queue.start()
+        queues.append(write_queue)
+        return write_queue
+
+    yield make
+    for write_queue in queues:
+        write_queue.stop(timeout=TIMEOUT)
+
+
+def _packet(i, records=2):
+    return f"35630704244{i:04d}", [{'n': n} for n in range(records)]
+
+
+def _results(futures):
+    return [future.result(TIMEOUT) for future in futures]
+
+
+def test_batches_and_confirms_after_commit(make_queue):
+    writer = StubWriter()
+    write_queue = make_queue(writer, batch_size=4)
+    futures = [write_queue.submit(*_packet(i)) for i in range(10)]
+
+    assert _results(futures) == [True] * 10
+    assert [packet for batch in writer.batches for packet in batch] == [_packet(i) for i in range(10)]
+    assert all(len(batch) <= 4 for batch in writer.batches)
+    assert Metrics.get(f'{write_queue.name}.rows_written') == 20
+
+
+def test_failed_writer_nacks_whole_batch(make_queue):
+    write_queue = make_queue(StubWriter(fail=True), batch_size=10)
+    futures = [write_queue.submit(*_packet(i)) for i in range(3)]
+
+    assert _results(futures) == [False] * 3
+    assert Metrics.get(f'{write_queue.name}.rows_failed') == 6
+
+
+def test_short_write_nacks_whole_batch(make_queue):
+    write_queue = make_queue(lambda batch: 1, batch_size=10)
+    futures = [write_queue.submit(*_packet(i)) for i in range(3)]
+
+    assert _results(futures) == [False] * 3
+
+
+def test_partial_write_confirms_only_saved_packets(make_queue):
+    # El lote entero se arma antes del primer flush: el writer recibe los 5 paquetes juntos
+    release = threading.Event()
+    writer = StubWriter(save_packets=2, release=release)
+    write_queue = make_queue(writer, batch_size=5, flush_interval=1.0)
+    futures = [write_queue.submit(*_packet(i, records=3)) for i in range(5)]
+    release.set()
+
+    assert _results(futures) == [True, True, False, False, False]
+    assert len(writer.batches) == 1
+    assert Metrics.get(f'{write_queue.name}.rows_written') == 6
+    assert Metrics.get(f'{write_queue.name}.rows_failed') == 9
+
+
+def test_full_queue_drops_packet(make_queue):
+    write_queue = make_queue(StubWriter(), start=False, max_size=2, enqueue_timeout=0.1)
+    assert write_queue.submit(*_packet(0)) is not None
+    assert write_queue.submit(*_packet(1)) is not None
+
+    start = time.monotonic()
+    assert write_queue.submit(*_packet(2), block=False) is None
+    assert time.monotonic() - start < 0.05
+    assert write_queue.submit(*_packet(3)) is None
+    assert time.monotonic() - start >= 0.1
+    assert Metrics.get(f'{write_queue.name}.dropped') == 2
+
+
+def test_stop_flushes_pending_packets(make_queue):
+    writer = StubWriter()
+    write_queue = make_queue(writer, batch_size=100, flush_interval=10.0)
+    futures = [write_queue.submit(*_packet(i)) for i in range(3)]
+    write_queue.stop(timeout=TIMEOUT)
+
+    assert _results(futures) == [True] * 3
+
+
+def test_invalid_ack_mode():
+    with pytest.raises(ValueError):
+        WriteBehindQueue(StubWriter(), ack_mode='never')
+
+
+@pytest.fixture
+def store_with(make_queue, monkeypatch):
+    """DataManager.store_records sobre una cola con el writer dado"""
+    def use(writer, **kwargs):
+        write_queue = make_queue(writer, **kwargs)
+        monkeypatch.setattr(DataManager, 'get_write_queue', classmethod(lambda cls: write_queue))
+        return write_queue
+    return use
+
+
+def test_ack_on_commit_waits_for_the_writer(store_with):
+    release = threading.Event()
+    writer = StubWriter(release=release)
+    store_with(writer, ack_mode=WriteBehindQueue.ACK_ON_COMMIT)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(DataManager.store_records(*_packet(0))))
+    thread.start()
+
+    thread.join(0.2)
+    assert result == []
+    release.set()
+    thread.join(TIMEOUT)
+    assert result == [True]
+
+
+def test_ack_on_commit_nacks_failed_write(store_with):
+    store_with(StubWriter(fail=True), ack_mode=WriteBehindQueue.ACK_ON_COMMIT)
+    assert DataManager.store_records(*_packet(0)) is False
+
+
+def test_ack_on_commit_nacks_after_commit_timeout(store_with):
+    release = threading.Event()
+    store_with(StubWriter(release=release), ack_mode=WriteBehindQueue.ACK_ON_COMMIT, commit_timeout=0.1)
+    try:
+        assert DataManager.store_records(*_packet(0)) is False
+    finally:
+        release.set()
+
+
+def test_ack_on_enqueue_does_not_wait(store_with):
+    release = threading.Event()
+    store_with(StubWriter(fail=True, release=release), ack_mode=WriteBehindQueue.ACK_ON_ENQUEUE)
+    try:
+        assert DataManager.store_records(*_packet(0)) is True
+    finally:
+        release.set()
+
+
+def test_ack_on_enqueue_nacks_when_full(store_with):
+    store_with(StubWriter(), start=False, max_size=1, enqueue_timeout=0.01,
+               ack_mode=WriteBehindQueue.ACK_ON_ENQUEUE)
+    assert DataManager.store_records(*_packet(0)) is True
+    assert DataManager.store_records(*_packet(1)) is False
@@ -0,0 +1,84 @@
+"""
+Eventos de zonas con el índice de DataManager cuando las zonas cambian desde otro proceso.
+
+Uso:
+    python -m pytest tests
+"""
+import json
+import sqlite3
+
+import pytest
+
+from config.config import Config
+from data.data_manager import DataManager
+from utils.zone_transitions import ZONE_ENTER, ZONE_EXIT, ZoneTransitionEngine
+
+IMEI = '356307042441013'
+SQUARE = [[0.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, 0.0]]
+MOVED = [[2.0, 2.0], [2.0, 3.0], [3.0, 3.0], [3.0, 2.0]]
+
+
+@pytest.fixture
+def zones(database, monkeypatch):
+    """Índice de zonas de DataManager sin cargar y revisando la versión en cada consulta"""
+    monkeypatch.setitem(Config.ZONE_INDEX_CONFIG, 'check_interval', 0.0)
+    monkeypatch.setattr(DataManager, '_zone_index', None)
+    monkeypatch.setattr(DataManager, '_zone_index_version', None)
+    monkeypatch.setattr(DataManager, '_zone_index_checked', 0.0)
+    return database
+
+
+def _other_process(database):
+    """Conexión propia al archivo, como la de un worker de la API en otro proceso"""
+    return sqlite3.connect(database.get_connection().execute('PRAGMA database_list').fetchone()[2])
+
+
+def _record(timestamp: str, latitude: float, longitude: float) -> dict:
+    return {'DateTime': timestamp, 'Location': {'Latitude': latitude, 'Longitude': longitude}}
+
+
+def _events(events):
+    return [(event['type'], event['zone_id']) for event in events]
+
+
+def test_zone_edit_from_another_process_changes_transitions(zones):
+    zone_id = zones.insert_zone('Depot', SQUARE, [IMEI])
+    engine = ZoneTransitionEngine(DataManager.find_zones)
+
+    assert _events(engine.process(IMEI, [_record('2025-01-01T00:00:00', 0.5, 0.5)])) == [(ZONE_ENTER, zone_id)]
+    assert engine.process(IMEI, [_record('2025-01-01T00:01:00', 0.6, 0.6)]) == []
+
+    with _other_process(zones) as conn:
+        conn.execute('UPDATE zones SET coordinates = ? WHERE id = ?', (json.dumps(MOVED), zone_id))
+
+    # Misma posición, pero la zona ya no está ahí
+    assert _events(engine.process(IMEI, [_record('2025-01-01T00:02:00', 0.6, 0.6)])) == [(ZONE_EXIT, zone_id)]
+    assert _events(engine.process(IMEI, [_record('2025-01-01T00:03:00', 2.5, 2.5)])) == [(ZONE_ENTER, zone_id)]
+
+
+def test_zone_created_and_deleted_from_another_process(zones):
+    engine = ZoneTransitionEngine(DataManager.find_zones)
+    assert engine.process(IMEI, [_record('2025-01-01T00:00:00', 0.5, 0.5)]) == []
+
+    with _other_process(zones) as conn:
+        zone_id = conn.execute('INSERT INTO zones (name, coordinates) VALUES (?, ?)',
+                               ('Depot', json.dumps(SQUARE))).lastrowid
+        conn.execute('INSERT INTO zone_imei (zone_id, imei) VALUES (?, ?)', (zone_id, IMEI))
+    assert _events(engine.process(IMEI, [_record('2025-01-01T00:01:00', 0.5, 0.5)])) == [(ZONE_ENTER, zone_id)]
+
+    with _other_process(zones) as conn:
+        conn.execute('DELETE FROM zones WHERE id = ?', (zone_id,))
+        conn.execute('DELETE FROM zone_imei WHERE zone_id = ?', (zone_id,))
+    assert _events(engine.process(IMEI, [_record('2025-01-01T00:02:00', 0.5, 0.5)])) == [(ZONE_EXIT, zone_id)]
+
+
+def test_index_not_reloaded_within_check_interval(zones, monkeypatch):
+    monkeypatch.setitem(Config.ZONE_INDEX_CONFIG, 'check_interval', 3600.0)
+    zones.insert_zone('Depot', SQUARE, [IMEI])
+    index = DataManager.get_zone_index()
+
+    with _other_process(zones) as conn:
+        conn.execute('DELETE FROM zone_imei')
+    assert DataManager.get_zone_index() is index
+    monkeypatch.setattr(DataManager, '_zone_index_checked', 0.0)
+    assert DataManager.get_zone_index() is not index
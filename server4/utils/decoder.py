@@ -13,81 +13,179 @@ IO_ID_MAPPING = {
     # Add more mappings as needed
 }
 
+# Estructuras precompiladas (big endian) para leer el paquete sin copiarlo
+_AVL_RECORD = struct.Struct('>QBiiHHBH')  # timestamp, prioridad, lon, lat, altitud, ángulo, satélites, velocidad
+_UINT8 = struct.Struct('>B')
+_UINT16 = struct.Struct('>H')
+_COMMAND_HEADER = struct.Struct('>BL')  # tipo de mensaje, largo del comando/respuesta
+_IO_SIZES = (1, 2, 4, 8)
+
+# Preámbulo (4) + largo de datos (4) preceden al codec ID
+_CODEC_OFFSET = 8
+
+# Registro de codecs: codec ID -> clase que sabe decodificar el campo de datos
+CODECS = {}
+
+
+def register_codec(codec):
+    """Decorador para registrar un codec en `CODECS` por su codec_id"""
+    CODECS[codec.codec_id] = codec
+    return codec
+
+
+class AVLCodec:
+    """
+    Layout de un codec de datos AVL. Los codecs 8, 8E y 16 sólo difieren en el
+    ancho de los IDs y contadores de IO, así que cada uno se describe con sus
+    estructuras y Decoder.parse_io_data las recorre.
+    """
+    codec_id = None
+    name = None
+    io_header = struct.Struct('>BB')  # Event IO ID, total de elementos IO
+    io_count = _UINT8
+    io_elements = {
+        1: struct.Struct('>BB'),
+        2: struct.Struct('>BH'),
+        4: struct.Struct('>BI'),
+        8: struct.Struct('>BQ'),
+    }
+    has_generation_type = False
+    has_variable_length = False
+
+    @staticmethod
+    def decode(decoder):
+        return decoder.parse_avl_records()
+
+
+@register_codec
+class Codec8(AVLCodec):
+    codec_id = 0x08
+    name = 'Codec 8'
+
+
+@register_codec
+class Codec8Extended(AVLCodec):
+    codec_id = 0x8E
+    name = 'Codec 8 Extended'
+    io_header = struct.Struct('>HH')
+    io_count = _UINT16
+    io_elements = {
+        1: struct.Struct('>HB'),
+        2: struct.Struct('>HH'),
+        4: struct.Struct('>HI'),
+        8: struct.Struct('>HQ'),
+    }
+    has_variable_length = True  # elementos NX: ID (2) + largo (2) + valor
+
+
+@register_codec
+class Codec16(AVLCodec):
+    codec_id = 0x10
+    name = 'Codec 16'
+    io_header = struct.Struct('>HBB')  # Event IO ID, Generation type, total
+    io_count = _UINT8
+    io_elements = {
+        1: struct.Struct('>HB'),
+        2: struct.Struct('>HH'),
+        4: struct.Struct('>HI'),
+        8: struct.Struct('>HQ'),
+    }
+    has_generation_type = True
+
+
+@register_codec
+class Codec12:
+    """Comandos GPRS y sus respuestas (no contiene registros AVL)"""
+    codec_id = 0x0C
+    name = 'Codec 12'
+    COMMAND = 0x05
+    RESPONSE = 0x06
+
+    @staticmethod
+    def decode(decoder):
+        decoder.parse_command_messages()
+        return []
+
+
 class Decoder:
     def __init__(self, payload, imei):
-        self.payload = payload
+        """
+        Args:
+            payload: Paquete AVL completo como bytes/bytearray/memoryview
+                (se acepta también la representación hexadecimal por compatibilidad)
+            imei (str): IMEI del dispositivo
+        """
+        if isinstance(payload, str):
+            payload = bytes.fromhex(payload)
+        self.payload = memoryview(payload)
         self.imei = imei
         self.index = 0
+        self.codec = None
+        self.responses = []
+
+    @property
+    def is_command(self) -> bool:
+        """True si el paquete es Codec 12 (no lleva ACK de registros)"""
+        return self.codec is Codec12
 
     def decode_data(self):
         try:
-            logging.debug(f"Raw payload: {self.payload}")
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f"Raw payload: {self.payload.hex()}")
 
-            self.index = 16
-            codec_id = int(self.payload[self.index:self.index + 2], 16)
-            self.index += 2
+            self.index = _CODEC_OFFSET
+            codec_id = self.payload[self.index]
+            self.index += 1
 
-            if codec_id != 0x08:
+            self.codec = CODECS.get(codec_id)
+            if self.codec is None:
                 raise ValueError(f"Unsupported codec ID: {codec_id}")
 
-            num_of_data = int(self.payload[self.index:self.index + 2], 16)
-            self.index += 2
-
-            records = []
-            for _ in range(num_of_data):
-                record = self.parse_avl_record()
-                if record:
-                    records.append(record)
-
-            # Verificar si hay suficientes datos para leer el número final de registros
-            if len(self.payload) >= self.index + 4:
-                num_of_data_end = int(self.payload[-4:-2], 16)
-                if num_of_data != num_of_data_end:
-                    logging.warning(f"Number of records mismatch: start={num_of_data}, end={num_of_data_end}")
-            else:
-                logging.warning("Insufficient data to read final record count")
-
-            return records
+            return self.codec.decode(self)
 
         except Exception as e:
             logging.error(f"Error decoding data: {e}")
             return []
 
+    def parse_avl_records(self):
+        num_of_data = self.payload[self.index]
+        self.index += 1
+
+        records = []
+        for _ in range(num_of_data):
+            record = self.parse_avl_record()
+            if record:
+                records.append(record)
+
+        # El número final de registros va justo después del último registro
+        if len(self.payload) > self.index:
+            num_of_data_end = self.payload[self.index]
+            if num_of_data != num_of_data_end:
+                logging.warning(f"Number of records mismatch: start={num_of_data}, end={num_of_data_end}")
+        else:
+            logging.warning("Insufficient data to read final record count")
+
+        return records
+
     def parse_avl_record(self):
         try:
             # Verificar si hay suficientes datos para un registro AVL completo
-            if len(self.payload) < self.index + 16 + 2 + 8 + 8 + 4 + 4 + 2 + 4:
+            if len(self.payload) < self.index + _AVL_RECORD.size + self.codec.io_header.size:
                 logging.warning("Insufficient data for a complete AVL record")
                 return None
-            timestamp = struct.unpack('>Q', bytes.fromhex(self.payload[self.index:self.index + 16]))[0]
-            timestamp = datetime.fromtimestamp(timestamp / 1000, timezone.utc)
-            self.index += 16
-
-            priority = int(self.payload[self.index:self.index + 2], 16)
-            self.index += 2
-
-            longitude = struct.unpack('>i', bytes.fromhex(self.payload[self.index:self.index + 8]))[0] / 10000000.0
-            self.index += 8
-            latitude = struct.unpack('>i', bytes.fromhex(self.payload[self.index:self.index + 8]))[0] / 10000000.0
-            self.index += 8
-            altitude = struct.unpack('>H', bytes.fromhex(self.payload[self.index:self.index + 4]))[0]
-            self.index += 4
-            angle = struct.unpack('>H', bytes.fromhex(self.payload[self.index:self.index + 4]))[0]
-            self.index += 4
-            satellites = int(self.payload[self.index:self.index + 2], 16)
-            self.index += 2
-            speed = struct.unpack('>H', bytes.fromhex(self.payload[self.index:self.index + 4]))[0]
-            self.index += 4
+            (timestamp, priority, longitude, latitude,
+             altitude, angle, satellites, speed) = _AVL_RECORD.unpack_from(self.payload, self.index)
+            self.index += _AVL_RECORD.size
 
             io_records = self.parse_io_data()
 
             return {
                 "IMEI": self.imei,
-                "DateTime": timestamp.isoformat(),
+                "DateTime": datetime.fromtimestamp(timestamp / 1000, timezone.utc).isoformat(),
                 "Priority": priority,
                 "Location": {
-                    "Longitude": longitude,
-                    "Latitude": latitude,
+                    "Longitude": longitude / 10000000.0,
+                    "Latitude": latitude / 10000000.0,
                     "Altitude": altitude,
                     "Angle": angle,
                     "Satellites": satellites,
@@ -101,33 +199,65 @@ class Decoder:
 
     def parse_io_data(self):
         io_records = {}
+        codec = self.codec
 
         try:
-            if len(self.payload) < self.index + 4:
+            if len(self.payload) < self.index + codec.io_header.size:
                 logging.warning("Insufficient data for IO header")
                 return io_records
-            event_io_id = int(self.payload[self.index:self.index + 2], 16)
-            self.index += 2
-            io_records['Event IO ID'] = event_io_id
-
-            n_total_id = int(self.payload[self.index:self.index + 2], 16)
-            self.index += 2
+            header = codec.io_header.unpack_from(self.payload, self.index)
+            self.index += codec.io_header.size
+            io_records['Event IO ID'] = header[0]
+            if codec.has_generation_type:
+                io_records['Generation Type'] = header[1]
+
+            payload = self.payload
+            index = self.index
+            io_count = codec.io_count
+            for io_size in _IO_SIZES:
+                element = codec.io_elements[io_size]
+                n_items = io_count.unpack_from(payload, index)[0]
+                index += io_count.size
+                for _ in range(n_items):
+                    io_id, io_value = element.unpack_from(payload, index)
+                    index += element.size
+                    io_records[IO_ID_MAPPING.get(io_id, f'IO ID {io_id}')] = io_value
 
-            for io_size in [1, 2, 4, 8]:
-                n_items = int(self.payload[self.index:self.index + 2], 16)
-                self.index += 2
+            if codec.has_variable_length:
+                n_items = _UINT16.unpack_from(payload, index)[0]
+                index += 2
                 for _ in range(n_items):
-                    io_id = int(self.payload[self.index:self.index + 2], 16)
-                    self.index += 2
-                    io_value = struct.unpack(f'>{"BHIQ"[io_size // 2]}', bytes.fromhex(self.payload[self.index:self.index + io_size * 2]))[0]
-                    self.index += io_size * 2
-                    io_name = IO_ID_MAPPING.get(io_id, f'IO ID {io_id}')
-                    io_records[io_name] = io_value
+                    io_id, length = _UINT16.unpack_from(payload, index)[0], _UINT16.unpack_from(payload, index + 2)[0]
+                    index += 4
+                    # Valores de largo variable se exponen en hexadecimal (serializables a JSON)
+                    io_records[IO_ID_MAPPING.get(io_id, f'IO ID {io_id}')] = payload[index:index + length].hex()
+                    index += length
+            self.index = index
 
             return io_records
         except Exception as e:
             logging.error(f"Error parsing IO data: {e}")
             return io_records
+
+    def parse_command_messages(self):
+        """Decodifica los mensajes Codec 12 del paquete en `self.responses`"""
+        quantity = self.payload[self.index]
+        self.index += 1
+
+        for _ in range(quantity):
+            message_type, size = _COMMAND_HEADER.unpack_from(self.payload, self.index)
+            self.index += _COMMAND_HEADER.size
+            text = bytes(self.payload[self.index:self.index + size]).decode('ascii', errors='replace')
+            self.index += size
+            self.responses.append({
+                "IMEI": self.imei,
+                "Type": 'response' if message_type == Codec12.RESPONSE else 'command',
+                "Message": text
+            })
+
+        if len(self.payload) > self.index and self.payload[self.index] != quantity:
+            logging.warning(f"Number of messages mismatch: start={quantity}, end={self.payload[self.index]}")
+        return self.responses
     
 
     def process_fleet_data(self, records):
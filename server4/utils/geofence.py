@@ -0,0 +1,241 @@
+import logging
+import threading
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from .rtree import RTree
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se clasifica punto a punto
+    np = None
+
+# Las zonas llegan del panel como [[lat, lng], ...]. Como en point_in_polygon
+# de la API, el primer componente es "x" y el segundo "y"; el resultado no
+# depende de cómo se nombren los ejes mientras el punto use el mismo orden.
+
+
+class PreparedZone:
+    """
+    Polígono de una zona preparado para consultas repetidas.
+
+    Guarda su bounding box y las aristas no horizontales ordenadas por su
+    `y` mínima, con la pendiente ya calculada, así el ray casting no
+    recalcula nada por punto y deja de recorrer aristas en cuanto las
+    restantes empiezan por encima del punto.
+    """
+
+    __slots__ = ('id', 'name', 'min_x', 'min_y', 'max_x', 'max_y', 'bbox', 'edge_min_y', 'edges')
+
+    def __init__(self, zone_id, name: str, coordinates: Sequence[Sequence[float]]):
+        points = [(float(point[0]), float(point[1])) for point in coordinates]
+        if len(points) < 3:
+            raise ValueError(f"Zone {zone_id} has fewer than 3 vertices")
+        self.id = zone_id
+        self.name = name
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        self.min_x, self.max_x = min(xs), max(xs)
+        self.min_y, self.max_y = min(ys), max(ys)
+        self.bbox = (self.min_x, self.min_y, self.max_x, self.max_y)
+
+        edges = []
+        previous = points[-1]
+        for current in points:
+            (x1, y1), (x2, y2) = previous, current
+            previous = current
+            if y1 == y2:
+                continue  # Una arista horizontal nunca cruza el rayo
+            # x del cruce = x1 + (y - y1) * slope
+            edges.append((min(y1, y2), max(y1, y2), x1, y1, (x2 - x1) / (y2 - y1)))
+        edges.sort()
+        self.edge_min_y = [edge[0] for edge in edges]
+        self.edges = edges
+
+    def contains(self, x: float, y: float) -> bool:
+        """Mismo criterio que point_in_polygon: cruces con ymin < y <= ymax y x <= x del cruce"""
+        if x < self.min_x or x > self.max_x or y <= self.min_y or y > self.max_y:
+            return False
+        inside = False
+        edges = self.edges
+        # Sólo las aristas que empiezan por debajo del punto pueden cruzar el rayo
+        for i in range(bisect_right(self.edge_min_y, y) - 1, -1, -1):
+            edge_min_y, edge_max_y, x1, y1, slope = edges[i]
+            if edge_min_y < y <= edge_max_y and x <= x1 + (y - y1) * slope:
+                inside = not inside
+        return inside
+
+
+def points_in_zone(zone: PreparedZone, xs: Sequence[float], ys: Sequence[float]):
+    """
+    Clasifica muchos puntos contra una zona en una pasada
+
+    Con NumPy, descarta por bounding box todos los puntos a la vez y
+    recorre las aristas una sola vez, cada una sobre el arreglo completo
+    de puntos candidatos. Usa el mismo criterio (y la misma aritmética)
+    que PreparedZone.contains.
+
+    Args:
+        zone (PreparedZone): Zona preparada
+        xs, ys: Coordenadas de los puntos, en el mismo orden de ejes que la zona
+
+    Returns:
+        Arreglo (o lista sin NumPy) de bool, True para los puntos dentro de la zona
+    """
+    if np is None:
+        return [zone.contains(x, y) for x, y in zip(xs, ys)]
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    inside = np.zeros(len(xs), dtype=bool)
+    candidates = np.flatnonzero((xs >= zone.min_x) & (xs <= zone.max_x) & (ys > zone.min_y) & (ys <= zone.max_y))
+    if not candidates.size:
+        return inside
+    cx, cy = xs[candidates], ys[candidates]
+    result = np.zeros(candidates.size, dtype=bool)
+    for edge_min_y, edge_max_y, x1, y1, slope in zone.edges:
+        crossing = (cy > edge_min_y) & (cy <= edge_max_y)
+        crossing &= cx <= x1 + (cy - y1) * slope
+        result ^= crossing
+    inside[candidates] = result
+    return inside
+
+
+def inside_runs(inside: Sequence[bool]) -> List[Tuple[int, Optional[int]]]:
+    """
+    Tramos consecutivos de puntos dentro de una zona
+
+    Returns:
+        list: Pares (índice del primer punto dentro, índice del primer punto
+            fuera después del tramo, o None si el tramo llega al final)
+    """
+    if np is not None:
+        flags = np.asarray(inside, dtype=np.int8)
+        changes = np.diff(np.concatenate(([0], flags, [0])))
+        starts = np.flatnonzero(changes == 1)
+        ends = np.flatnonzero(changes == -1)
+        return [(int(start), int(end) if end < len(flags) else None) for start, end in zip(starts, ends)]
+
+    runs = []
+    start = None
+    for index, flag in enumerate(inside):
+        if flag and start is None:
+            start = index
+        elif not flag and start is not None:
+            runs.append((start, index))
+            start = None
+    if start is not None:
+        runs.append((start, None))
+    return runs
+
+
+class ZoneIndex:
+    """
+    Zonas de control preparadas, con un R-tree sobre sus bounding boxes.
+
+    Se construye una vez a partir de las zonas guardadas (empaquetado STR)
+    y se mantiene con `add_zone`/`remove_zone` cuando cambian. Para un
+    IMEI con pocas zonas se revisan sus bounding boxes directamente; con
+    muchas, el R-tree descarta en O(log n) las que no contienen el punto.
+    """
+
+    # Hasta cuántas zonas asignadas conviene recorrerlas en lugar de consultar el árbol
+    LINEAR_SCAN_LIMIT = 16
+
+    def __init__(self, zones: Iterable[dict] = (), max_entries: int = 16):
+        """
+        Args:
+            zones: Diccionarios con 'id', 'name', 'coordinates' (lista de puntos) e 'imeis'
+            max_entries (int): Entradas por nodo del R-tree
+        """
+        self.zones: Dict[object, PreparedZone] = {}
+        self.imeis_by_zone: Dict[object, Set[str]] = {}
+        self.by_imei: Dict[str, Dict[object, PreparedZone]] = {}
+        self._lock = threading.Lock()
+        for zone in zones:
+            prepared = self._prepare(zone)
+            if prepared is not None:
+                self._register(prepared, zone.get('imeis') or ())
+        self.tree = RTree.bulk_load(((zone.bbox, zone) for zone in self.zones.values()), max_entries)
+
+    @staticmethod
+    def _prepare(zone: dict) -> Optional[PreparedZone]:
+        try:
+            return PreparedZone(zone['id'], zone['name'], zone['coordinates'])
+        except (ValueError, TypeError, IndexError, KeyError) as e:
+            logging.warning(f"Skipping invalid zone {zone.get('id')}: {e}")
+            return None
+
+    def _register(self, prepared: PreparedZone, imeis: Iterable[str]):
+        self.zones[prepared.id] = prepared
+        self.imeis_by_zone[prepared.id] = set(imeis)
+        for imei in self.imeis_by_zone[prepared.id]:
+            self.by_imei.setdefault(imei, {})[prepared.id] = prepared
+
+    def _unregister(self, zone_id) -> Optional[PreparedZone]:
+        prepared = self.zones.pop(zone_id, None)
+        for imei in self.imeis_by_zone.pop(zone_id, ()):
+            assigned = self.by_imei.get(imei)
+            if assigned is not None:
+                assigned.pop(zone_id, None)
+                if not assigned:
+                    del self.by_imei[imei]
+        return prepared
+
+    def add_zone(self, zone: dict) -> bool:
+        """
+        Agrega una zona, o la reemplaza si ya existe una con el mismo id
+
+        Returns:
+            bool: False si las coordenadas no forman un polígono válido
+        """
+        prepared = self._prepare(zone)
+        with self._lock:
+            self._remove(zone['id'])
+            if prepared is None:
+                return False
+            self._register(prepared, zone.get('imeis') or ())
+            self.tree.insert(prepared.bbox, prepared)
+        return True
+
+    def remove_zone(self, zone_id) -> bool:
+        """Quita una zona; retorna False si no estaba en el índice"""
+        with self._lock:
+            return self._remove(zone_id)
+
+    def _remove(self, zone_id) -> bool:
+        prepared = self._unregister(zone_id)
+        if prepared is None:
+            return False
+        self.tree.delete(prepared.bbox, prepared)
+        return True
+
+    def zones_for_imei(self, imei: str) -> List[PreparedZone]:
+        with self._lock:
+            return sorted(self.by_imei.get(imei, {}).values(), key=lambda zone: zone.id)
+
+    def _candidates(self, imei: str, x: float, y: float) -> List[PreparedZone]:
+        with self._lock:
+            assigned = self.by_imei.get(imei)
+            if not assigned:
+                return []
+            if len(assigned) <= self.LINEAR_SCAN_LIMIT:
+                return list(assigned.values())
+            return [zone for zone in self.tree.search_point(x, y) if zone.id in assigned]
+
+    def find_zones(self, imei: str, x: float, y: float) -> List[PreparedZone]:
+        """Zonas del IMEI que contienen el punto, ordenadas por id"""
+        matches = [zone for zone in self._candidates(imei, x, y) if zone.contains(x, y)]
+        return sorted(matches, key=lambda zone: zone.id)
+
+    def find_zone(self, imei: str, x: float, y: float) -> Optional[PreparedZone]:
+        """Zona del IMEI que contiene el punto (la de menor id si hay varias), o None"""
+        matches = self.find_zones(imei, x, y)
+        return matches[0] if matches else None
+
+    def zones_at(self, x: float, y: float) -> List[PreparedZone]:
+        """Todas las zonas que contienen el punto, sin importar su asignación"""
+        with self._lock:
+            candidates = self.tree.search_point(x, y)
+        return sorted((zone for zone in candidates if zone.contains(x, y)), key=lambda zone: zone.id)
+
+    def __len__(self) -> int:
+        return len(self.zones)
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+from config.config import Config
+from utils.metrics import Metrics
+
+try:
+    import redis
+except ImportError:  # Sólo necesario con MESSAGE_BUS_BACKEND=redis
+    redis = None
+
+# Tópicos publicados por la ingesta y consumidos por la API
+TOPIC_GPS_UPDATE = 'gps_update'    # {'imei': str, 'data': última posición del paquete}
+TOPIC_ZONE_EVENTS = 'zone_events'  # lista de eventos zone_enter/zone_exit
+
+_STOP = object()
+
+Handler = Callable[[Any], None]
+
+
+class MessageBus(ABC):
+    """
+    Pub/sub interno entre la ingesta TCP y la API Socket.IO.
+
+    `publish` sólo encola el mensaje (nunca bloquea al handler que envía
+    los ACK); un thread despachador lo entrega con `_deliver`. Si la cola
+    se llena se descarta el mensaje: son actualizaciones en tiempo real y
+    la siguiente posición reemplaza a la perdida.
+
+    Los threads se inician con el primer uso y se vuelven a iniciar si el
+    proceso fue forkeado (p. ej. workers de gunicorn con preload_app).
+    """
+
+    def __init__(self, max_size: int = 10000):
+        """
+        Args:
+            max_size (int): Mensajes en espera de entrega antes de descartar
+        """
+        self.max_size = max_size
+        self.handlers: Dict[str, List[Handler]] = {}
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+
+    def publish(self, topic: str, message: Any) -> bool:
+        """
+        Publica un mensaje sin esperar su entrega
+
+        Returns:
+            bool: False si se descartó por tener la cola llena
+        """
+        self.start()
+        try:
+            self._queue.put_nowait((topic, message))
+        except queue.Full:
+            Metrics.increment('bus.dropped')
+            return False
+        Metrics.increment('bus.published')
+        return True
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        """Registra una función que recibe cada mensaje del tópico en este proceso"""
+        with self._lock:
+            self.handlers.setdefault(topic, []).append(handler)
+
+    def listen(self) -> None:
+        """
+        Empieza a entregar a los handlers de este proceso los mensajes
+        publicados en otros (idempotente). Lo llaman sólo los procesos que
+        atienden clientes (un worker de gunicorn en post_worker_init, o la
+        API sin gunicorn), no el proceso principal con preload_app.
+        """
+        self.start()
+
+    def start(self) -> None:
+        """Inicia los threads del bus en este proceso (idempotente)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._start_threads()
+            self._pid = os.getpid()
+
+    def close(self) -> None:
+        """Entrega lo pendiente y detiene el despachador"""
+        if self._pid == os.getpid():
+            self._queue.put(_STOP)
+
+    def _start_threads(self) -> None:
+        threading.Thread(target=self._dispatch, name=f"{type(self).__name__}Dispatcher", daemon=True).start()
+
+    def _dispatch(self) -> None:
+        message_queue = self._queue
+        while True:
+            item = message_queue.get()
+            if item is _STOP:
+                break
+            topic, message = item
+            try:
+                self._deliver(topic, message)
+            except Exception as e:
+                logging.error(f"Error delivering message on topic {topic}: {e}")
+            Metrics.set_gauge('bus.queue_size', message_queue.qsize())
+
+    @abstractmethod
+    def _deliver(self, topic: str, message: Any) -> None:
+        """Entrega un mensaje desencolado (en el thread despachador)"""
+
+    def _notify(self, topic: str, message: Any) -> None:
+        """Llama a los handlers locales del tópico"""
+        for handler in self.handlers.get(topic, ()):
+            try:
+                handler(message)
+                Metrics.increment('bus.delivered')
+            except Exception as e:
+                Metrics.increment('bus.handler_errors')
+                logging.error(f"Error in message bus handler for topic {topic}: {e}")
+
+
+class InProcessBus(MessageBus):
+    """Entrega los mensajes a los handlers del mismo proceso"""
+
+    def _deliver(self, topic: str, message: Any) -> None:
+        self._notify(topic, message)
+
+
+class RedisBus(MessageBus):
+    """
+    Publica los mensajes (como JSON) en canales de Redis y entrega a los
+    handlers locales lo que llega por los canales suscritos, así la
+    ingesta y cada worker de la API pueden correr en procesos distintos.
+    Sólo los procesos que llaman a `listen` leen los canales.
+    """
+
+    # Espera (s) antes de volver a suscribirse tras un error de conexión
+    retry_delay = 1.0
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', channel_prefix: str = 'gps:',
+                 max_size: int = 10000, client=None):
+        """
+        Args:
+            url (str): URL de Redis
+            channel_prefix (str): Prefijo de los canales (un canal por tópico)
+            max_size (int): Mensajes en espera de publicación antes de descartar
+            client: Cliente compatible con redis.Redis ya creado (p. ej. para pruebas)
+        """
+        if client is None and redis is None:
+            raise RuntimeError("The redis package is required for the Redis message bus")
+        super().__init__(max_size)
+        self.url = url
+        self.channel_prefix = channel_prefix
+        self._client = client
+        self._client_pid: Optional[int] = None
+        self._listener_pid: Optional[int] = None
+
+    @property
+    def client(self):
+        # Una conexión por proceso: no se comparten sockets entre procesos forkeados
+        if self._client is None or (self._client_pid is not None and self._client_pid != os.getpid()):
+            self._client = redis.Redis.from_url(self.url)
+            self._client_pid = os.getpid()
+        return self._client
+
+    def listen(self) -> None:
+        super().listen()
+        if self._listener_pid != os.getpid():
+            with self._lock:
+                if self._listener_pid != os.getpid():
+                    self._listener_pid = os.getpid()
+                    threading.Thread(target=self._listen, name="RedisBusListener", daemon=True).start()
+
+    def close(self) -> None:
+        # El listener termina en su próxima lectura
+        self._listener_pid = None
+        super().close()
+
+    def _deliver(self, topic: str, message: Any) -> None:
+        self.client.publish(self.channel_prefix + topic, json.dumps(message, default=str))
+
+    def _listen(self) -> None:
+        pubsub = None
+        while self._listener_pid == os.getpid():
+            try:
+                if pubsub is None:
+                    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.psubscribe(self.channel_prefix + '*')
+                item = pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                # Suscripción nueva tras un corte: la anterior puede haber quedado sin canales
+                logging.error(f"Error reading from Redis message bus, resubscribing: {e}")
+                Metrics.increment('bus.listener_errors')
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+                pubsub = None
+                time.sleep(self.retry_delay)
+                continue
+            if not item or item.get('type') != 'pmessage':
+                continue
+            channel = item['channel']
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            topic = channel[len(self.channel_prefix):]
+            if topic not in self.handlers:
+                continue
+            try:
+                message = json.loads(item['data'])
+            except (TypeError, ValueError) as e:
+                logging.error(f"Invalid message on {channel}: {e}")
+                continue
+            self._notify(topic, message)
+        if pubsub is not None:
+            pubsub.close()
+
+
+_bus: Optional[MessageBus] = None
+_bus_lock = threading.Lock()
+
+
+def get_message_bus() -> MessageBus:
+    """Bus del proceso, según MESSAGE_BUS_CONFIG"""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                config = Config.MESSAGE_BUS_CONFIG
+                if config['backend'] == 'redis':
+                    _bus = RedisBus(config['redis_url'], config['channel_prefix'], config['max_size'])
+                elif config['backend'] == 'inprocess':
+                    _bus = InProcessBus(config['max_size'])
+                else:
+                    raise ValueError(f"Invalid message bus backend: {config['backend']}")
+    return _bus
@@ -0,0 +1,66 @@
+import threading
+from typing import Any, Dict
+
+
+class Metrics:
+    """
+    Contadores, gauges y tiempos del proceso, compartidos por todos los threads.
+    Se exponen en /api/gps-server/status.
+    """
+
+    _lock = threading.Lock()
+    _counters: Dict[str, int] = {}
+    _gauges: Dict[str, float] = {}
+    _timings: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def increment(cls, name: str, value: int = 1) -> None:
+        """Incrementa un contador"""
+        with cls._lock:
+            cls._counters[name] = cls._counters.get(name, 0) + value
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float) -> None:
+        """Fija el valor actual de un gauge"""
+        with cls._lock:
+            cls._gauges[name] = value
+
+    @classmethod
+    def observe(cls, name: str, seconds: float) -> None:
+        """Registra una duración (cantidad, total y máximo)"""
+        with cls._lock:
+            timing = cls._timings.get(name)
+            if timing is None:
+                timing = cls._timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+            timing['count'] += 1
+            timing['total'] += seconds
+            if seconds > timing['max']:
+                timing['max'] = seconds
+
+    @classmethod
+    def get(cls, name: str, default: Any = 0) -> Any:
+        """Obtiene el valor de un contador o gauge"""
+        with cls._lock:
+            return cls._counters.get(name, cls._gauges.get(name, default))
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Any]:
+        """Copia de todas las métricas, lista para serializar a JSON"""
+        with cls._lock:
+            timings = {
+                name: dict(timing, avg=timing['total'] / timing['count'] if timing['count'] else 0.0)
+                for name, timing in cls._timings.items()
+            }
+            return {
+                'counters': dict(cls._counters),
+                'gauges': dict(cls._gauges),
+                'timings': timings,
+            }
+
+    @classmethod
+    def reset(cls) -> None:
+        """Reinicia todas las métricas"""
+        with cls._lock:
+            cls._counters.clear()
+            cls._gauges.clear()
+            cls._timings.clear()
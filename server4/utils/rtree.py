@@ -0,0 +1,248 @@
+import math
+from typing import Any, Iterable, List, Optional, Tuple
+
+# Bounding box: (min_x, min_y, max_x, max_y)
+BBox = Tuple[float, float, float, float]
+
+
+def _union(a: BBox, b: BBox) -> BBox:
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _union_all(bboxes: Iterable[BBox]) -> Optional[BBox]:
+    result = None
+    for bbox in bboxes:
+        result = bbox if result is None else _union(result, bbox)
+    return result
+
+
+def _area(bbox: BBox) -> float:
+    return (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+
+
+def _overlap(a: BBox, b: BBox) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    return width * height if width > 0 and height > 0 else 0.0
+
+
+def _contains(outer: BBox, inner: BBox) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def _intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class _Node:
+    __slots__ = ('leaf', 'entries', 'bbox')
+
+    def __init__(self, leaf: bool, entries: list = None):
+        self.leaf = leaf
+        # Hojas: (bbox, valor); nodos internos: (bbox, _Node)
+        self.entries = entries if entries is not None else []
+        self.bbox = _union_all(entry[0] for entry in self.entries)
+
+    def refresh(self):
+        self.bbox = _union_all(entry[0] for entry in self.entries)
+
+
+class RTree:
+    """
+    R-tree en memoria sobre bounding boxes.
+
+    `bulk_load` arma el árbol con Sort-Tile-Recursive (nodos llenos y con
+    poco solapamiento); `insert` y `delete` lo mantienen al día cuando
+    cambian elementos sueltos. Las consultas por punto visitan sólo las
+    ramas cuyo bounding box contiene el punto, O(log n) para elementos
+    que no se solapan mucho.
+
+    No es thread-safe: quien lo comparte entre threads debe sincronizar
+    las modificaciones con las consultas.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        if max_entries < 4:
+            raise ValueError(f"Invalid R-tree node size: {max_entries}")
+        self.max_entries = max_entries
+        self.min_entries = max(2, int(max_entries * 0.4))
+        self.root = _Node(leaf=True)
+        self._size = 0
+
+    @classmethod
+    def bulk_load(cls, items: Iterable[Tuple[BBox, Any]], max_entries: int = 16) -> 'RTree':
+        """
+        Construye un árbol empaquetado (STR) a partir de pares (bbox, valor)
+        """
+        tree = cls(max_entries)
+        entries = [(tuple(bbox), value) for bbox, value in items]
+        if not entries:
+            return tree
+        nodes = tree._pack(entries, leaf=True)
+        while len(nodes) > 1:
+            nodes = tree._pack([(node.bbox, node) for node in nodes], leaf=False)
+        tree.root = nodes[0]
+        tree._size = len(entries)
+        return tree
+
+    def _pack(self, entries: list, leaf: bool) -> List[_Node]:
+        capacity = self.max_entries
+        node_count = math.ceil(len(entries) / capacity)
+        slice_size = math.ceil(math.sqrt(node_count)) * capacity
+        entries = sorted(entries, key=lambda entry: entry[0][0] + entry[0][2])
+        nodes = []
+        for i in range(0, len(entries), slice_size):
+            vertical_slice = sorted(entries[i:i + slice_size], key=lambda entry: entry[0][1] + entry[0][3])
+            for j in range(0, len(vertical_slice), capacity):
+                nodes.append(_Node(leaf, vertical_slice[j:j + capacity]))
+        return nodes
+
+    def insert(self, bbox: BBox, value: Any) -> None:
+        """Agrega un elemento"""
+        bbox = tuple(bbox)
+        sibling = self._insert(self.root, bbox, value)
+        if sibling is not None:
+            self.root = _Node(False, [(self.root.bbox, self.root), (sibling.bbox, sibling)])
+        self._size += 1
+
+    def _insert(self, node: _Node, bbox: BBox, value: Any) -> Optional[_Node]:
+        if node.leaf:
+            node.entries.append((bbox, value))
+        else:
+            index = self._choose_subtree(node, bbox)
+            child = node.entries[index][1]
+            sibling = self._insert(child, bbox, value)
+            node.entries[index] = (child.bbox, child)
+            if sibling is not None:
+                node.entries.append((sibling.bbox, sibling))
+        if len(node.entries) > self.max_entries:
+            return self._split(node)
+        node.bbox = bbox if node.bbox is None else _union(node.bbox, bbox)
+        return None
+
+    @staticmethod
+    def _choose_subtree(node: _Node, bbox: BBox) -> int:
+        """Hijo que menos crece al incluir el bbox (desempate: el de menor área)"""
+        best_index, best_key = 0, None
+        for index, (child_bbox, _) in enumerate(node.entries):
+            area = _area(child_bbox)
+            key = (_area(_union(child_bbox, bbox)) - area, area)
+            if best_key is None or key < best_key:
+                best_index, best_key = index, key
+        return best_index
+
+    def _split(self, node: _Node) -> _Node:
+        """
+        Divide un nodo desbordado: ordena las entradas por el centro en cada
+        eje y elige el corte con menor solapamiento (y luego menor área)
+        """
+        best = None
+        count = len(node.entries)
+        for axis in (0, 1):
+            ordered = sorted(node.entries, key=lambda entry: entry[0][axis] + entry[0][axis + 2])
+            bboxes = [entry[0] for entry in ordered]
+            prefix, suffix = [None] * count, [None] * count
+            prefix[0], suffix[-1] = bboxes[0], bboxes[-1]
+            for i in range(1, count):
+                prefix[i] = _union(prefix[i - 1], bboxes[i])
+                suffix[count - 1 - i] = _union(suffix[count - i], bboxes[count - 1 - i])
+            for k in range(self.min_entries, count - self.min_entries + 1):
+                left, right = prefix[k - 1], suffix[k]
+                key = (_overlap(left, right), _area(left) + _area(right))
+                if best is None or key < best[0]:
+                    best = (key, ordered[:k], ordered[k:])
+        node.entries = best[1]
+        node.refresh()
+        return _Node(node.leaf, best[2])
+
+    def delete(self, bbox: BBox, value: Any) -> bool:
+        """
+        Elimina un elemento (comparado con ==) insertado con ese bbox
+
+        Returns:
+            bool: True si se encontró y eliminó
+        """
+        orphans = []
+        if not self._delete(self.root, tuple(bbox), value, orphans):
+            return False
+        self._size -= 1
+        # Reducir la altura si la raíz quedó con un solo hijo
+        while not self.root.leaf and len(self.root.entries) == 1:
+            self.root = self.root.entries[0][1]
+        if not self.root.leaf and not self.root.entries:
+            self.root = _Node(leaf=True)
+        # Reinsertar lo que colgaba de nodos que quedaron con pocas entradas
+        for orphan_bbox, orphan_value in orphans:
+            self._size -= 1
+            self.insert(orphan_bbox, orphan_value)
+        return True
+
+    def _delete(self, node: _Node, bbox: BBox, value: Any, orphans: list) -> bool:
+        if node.leaf:
+            for index, (entry_bbox, entry_value) in enumerate(node.entries):
+                if entry_value == value and entry_bbox == bbox:
+                    del node.entries[index]
+                    node.refresh()
+                    return True
+            return False
+        for index, (child_bbox, child) in enumerate(node.entries):
+            if not _contains(child_bbox, bbox) or not self._delete(child, bbox, value, orphans):
+                continue
+            if len(child.entries) < self.min_entries:
+                del node.entries[index]
+                orphans.extend(self._items(child))
+            else:
+                node.entries[index] = (child.bbox, child)
+            node.refresh()
+            return True
+        return False
+
+    def _items(self, node: _Node) -> List[Tuple[BBox, Any]]:
+        if node.leaf:
+            return list(node.entries)
+        items = []
+        for _, child in node.entries:
+            items.extend(self._items(child))
+        return items
+
+    def search_point(self, x: float, y: float) -> List[Any]:
+        """Valores cuyo bbox contiene el punto (bordes incluidos)"""
+        if self.root.bbox is None:
+            return []
+        results = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for bbox, child in node.entries:
+                if bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]:
+                    if node.leaf:
+                        results.append(child)
+                    else:
+                        stack.append(child)
+        return results
+
+    def search(self, bbox: BBox) -> List[Any]:
+        """Valores cuyo bbox se intersecta con el dado"""
+        if self.root.bbox is None:
+            return []
+        results = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for entry_bbox, child in node.entries:
+                if _intersects(entry_bbox, bbox):
+                    if node.leaf:
+                        results.append(child)
+                    else:
+                        stack.append(child)
+        return results
+
+    def height(self) -> int:
+        height, node = 1, self.root
+        while not node.leaf:
+            node = node.entries[0][1]
+            height += 1
+        return height
+
+    def __len__(self) -> int:
+        return self._size
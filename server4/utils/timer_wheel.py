@@ -0,0 +1,150 @@
+import math
+import time
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+
+class TimerWheel:
+    """
+    Rueda de temporizadores jerárquica para plazos de muchas conexiones.
+
+    El nivel 0 tiene `slots` ranuras de `tick` segundos; cada nivel
+    siguiente cubre `slots` veces más tiempo por ranura. Programar,
+    cancelar y posponer un plazo es O(1), y cada tick sólo revisa una
+    ranura (más una cascada cuando un nivel da la vuelta), sin importar
+    cuántas conexiones haya.
+
+    `touch` sólo actualiza el plazo guardado: la entrada sigue en su
+    ranura y, cuando esa ranura vence, se vuelve a ubicar según el plazo
+    nuevo. Así posponer el plazo en cada paquete recibido no mueve nada.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 3,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            tick (float): Resolución en segundos (los plazos vencen hasta un tick tarde)
+            slots (int): Ranuras por nivel
+            levels (int): Niveles; el alcance es tick * slots ** levels (más lejos se recorta)
+            clock: Reloj monotónico
+        """
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self.wheels: List[List[Set[Hashable]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.current = math.floor(clock() / tick)
+        # key -> (tick de vencimiento, valor); key -> (nivel, ranura) donde está
+        self.entries: Dict[Hashable, Tuple[int, Any]] = {}
+        self.positions: Dict[Hashable, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def _ticks(self, seconds: float) -> int:
+        return math.ceil(seconds / self.tick)
+
+    def schedule(self, key: Hashable, delay: float, value: Any = None) -> None:
+        """Programa (o reprograma) el vencimiento de `key` dentro de `delay` segundos"""
+        with self._lock:
+            deadline = self._ticks(self.clock() + delay)
+            self.entries[key] = (deadline, value)
+            self._remove(key)
+            self._place(key, deadline)
+
+    def touch(self, key: Hashable, delay: float) -> bool:
+        """
+        Pospone el vencimiento de `key` a `delay` segundos desde ahora
+
+        Returns:
+            bool: False si `key` no está programada
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False
+            deadline = self._ticks(self.clock() + delay)
+            if deadline < entry[0]:
+                # Adelantar el plazo sí requiere mover la entrada
+                self._remove(key)
+                self._place(key, deadline)
+            self.entries[key] = (deadline, entry[1])
+            return True
+
+    def cancel(self, key: Hashable) -> bool:
+        """Quita `key` de la rueda; False si no estaba programada"""
+        with self._lock:
+            if self.entries.pop(key, None) is None:
+                return False
+            self._remove(key)
+            return True
+
+    def advance(self, now: Optional[float] = None) -> List[Tuple[Hashable, Any]]:
+        """
+        Avanza la rueda hasta `now` y retira los plazos vencidos
+
+        Returns:
+            list: Pares (key, valor) vencidos, para procesarlos juntos
+        """
+        with self._lock:
+            # Sólo ticks completos: un plazo nunca vence antes de tiempo
+            target = math.floor((self.clock() if now is None else now) / self.tick)
+            expired = []
+            while self.current < target:
+                self.current += 1
+                self._cascade()
+                slot = self.wheels[0][self.current % self.slots]
+                keys = list(slot)
+                slot.clear()
+                for key in keys:
+                    del self.positions[key]
+                    deadline, value = self.entries[key]
+                    if deadline <= self.current:
+                        del self.entries[key]
+                        expired.append((key, value))
+                    else:
+                        self._place(key, deadline)
+            return expired
+
+    def _cascade(self):
+        """Al dar la vuelta un nivel, redistribuye la ranura que corresponde del nivel siguiente"""
+        span = 1
+        for level in range(1, self.levels):
+            span *= self.slots
+            if self.current % span:
+                break
+            slot = self.wheels[level][(self.current // span) % self.slots]
+            keys = list(slot)
+            slot.clear()
+            for key in keys:
+                del self.positions[key]
+                deadline = self.entries[key][0]
+                if deadline <= self.current:
+                    # Vence en este mismo tick: a la ranura de nivel 0 que se procesa ahora
+                    index = self.current % self.slots
+                    self.wheels[0][index].add(key)
+                    self.positions[key] = (0, index)
+                else:
+                    self._place(key, deadline)
+
+    def _place(self, key: Hashable, deadline: int):
+        delta = max(deadline - self.current, 1)
+        span = 1
+        for level in range(self.levels):
+            if delta < span * self.slots or level == self.levels - 1:
+                # En el último nivel, un plazo fuera de alcance queda en la ranura más lejana
+                ticks = min(deadline, self.current + span * (self.slots - 1)) if level == self.levels - 1 else deadline
+                index = (max(ticks, self.current + 1) // span) % self.slots
+                self.wheels[level][index].add(key)
+                self.positions[key] = (level, index)
+                return
+            span *= self.slots
+
+    def _remove(self, key: Hashable):
+        position = self.positions.pop(key, None)
+        if position is not None:
+            self.wheels[position[0]][position[1]].discard(key)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
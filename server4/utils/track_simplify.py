@@ -0,0 +1,137 @@
+import math
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él las distancias se calculan punto a punto
+    np = None
+
+EARTH_RADIUS = 6371000.0  # metros
+
+# Segmentos con menos puntos se recorren en Python: el costo fijo de las
+# operaciones de NumPy supera lo que ahorran sobre arreglos tan cortos
+VECTORIZE_MIN_POINTS = 64
+
+
+def _timestamp_seconds(value: str) -> float:
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def bucket_rows(rows: Iterable[dict], seconds: float) -> Iterator[dict]:
+    """
+    Submuestreo por tiempo: la primera fila de cada intervalo de `seconds`
+
+    Trabaja en streaming sobre filas de gps_data (en cualquier orden
+    cronológico, ascendente o descendente) y siempre entrega la última
+    fila, así el recorrido no pierde su extremo.
+
+    Args:
+        rows: Filas con 'timestamp' ISO 8601
+        seconds (float): Largo de cada intervalo
+
+    Yields:
+        dict: Filas conservadas, en el mismo orden
+    """
+    current = None
+    last = None
+    last_sent = False
+    for row in rows:
+        bucket = math.floor(_timestamp_seconds(row['timestamp']) / seconds)
+        last = row
+        last_sent = bucket != current
+        if last_sent:
+            current = bucket
+            yield row
+    if last is not None and not last_sent:
+        yield last
+
+
+def _project(latitudes: Sequence[float], longitudes: Sequence[float]):
+    """Proyección equirectangular local (metros) centrada en la latitud media del recorrido"""
+    if np is not None:
+        lat = np.radians(np.asarray(latitudes, dtype=float))
+        lon = np.radians(np.asarray(longitudes, dtype=float))
+        return lon * math.cos(float(lat.mean())) * EARTH_RADIUS, lat * EARTH_RADIUS
+    lat = [math.radians(value) for value in latitudes]
+    scale = math.cos(sum(lat) / len(lat)) * EARTH_RADIUS
+    return [math.radians(value) * scale for value in longitudes], [value * EARTH_RADIUS for value in lat]
+
+
+def _farthest(xs, ys, start: int, end: int, arrays=None):
+    """
+    Índice y distancia del punto entre start y end más lejano al segmento start-end
+
+    `arrays` son las mismas coordenadas como arreglos de NumPy, para los segmentos largos
+    """
+    ax, ay = xs[start], ys[start]
+    dx, dy = xs[end] - ax, ys[end] - ay
+    length2 = dx * dx + dy * dy
+    if arrays is not None and end - start > VECTORIZE_MIN_POINTS:
+        px, py = arrays[0][start + 1:end] - ax, arrays[1][start + 1:end] - ay
+        if length2 > 0:
+            t = np.clip((px * dx + py * dy) / length2, 0.0, 1.0)
+            px, py = px - t * dx, py - t * dy
+        distances = np.hypot(px, py)
+        index = int(distances.argmax())
+        return start + 1 + index, float(distances[index])
+
+    best, best_distance = start + 1, -1.0
+    for i in range(start + 1, end):
+        px, py = xs[i] - ax, ys[i] - ay
+        if length2 > 0:
+            t = min(max((px * dx + py * dy) / length2, 0.0), 1.0)
+            px, py = px - t * dx, py - t * dy
+        distance = math.hypot(px, py)
+        if distance > best_distance:
+            best, best_distance = i, distance
+    return best, best_distance
+
+
+def simplify_indices(latitudes: Sequence[float], longitudes: Sequence[float], tolerance: float) -> List[int]:
+    """
+    Ramer-Douglas-Peucker: índices de los puntos que se conservan
+
+    Se descarta todo punto a menos de `tolerance` metros del segmento
+    que une los puntos conservados a cada lado. Usa una pila en lugar de
+    recursión (recorridos largos) y, con NumPy, calcula las distancias de
+    los segmentos largos sobre todos sus puntos de una vez.
+
+    Args:
+        latitudes, longitudes: Coordenadas del recorrido, en orden
+        tolerance (float): Distancia máxima (m) entre el recorrido original y el simplificado
+
+    Returns:
+        list: Índices conservados en orden creciente (siempre el primero y el último)
+    """
+    count = len(latitudes)
+    if count < 3 or tolerance <= 0:
+        return list(range(count))
+    xs, ys = _project(latitudes, longitudes)
+    arrays = None
+    if np is not None:
+        arrays = (xs, ys)
+        xs, ys = xs.tolist(), ys.tolist()
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        index, distance = _farthest(xs, ys, start, end, arrays)
+        if distance > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+def simplify_rows(rows: Iterable[dict], tolerance: float) -> List[dict]:
+    """Filas de gps_data conservadas por Ramer-Douglas-Peucker con `tolerance` metros"""
+    rows = list(rows)
+    indices = simplify_indices([row['latitude'] for row in rows], [row['longitude'] for row in rows], tolerance)
+    return [rows[i] for i in indices]
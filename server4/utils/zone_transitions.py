@@ -0,0 +1,120 @@
+import logging
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from utils.metrics import Metrics
+
+ZONE_ENTER = 'zone_enter'
+ZONE_EXIT = 'zone_exit'
+
+_NO_ZONES: FrozenSet = frozenset()
+
+
+class ZoneTransitionEngine:
+    """
+    Detecta entradas y salidas de zonas comparando cada posición con la anterior.
+
+    Por IMEI guarda sólo el timestamp de la última posición evaluada y el
+    conjunto de zonas en que estaba (el mismo frozenset vacío para todos
+    los dispositivos fuera de zonas), así cada posición cuesta una consulta
+    al índice de zonas y una diferencia de conjuntos, sin leer historial.
+    """
+
+    def __init__(self, find_zones: Callable[[str, float, float], Iterable],
+                 load_state: Optional[Callable[[str], Iterable]] = None):
+        """
+        Args:
+            find_zones: Función (imei, lat, lon) -> zonas (con `id` y `name`) que contienen el punto
+            load_state: Función imei -> IDs de las zonas en que estaba el dispositivo
+                la primera vez que se lo ve (p. ej. según los eventos guardados)
+        """
+        self.find_zones = find_zones
+        self.load_state = load_state
+        self.listeners: List[Callable[[List[dict]], None]] = []
+        self._state: Dict[str, Tuple[Optional[str], FrozenSet]] = {}
+        self._zone_names: Dict[object, str] = {}
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[List[dict]], None]) -> None:
+        """Registra una función que recibe la lista de eventos de cada paquete"""
+        self.listeners.append(listener)
+
+    def process(self, imei: str, records: List[dict]) -> List[dict]:
+        """
+        Evalúa los registros de un paquete en orden y genera los eventos
+
+        Los registros con timestamp anterior a la última posición evaluada
+        (datos atrasados que el dispositivo reenvía) no generan eventos.
+
+        Returns:
+            list: Eventos `zone_enter`/`zone_exit` generados, en orden
+        """
+        if imei not in self._state:
+            self._initialize(imei)
+
+        events = []
+        for record in sorted(records, key=lambda record: record['DateTime']):
+            timestamp = record['DateTime']
+            latitude = record['Location']['Latitude']
+            longitude = record['Location']['Longitude']
+            zones = self.find_zones(imei, latitude, longitude)
+            zone_ids = frozenset(zone.id for zone in zones) if zones else _NO_ZONES
+
+            with self._lock:
+                last_timestamp, previous = self._state.get(imei, (None, _NO_ZONES))
+                if last_timestamp is not None and timestamp < last_timestamp:
+                    continue
+                self._state[imei] = (timestamp, zone_ids)
+                for zone in zones:
+                    self._zone_names[zone.id] = zone.name
+            if zone_ids == previous:
+                continue
+
+            for zone_id in sorted(previous - zone_ids):
+                events.append(self._event(ZONE_EXIT, imei, zone_id, timestamp, latitude, longitude))
+            for zone_id in sorted(zone_ids - previous):
+                events.append(self._event(ZONE_ENTER, imei, zone_id, timestamp, latitude, longitude))
+
+        if events:
+            Metrics.increment('zone_events.generated', len(events))
+            for listener in self.listeners:
+                try:
+                    listener(events)
+                except Exception as e:
+                    logging.error(f"Error in zone event listener: {e}")
+        return events
+
+    def _initialize(self, imei: str):
+        zone_ids = _NO_ZONES
+        if self.load_state is not None:
+            try:
+                zone_ids = frozenset(self.load_state(imei)) or _NO_ZONES
+            except Exception as e:
+                logging.error(f"Failed to load zone state for IMEI {imei}: {e}")
+        with self._lock:
+            self._state.setdefault(imei, (None, zone_ids))
+            Metrics.set_gauge('zone_events.devices', len(self._state))
+
+    def _event(self, event_type: str, imei: str, zone_id, timestamp: str, latitude: float, longitude: float) -> dict:
+        return {
+            'type': event_type,
+            'imei': imei,
+            'zone_id': zone_id,
+            'zone_name': self._zone_names.get(zone_id),
+            'timestamp': timestamp,
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+
+    def current_zones(self, imei: str) -> FrozenSet:
+        """IDs de las zonas en que está el dispositivo según la última posición evaluada"""
+        with self._lock:
+            return self._state.get(imei, (None, _NO_ZONES))[1]
+
+    def reset(self, imei: str = None) -> None:
+        """Olvida el estado de un IMEI (o de todos); se vuelve a cargar con `load_state`"""
+        with self._lock:
+            if imei is None:
+                self._state.clear()
+            else:
+                self._state.pop(imei, None)
+            Metrics.set_gauge('zone_events.devices', len(self._state))